@@ -1,18 +1,25 @@
 #!/usr/bin/env python3
 """SlurmctldCharm."""
-import copy
+import json
 import logging
 import shlex
 import subprocess
 from pathlib import Path
 from typing import List
 
+from etcd3gw.exceptions import Etcd3Exception
 from ops.charm import CharmBase, LeaderElectedEvent
 from ops.framework import StoredState
 from ops.main import main
 from ops.model import ActiveStatus, BlockedStatus, ModelError, WaitingStatus
 
+import config_changes
+import config_snapshot
+import hostlist
+import node_definitions
+import probe_cache
 from etcd_ops import EtcdOps
+from hook_profile import HookProfiler
 from interface_elasticsearch import Elasticsearch
 from interface_grafana_source import GrafanaSource
 from interface_influxdb import InfluxDB, generate_password
@@ -21,6 +28,7 @@ from interface_slurmctld_peer import SlurmctldPeer
 from interface_slurmd import Slurmd
 from interface_slurmdbd import Slurmdbd
 from interface_slurmrestd import Slurmrestd
+from slurm_files import SlurmFiles, with_job_container
 from slurm_ops_manager import SlurmManager
 
 from charms.fluentbit.v0.fluentbit import FluentbitClient
@@ -36,6 +44,8 @@ class SlurmctldCharm(CharmBase):
     def __init__(self, *args):
         """Init _stored attributes and interfaces, observe events."""
         super().__init__(*args)
+        self._hook_profile = HookProfiler(self)
+        self._probes = probe_cache.ProbeCache(self)
 
         self._stored.set_default(
             jwt_key=str(),
@@ -48,11 +58,19 @@ class SlurmctldCharm(CharmBase):
             etcd_configured=False,
             etcd_root_pass=str(),
             etcd_slurmd_pass=str(),
+            etcd_slurmrestd_pass=str(),
+            etcd_root_token=str(),
+            etcd_root_token_time=0.0,
             use_tls=False,
             use_tls_ca=False,
+            etcd_tls_fingerprint=str(),
+            slurm_config_fingerprints=dict(),
+            slurm_config_version=0,
+            slurmd_settle_handle=str(),
         )
 
         self._slurm_manager = SlurmManager(self, "slurmctld")
+        self._slurm_files = SlurmFiles()
 
         self._slurmd = Slurmd(self, "slurmd")
         self._slurmdbd = Slurmdbd(self, "slurmdbd")
@@ -76,9 +94,9 @@ class SlurmctldCharm(CharmBase):
             # slurm component lifecycle events
             self._slurmdbd.on.slurmdbd_available: self._on_slurmdbd_available,
             self._slurmdbd.on.slurmdbd_unavailable: self._on_slurmdbd_unavailable,
-            self._slurmd.on.slurmd_available: self._on_write_slurm_config,
+            self._slurmd.on.slurmd_available: self._on_slurmd_membership_changed,
             self._slurmd.on.slurmd_unavailable: self._on_write_slurm_config,
-            self._slurmd.on.slurmd_departed: self._on_write_slurm_config,
+            self._slurmd.on.slurmd_departed: self._on_slurmd_membership_changed,
             self._slurmrestd.on.slurmrestd_available: self._on_slurmrestd_available,
             self._slurmrestd.on.slurmrestd_unavailable: self._on_write_slurm_config,
             self._slurmctld_peer.on.slurmctld_peer_available: self._on_write_slurm_config, # NOTE: a second slurmctld should get the jwt/munge keys and configure them
@@ -100,6 +118,8 @@ class SlurmctldCharm(CharmBase):
             self.on.etcd_get_root_password_action: self._etcd_get_root_password,
             self.on.etcd_get_slurmd_password_action: self._etcd_get_slurmd_password,
             self.on.etcd_create_munge_account_action: self._create_etcd_user_for_munge_key_ops,
+            self.on.hook_profile_action: self._on_hook_profile_action,
+            self.on.snapshot_slurm_config_action: self._on_snapshot_slurm_config_action,
         }
         for event, handler in event_handler_bindings.items():
             self.framework.observe(event, handler)
@@ -138,6 +158,8 @@ class SlurmctldCharm(CharmBase):
         cluster_info = {}
         cluster_info['cluster_name'] = self.config.get('cluster-name')
         cluster_info['custom_config'] = self.config.get('custom-config')
+        if self.config.get('job-container-tmpfs'):
+            cluster_info['custom_config'] = with_job_container(cluster_info['custom_config'])
         cluster_info['proctrack_type'] = self.config.get('proctrack-type')
         cluster_info['cgroup_config'] = self.config.get('cgroup-config')
 
@@ -228,6 +250,41 @@ class SlurmctldCharm(CharmBase):
         slurm_conf = self._slurm_manager.get_slurm_conf()
         event.set_results({"slurm.conf": slurm_conf})
 
+    def _on_hook_profile_action(self, event):
+        """Show the slowest of the last hooks and the calls they spent time in."""
+        event.set_results(self._hook_profile.report(event.params["limit"]))
+
+    def _on_snapshot_slurm_config_action(self, event):
+        """Write a snapshot of what slurm.conf is assembled from."""
+        slurmd = self._slurmd.get_raw_relation_data()
+        snapshot = config_snapshot.build(
+            unit=self.unit.name,
+            config={"default-partition": self.config.get("default-partition"),
+                    "node-specialization": self.config.get("node-specialization"),
+                    "feature-partitions": self.config.get("feature-partitions")},
+            slurmd=slurmd,
+            slurmctld_info=self._slurmctld_info,
+            slurmdbd_info=self.slurmdbd_info,
+            cluster_info=self._cluster_info,
+            addons_info=self._addons_info,
+            fingerprints=dict(self._stored.slurm_config_fingerprints),
+        )
+
+        path = event.params.get("path")
+        path = Path(path) if path else config_snapshot.default_path(self.unit.name)
+        try:
+            size = config_snapshot.write(snapshot, path)
+        except OSError as e:
+            event.fail(f"Could not write the snapshot: {e}")
+            return
+
+        event.set_results({
+            "path": str(path),
+            "bytes": size,
+            "partitions": len(slurmd),
+            "units": sum(len(relation["units"]) for relation in slurmd),
+        })
+
     def _on_install(self, event):
         """Perform installation operations for slurmctld."""
         self.unit.set_workload_version(Path("version").read_text().strip())
@@ -237,6 +294,9 @@ class SlurmctldCharm(CharmBase):
         custom_repo = self.config.get("custom-slurm-repo")
         successful_installation = self._slurm_manager.install(custom_repo)
 
+        # the host changed, e.g. it may need a reboot now
+        self._probes.invalidate()
+
         if successful_installation:
             self._stored.slurm_installed = True
 
@@ -258,6 +318,7 @@ class SlurmctldCharm(CharmBase):
             # all slurmctld should restart munged here, as it would assure
             # munge is working
             self._slurm_manager.restart_munged()
+            self._probes.invalidate(probe_cache.MUNGE)
         else:
             self.unit.status = BlockedStatus("Error installing slurmctld")
             event.defer()
@@ -287,17 +348,33 @@ class SlurmctldCharm(CharmBase):
     def _on_upgrade(self, event):
         """Perform upgrade operations."""
         self.unit.set_workload_version(Path("version").read_text().strip())
-        self._configure_etcd()
+        self._probes.invalidate()
+        if self._configure_etcd():
+            self._etcd.store_munge_key(root_pass=self._stored.etcd_root_pass,
+                                       key=self._stored.munge_key)
+
+        # a new charm revision may ship different templates, so make sure the
+        # next write renders the configuration files again
+        self._stored.slurm_config_fingerprints = dict()
 
     def _on_update_status(self, event):
         """Handle update status."""
+        # apply membership changes from a burst that quieted down after the
+        # last slurmd hook
+        if self._is_leader() and self._slurmd.pending_membership:
+            if not self._slurmd_membership_settling():
+                self._on_write_slurm_config(event)
+                return
+
         self._check_status()
 
-    def _configure_etcd(self):
+    def _configure_etcd(self) -> bool:
         """Handle initial configuration for etcd.
 
-        - set passwords for root and slurmd account
-        - store munge key in db
+        - set passwords for root, slurmd and slurmrestd accounts
+
+        Return True if etcd was configured now, i.e., the munge key still
+        needs to be stored in db.
         """
         if not self._stored.etcd_configured:
             logger.debug("### configuring etcd")
@@ -307,31 +384,48 @@ class SlurmctldCharm(CharmBase):
                 self._stored.etcd_root_pass = generate_password()
             if self._stored.etcd_slurmd_pass == "":
                 self._stored.etcd_slurmd_pass = generate_password()
+            if self._stored.etcd_slurmrestd_pass == "":
+                self._stored.etcd_slurmrestd_pass = generate_password()
 
             self._etcd.configure(root_pass=self._stored.etcd_root_pass,
-                                 slurmd_pass=self._stored.etcd_slurmd_pass)
-            self._etcd.store_munge_key(root_pass=self._stored.etcd_root_pass,
-                                       key=self._stored.munge_key)
+                                 slurmd_pass=self._stored.etcd_slurmd_pass,
+                                 slurmrestd_pass=self._stored.etcd_slurmrestd_pass)
+            return True
+
+        # etcd was configured by a revision without the slurmrestd account
+        if self._stored.etcd_slurmrestd_pass == "":
+            logger.debug("### adding the slurmrestd account to etcd")
+            self._stored.etcd_slurmrestd_pass = generate_password()
+            self._etcd.setup_default_roles(root_pass=self._stored.etcd_root_pass,
+                                           slurmd_pass=self._stored.etcd_slurmd_pass,
+                                           slurmrestd_pass=self._stored.etcd_slurmrestd_pass)
 
         logger.debug("### etcd configured")
+        return False
 
     def _on_leader_elected(self, event: LeaderElectedEvent) -> None:
         logger.debug("## slurmctld - leader elected")
 
         self._configure_etcd()
 
-        # populate etcd with the nodelist
+        # populate etcd with the munge key and the nodelist, in one go
         slurm_config = self._assemble_slurm_config()
         accounted_nodes = self._assemble_all_nodes(slurm_config.get("partitions", []))
         logger.debug(f"## Sending to etcd list of accounted nodes: {accounted_nodes}")
         self._etcd.set_list_of_accounted_nodes(self._stored.etcd_root_pass,
-                                               accounted_nodes)
+                                               accounted_nodes,
+                                               munge_key=self._stored.munge_key)
 
     @property
     def etcd_slurmd_password(self) -> str:
         """Get the stored password for slurmd account for etcd."""
         return self._stored.etcd_slurmd_pass
 
+    @property
+    def etcd_slurmrestd_password(self) -> str:
+        """Get the stored password for slurmrestd account for etcd."""
+        return self._stored.etcd_slurmrestd_pass
+
     def _check_status(self):
         """Check for all relations and set appropriate status.
 
@@ -345,7 +439,8 @@ class SlurmctldCharm(CharmBase):
         #       only for the cluster to operate. But we need slurmd inventory
         #       to assemble slurm.conf
 
-        if self._slurm_manager.needs_reboot:
+        if not self._probes.check(probe_cache.REBOOT,
+                                  lambda: not self._slurm_manager.needs_reboot):
             self.unit.status = BlockedStatus("Machine needs reboot")
             return False
 
@@ -353,11 +448,12 @@ class SlurmctldCharm(CharmBase):
             self.unit.status = BlockedStatus("Error installing slurmctld")
             return False
 
-        if (self._is_leader() and not self._etcd.is_active()):
+        if (self._is_leader()
+                and not self._probes.check(probe_cache.ETCD, self._etcd.is_active)):
             self.unit.status = WaitingStatus("Initializing charm")
             return False
 
-        if not self._slurm_manager.check_munged():
+        if not self._probes.check(probe_cache.MUNGE, self._slurm_manager.check_munged):
             self.unit.status = BlockedStatus("Error configuring munge key")
             return False
 
@@ -402,13 +498,17 @@ class SlurmctldCharm(CharmBase):
 
     def _assemble_partitions(self, slurmd_info):
         """Make any needed modifications to partition data."""
-        slurmd_info_tmp = copy.deepcopy(slurmd_info)
         default_partition_from_config = self.config.get("default-partition")
+        specialization = self.config.get("node-specialization")
 
+        partitions = list()
         for partition in slurmd_info:
-            # Deep copy the partition to a tmp var so we can modify it as
-            # needed whilst not modifying the object we are iterating over.
-            partition_tmp = copy.deepcopy(partition)
+            # Shallow copy the partition so we can modify it as needed whilst
+            # not modifying the partitions in slurmd_info. The inventory is
+            # shared, it is not modified here.
+            partition_tmp = dict(partition)
+            partition_tmp["inventory"] = node_definitions.node_definitions(
+                partition["inventory"], specialization)
             # Extract the partition_name from the partition.
             partition_name = partition["partition_name"]
 
@@ -421,13 +521,15 @@ class SlurmctldCharm(CharmBase):
                 if default_partition_from_config == partition_name:
                     partition_tmp["partition_default"] = "YES"
 
-            slurmd_info_tmp.remove(partition)
-            slurmd_info_tmp.append(partition_tmp)
+            partitions.append(partition_tmp)
 
-        return slurmd_info_tmp
+        return partitions
 
-    def _assemble_slurm_config(self):
-        """Assemble and return the slurm config."""
+    def _assemble_slurm_config_sections(self) -> dict:
+        """Assemble the pieces of the slurm config, kept apart.
+
+        Return an empty dict if we do not have all we need yet.
+        """
         logger.debug('## Assembling new slurm.conf')
 
         slurmctld_info = self._slurmctld_info
@@ -449,6 +551,15 @@ class SlurmctldCharm(CharmBase):
         partitions_info = self._assemble_partitions(slurmd_info)
         down_nodes = self._assemble_down_nodes(slurmd_info)
 
+        features = [feature.strip()
+                    for feature in self.config.get("feature-partitions", "").split(",")
+                    if feature.strip()]
+        feature_partitions = node_definitions.feature_partitions(partitions_info, features)
+        if feature_partitions:
+            custom_config = cluster_info["custom_config"]
+            cluster_info = {**cluster_info, "custom_config": "\n".join(
+                filter(None, [custom_config, feature_partitions]))}
+
         logger.debug(f'#### addons: {addons_info}')
         logger.debug(f'#### partitions_info: {partitions_info}')
         logger.debug(f"#### Down nodes: {down_nodes}")
@@ -456,21 +567,60 @@ class SlurmctldCharm(CharmBase):
         return {
             "partitions": partitions_info,
             "down_nodes": down_nodes,
-            **slurmctld_info,
-            **slurmdbd_info,
-            **addons_info,
-            **cluster_info,
+            "slurmctld_info": slurmctld_info,
+            "slurmdbd_info": slurmdbd_info,
+            "addons_info": addons_info,
+            "cluster_info": cluster_info,
+        }
+
+    @staticmethod
+    def _merge_slurm_config_sections(sections: dict) -> dict:
+        """Merge the pieces of the slurm config into the slurm config."""
+        if not sections:
+            return {}
+
+        return {
+            "partitions": sections["partitions"],
+            "down_nodes": sections["down_nodes"],
+            **sections["slurmctld_info"],
+            **sections["slurmdbd_info"],
+            **sections["addons_info"],
+            **sections["cluster_info"],
+        }
+
+    def _assemble_slurm_config(self):
+        """Assemble and return the slurm config."""
+        return self._merge_slurm_config_sections(self._assemble_slurm_config_sections())
+
+    def _slurmrestd_config(self, compressed_config: dict, fingerprints: dict) -> dict:
+        """Return a new version of the slurm config for slurmrestd.
+
+        slurmrestd fetches it from etcd when its hash changes on the relation,
+        and only restarts when the restart hash changes, i.e. when the
+        sections it uses change, not when nodes join or leave.
+        """
+        self._stored.slurm_config_version += 1
+        return {
+            "version": self._stored.slurm_config_version,
+            "hash": config_changes.config_hash(compressed_config),
+            "restart_hash": config_changes.sections_hash(fingerprints,
+                                                         config_changes.SLURMRESTD_SECTIONS),
+            "slurm_config": compressed_config,
         }
 
     def _on_slurmrestd_available(self, event):
-        """Set slurm_config on the relation when slurmrestd available."""
+        """Send slurm_config to slurmrestd when it becomes available."""
+        # only the leader writes to etcd and to the application data
+        if not self._is_leader():
+            return
+
         if not self._check_status():
             event.defer()
             return
 
-        slurm_config = self._assemble_slurm_config()
+        sections = self._assemble_slurm_config_sections()
 
-        if not slurm_config:
+        if not sections:
             self.unit.status = BlockedStatus(
                 "Cannot generate slurm_config - defering event."
             )
@@ -478,10 +628,13 @@ class SlurmctldCharm(CharmBase):
             return
 
         if self._stored.slurmrestd_available:
-            self._slurmrestd.set_slurm_config_on_app_relation_data(
-                slurm_config,
-            )
-            self._slurmrestd.restart_slurmrestd()
+            compressed_config = hostlist.compress_slurm_config(
+                self._merge_slurm_config_sections(sections))
+            slurmrestd_config = self._slurmrestd_config(compressed_config,
+                                                        config_changes.fingerprint(sections))
+            self._etcd.store_slurm_config(self._stored.etcd_root_pass,
+                                          json.dumps(slurmrestd_config))
+            self._slurmrestd.publish_slurm_config(slurmrestd_config)
 
     def _on_slurmdbd_available(self, event):
         self._set_slurmdbd_available(True)
@@ -491,6 +644,40 @@ class SlurmctldCharm(CharmBase):
         self._set_slurmdbd_available(False)
         self._check_status()
 
+    def _slurmd_membership_settling(self) -> bool:
+        """Return True if slurmd units are still joining/departing."""
+        settle_time = self.config.get("slurmd-settle-time")
+        max_delay = self.config.get("slurmd-settle-max-delay")
+        return self._slurmd.membership_settling(settle_time, max_delay)
+
+    def _clear_pending_membership(self):
+        """Forget the applied membership changes, and the event settling them.
+
+        The changes may be applied by another event than the settling one,
+        e.g. update-status, the next burst must then keep a new event.
+        """
+        self._stored.slurmd_settle_handle = ""
+        self._slurmd.clear_pending_membership()
+
+    def _on_slurmd_membership_changed(self, event):
+        """Coalesce bursts of slurmd joins/departures into one reconfiguration.
+
+        While the burst goes on, a single event is kept deferred and the other
+        ones are dropped, as their changes are recorded in the pending
+        membership. The deferred event applies all of them at once when the
+        burst quiets down or the maximum delay is reached.
+        """
+        if self._is_leader() and self._slurmd_membership_settling():
+            settle_handle = self._stored.slurmd_settle_handle
+            if settle_handle in ("", event.handle.path):
+                logger.debug("## slurmd membership changing, waiting it to settle")
+                self._stored.slurmd_settle_handle = event.handle.path
+                event.defer()
+            return
+
+        self._stored.slurmd_settle_handle = ""
+        self._on_write_slurm_config(event)
+
     def _on_write_slurm_config(self, event):
         """Check that we have what we need before we proceed."""
         logger.debug("### Slurmctld - _on_write_slurm_config()")
@@ -511,24 +698,48 @@ class SlurmctldCharm(CharmBase):
         logger.debug(f"## _on_write_slurm_config(): use_tls: {self._stored.use_tls}")
         logger.debug(f"## _on_write_slurm_config(): use_tls_ca: {self._stored.use_tls_ca}")
 
-        # TODO this will fire everytime a the configuration changed, we don't
-        #      need that. This should happen only if the tls configs changed
+        # no-op unless the TLS settings changed
         self._etcd.setup_tls()
 
-        slurm_config = self._assemble_slurm_config()
+        sections = self._assemble_slurm_config_sections()
+        slurm_config = self._merge_slurm_config_sections(sections)
         if slurm_config:
-            self._slurm_manager.render_slurm_configs(slurm_config)
+            # send the custom NHC parameters to all slurmd. They are not part
+            # of slurm.conf, so this must happen even if slurm.conf did not
+            # change
+            self._slurmd.set_nhc_params(self.config.get('health-check-params'))
 
-            # restart is needed if nodes are added/removed from the cluster
-            self._slurm_manager.slurm_systemctl('restart')
+            fingerprints = config_changes.fingerprint(sections)
+            action = config_changes.classify(dict(self._stored.slurm_config_fingerprints),
+                                             fingerprints)
+            logger.debug(f"## slurm config change requires: {action}")
+
+            if action == config_changes.NO_CHANGE:
+                logger.debug("## slurm.conf unchanged, skipping render and restart")
+                self._clear_pending_membership()
+                return
+
+            # render the node lists as hostlist expressions, e.g. node[1-512]
+            compressed_config = hostlist.compress_slurm_config(slurm_config)
+            self._slurm_manager.render_slurm_configs(compressed_config)
+            self._slurm_files.write_node_definitions(compressed_config)
+            self._slurm_files.write_gres_conf(compressed_config)
+            if self.config.get("job-container-tmpfs"):
+                self._slurm_files.write_job_container_conf(compressed_config)
+
+            # restart is needed if nodes are added/removed from the cluster,
+            # any other change is applied with a reconfigure. The reconfigure
+            # also makes the slurmd daemons fetch the new configuration
+            if action == config_changes.RESTART or not self._slurm_manager.slurm_is_active():
+                self._slurm_manager.slurm_systemctl('restart')
             self._slurm_manager.slurm_cmd('scontrol', 'reconfigure')
 
-            # send the list of hostnames to slurmd via etcd
+            # send the list of hostnames to slurmd, and the config to
+            # slurmrestd, via etcd
             accounted_nodes = self._assemble_all_nodes(slurm_config["partitions"])
-            self._etcd.set_list_of_accounted_nodes(self._stored.etcd_root_pass, accounted_nodes)
-
-            # send the custom NHC parameters to all slurmd
-            self._slurmd.set_nhc_params(self.config.get('health-check-params'))
+            slurmrestd_config = self._slurmrestd_config(compressed_config, fingerprints)
+            self._etcd.set_list_of_accounted_nodes(self._stored.etcd_root_pass, accounted_nodes,
+                                                   slurm_config=json.dumps(slurmrestd_config))
 
             # check for "not new anymore" nodes, i.e., nodes that runned the
             # node-configured action. Those nodes are not anymore in the
@@ -540,11 +751,13 @@ class SlurmctldCharm(CharmBase):
             self._resume_nodes(configured_nodes)
             self._stored.down_nodes = down_nodes.copy()
 
-            # slurmrestd needs the slurm.conf file, so send it every time it changes
+            # slurmrestd needs the slurm.conf file, so announce every new
+            # version. NOTE: scontrol reconfigure does not restart slurmrestd
             if self._stored.slurmrestd_available:
-                self._slurmrestd.set_slurm_config_on_app_relation_data(slurm_config)
-                # NOTE: scontrol reconfigure does not restart slurmrestd
-                self._slurmrestd.restart_slurmrestd()
+                self._slurmrestd.publish_slurm_config(slurmrestd_config)
+
+            self._stored.slurm_config_fingerprints = fingerprints
+            self._clear_pending_membership()
         else:
             logger.debug("## Should rewrite slurm.conf, but we don't have it. "
                          "Deferring.")
@@ -666,7 +879,11 @@ class SlurmctldCharm(CharmBase):
         """Create etcd3 account to query munge key."""
         user = event.params.get("user")
         pw = event.params.get("password")
-        self._etcd.create_new_munge_user(self._stored.etcd_root_pass, user, pw)
+        try:
+            self._etcd.create_new_munge_user(self._stored.etcd_root_pass, user, pw)
+        except (Etcd3Exception, ValueError) as e:
+            event.fail(f"Failed to create etcd user {user}: {e}")
+            return
         event.set_results({"created-new-user": user})
 
 
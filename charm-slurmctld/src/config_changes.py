@@ -0,0 +1,124 @@
+"""Classify the changes between two assembled slurm configurations."""
+import hashlib
+import json
+import logging
+
+logger = logging.getLogger()
+
+NO_CHANGE = "no-change"
+RECONFIGURE = "reconfigure"
+RESTART = "restart"
+
+# What slurmctld needs to apply a change in each section of the config:
+# - adding/removing nodes, moving the controllers/slurmdbd around, or
+#   changing the parameters Slurm only reads at startup, e.g. the plugin
+#   types, only takes effect after restarting slurmctld
+# - partitions, node definitions, other parameters, and addons are re-read
+#   with `scontrol reconfigure`
+SECTION_ACTIONS = {
+    "node_set": RESTART,
+    "daemons": RESTART,
+    "restart_parameters": RESTART,
+    "partitions": RECONFIGURE,
+    "parameters": RECONFIGURE,
+    "addons": RECONFIGURE,
+}
+
+# the cluster_info keys, and the slurm.conf parameters of custom-config, that
+# slurm.conf(5) says need a restart. Parameters missing here, e.g. of a new
+# Slurm release, are applied with a reconfigure
+RESTART_INFO_KEYS = ("cluster_name", "proctrack_type")
+RESTART_PARAMETERS = {
+    "accountingstoragetype", "authalttypes", "authtype", "clustername", "credtype",
+    "grestypes", "jobacctgathertype", "jobcontainertype", "launchtype", "plugindir",
+    "prologflags", "proctracktype", "schedulertype", "selecttype",
+    "selecttypeparameters", "slurmctldport", "slurmdport", "switchtype", "taskplugin",
+    "topologyplugin", "treewidth",
+}
+
+_ACTION_COST = {NO_CHANGE: 0, RECONFIGURE: 1, RESTART: 2}
+
+# slurmrestd only talks to the controllers and slurmdbd, it needs a restart
+# when they move or the cluster parameters change, not when nodes join
+SLURMRESTD_SECTIONS = ("daemons", "parameters")
+
+
+def _hash(data) -> str:
+    """Return the sha256 of the canonical JSON representation of data."""
+    serialized = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(serialized.encode()).hexdigest()
+
+
+def _canonical_partitions(partitions: list) -> list:
+    """Sort the partitions and their inventory.
+
+    The order Juju lists relations and units in is not meaningful, so it
+    must not show up as a change.
+    """
+    canonical = list()
+    for partition in partitions:
+        inventory = sorted(partition["inventory"], key=lambda node: node["node_name"])
+        canonical.append({**partition, "inventory": inventory})
+    return sorted(canonical, key=lambda partition: partition["partition_name"])
+
+
+def _restart_parameters(cluster_info: dict) -> dict:
+    """Return the parameters of cluster_info that need a restart."""
+    parameters = {key: cluster_info.get(key) for key in RESTART_INFO_KEYS}
+    for line in (cluster_info.get("custom_config") or "").splitlines():
+        # a line may set several parameters, e.g. PartitionName lines
+        for item in line.partition("#")[0].split():
+            key, _, value = item.partition("=")
+            if key.lower() in RESTART_PARAMETERS:
+                parameters[key.lower()] = value
+    return parameters
+
+
+def fingerprint(sections: dict) -> dict:
+    """Return one hash per section of the slurm config.
+
+    `sections` holds the pieces `_assemble_slurm_config()` merges together:
+    slurmctld_info, slurmdbd_info, cluster_info, addons_info, partitions and
+    down_nodes.
+    """
+    partitions = _canonical_partitions(sections["partitions"])
+    node_set = sorted(node["node_name"]
+                      for partition in partitions
+                      for node in partition["inventory"])
+
+    return {
+        "node_set": _hash(node_set),
+        "daemons": _hash([sections["slurmctld_info"], sections["slurmdbd_info"]]),
+        "partitions": _hash([partitions, sorted(sections["down_nodes"])]),
+        "restart_parameters": _hash(_restart_parameters(sections["cluster_info"])),
+        "parameters": _hash(sections["cluster_info"]),
+        "addons": _hash(sections["addons_info"]),
+    }
+
+
+def config_hash(slurm_config: dict) -> str:
+    """Return the hash of a whole slurm config."""
+    return _hash(slurm_config)
+
+
+def sections_hash(fingerprints: dict, sections) -> str:
+    """Return one hash of the fingerprints of some sections."""
+    return _hash([fingerprints.get(section) for section in sections])
+
+
+def classify(previous: dict, current: dict) -> str:
+    """Return the cheapest action that applies the change between fingerprints.
+
+    Without previous fingerprints, e.g. the first time the config is written,
+    slurmctld has to be restarted.
+    """
+    if not previous:
+        return RESTART
+
+    action = NO_CHANGE
+    for section, section_action in SECTION_ACTIONS.items():
+        if previous.get(section) != current.get(section):
+            logger.debug(f"## slurm config section changed: {section}")
+            if _ACTION_COST[section_action] > _ACTION_COST[action]:
+                action = section_action
+    return action
@@ -0,0 +1,74 @@
+"""Snapshots of what slurmctld assembles slurm.conf from, to replay it offline.
+
+A snapshot holds the slurmd relations' data as slurmctld reads it, the
+slurmctld, slurmdbd, cluster and addons info, the charm config the assembly
+depends on, and the fingerprints of the last written config. It is stored as
+gzipped JSON, see tests/benchmark/replay_snapshot.py to replay one.
+"""
+import gzip
+import json
+import os
+import time
+from pathlib import Path
+
+SNAPSHOT_VERSION = 1
+
+# values of these keys are replaced, they do not change how slurm.conf is
+# assembled, e.g. the InfluxDB password of the acct_gather addon
+_SECRET_KEYS = ("password", "pass", "token")
+_REDACTED = "<redacted>"
+
+
+def _redact(data):
+    """Return a copy of data without the values of the secret keys."""
+    if isinstance(data, dict):
+        return {key: _REDACTED if str(key).lower() in _SECRET_KEYS else _redact(value)
+                for key, value in data.items()}
+    if isinstance(data, list):
+        return [_redact(value) for value in data]
+    return data
+
+
+def build(unit: str, config: dict, slurmd: list, slurmctld_info: dict, slurmdbd_info: dict,
+          cluster_info: dict, addons_info: dict, fingerprints: dict) -> dict:
+    """Return a snapshot of the inputs of the slurm config assembly."""
+    return {
+        "version": SNAPSHOT_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "unit": unit,
+        "config": config,
+        "slurmd": slurmd,
+        "slurmctld_info": slurmctld_info,
+        "slurmdbd_info": slurmdbd_info,
+        "cluster_info": cluster_info,
+        "addons_info": _redact(addons_info),
+        "fingerprints": fingerprints,
+    }
+
+
+def default_path(unit: str) -> Path:
+    """Return where to write a new snapshot of the unit."""
+    timestamp = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+    return Path("/var/tmp") / f"{unit.replace('/', '-')}-snapshot-{timestamp}.json.gz"
+
+
+def write(snapshot: dict, path: Path) -> int:
+    """Write the snapshot, only readable by its owner. Return its size.
+
+    An existing file is overwritten and made only readable by its owner too,
+    a symbolic link is not followed.
+    """
+    data = gzip.compress(json.dumps(snapshot, sort_keys=True).encode())
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_NOFOLLOW, 0o600)
+    with os.fdopen(fd, "wb") as snapshot_file:
+        os.fchmod(snapshot_file.fileno(), 0o600)
+        snapshot_file.write(data)
+    return len(data)
+
+
+def load(path: Path) -> dict:
+    """Return the snapshot stored in path."""
+    snapshot = json.loads(gzip.decompress(Path(path).read_bytes()))
+    if snapshot.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"unsupported snapshot version: {snapshot.get('version')}")
+    return snapshot
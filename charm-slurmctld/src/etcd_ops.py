@@ -1,5 +1,6 @@
 """etcd operations."""
 
+import hashlib
 import json
 import logging
 import shlex
@@ -8,15 +9,41 @@ import subprocess
 import tarfile
 from tempfile import TemporaryDirectory
 from pathlib import Path
-from typing import List
+from time import time
+from typing import Dict, List
 
 from jinja2 import Environment, FileSystemLoader
 from slurm_ops_manager.utils import operating_system
 
+import probe_cache
 from omnietcd3 import Etcd3AuthClient
 
 logger = logging.getLogger()
 
+ACCOUNTED_NODES_PREFIX = "nodes/accounted/"
+# the JSON list of all nodes slurmd units read before the per-node keys, kept
+# up to date for the units not upgraded yet. To be removed in the next release
+LEGACY_NODES_KEY = "nodes/all_nodes"
+# the slurm config slurmrestd renders, with its version and hashes
+SLURM_CONFIG_KEY = "config/slurm_config"
+
+# seconds to wait for etcd to answer a request
+ETCD_TIMEOUT = 10
+# etcd invalidates auth tokens unused for --auth-token-ttl seconds (300 by
+# default), reuse them across hooks for a bit less than that
+ETCD_TOKEN_TTL = 240
+
+# etcd roles and their (permission, key prefix) permissions. The root role
+# has full permissions, regardless of the ones granted
+DEFAULT_ROLES = {
+    "root": set(),
+    "slurmd": {("READWRITE", "nodes/")},
+    "munge-readers": {("READ", "munge/")},
+    "slurmrestd": {("READ", "config/")},
+}
+# the etcd users of the charms, the munge key accounts can not take them over
+CHARM_USERS = ("root", "slurmd", "slurmrestd")
+
 
 class EtcdOps:
     """ETCD ops."""
@@ -40,6 +67,10 @@ class EtcdOps:
         self._tls_crt_path = self._certs_path / "tls.crt"
         self._tls_ca_crt_path = self._certs_path / "tls-ca.crt"
 
+        # the client is reused for all requests in a hook
+        self._cached_client = None
+        self._cached_client_key = None
+
     def install(self, resource_path: Path):
         """Install etcd."""
         # extract resource tarball
@@ -110,8 +141,29 @@ class EtcdOps:
 
         self._etcd_environment_file.write_text(template.render(ctxt))
 
+    def _tls_fingerprint(self) -> str:
+        """Return a hash of the TLS flags, key, and certificates."""
+        config = self._charm.model.config
+        settings = [self._charm._stored.use_tls, self._charm._stored.use_tls_ca]
+        if self._charm._stored.use_tls:
+            settings += [config["tls-key"], config["tls-cert"], config["tls-ca-cert"]]
+        return hashlib.sha256(json.dumps(settings).encode()).hexdigest()
+
     def setup_tls(self):
-        """Setup the files for TLS."""
+        """Setup the files for TLS.
+
+        Restarting etcd drops every watch and session, so it only happens when
+        TLS is toggled or the key or certificates change.
+        """
+        fingerprint = self._tls_fingerprint()
+        if fingerprint == self._charm._stored.etcd_tls_fingerprint:
+            logger.debug("## etcd tls settings did not change")
+            return
+
+        self._write_tls_files()
+        self._charm._stored.etcd_tls_fingerprint = fingerprint
+
+    def _write_tls_files(self):
         logger.debug("## setting tls files for etcd")
 
         # safeguard
@@ -157,11 +209,13 @@ class EtcdOps:
         logger.debug("## enabling and starting etcd")
         subprocess.call(["systemctl", "enable", self._etcd_service])
         subprocess.call(["systemctl", "start", self._etcd_service])
+        self._charm._probes.invalidate(probe_cache.ETCD)
 
     def restart(self):
         """Restart etcd service."""
         logger.debug("## restarting etcd")
         subprocess.call(["systemctl", "restart", self._etcd_service])
+        self._charm._probes.invalidate(probe_cache.ETCD)
 
     def is_active(self) -> bool:
         """Check if systemd etcd service is active."""
@@ -173,7 +227,7 @@ class EtcdOps:
             logger.error(f'## Could not check etcd: {e}')
             return False
 
-    def configure(self, root_pass: str, slurmd_pass: str) -> None:
+    def configure(self, root_pass: str, slurmd_pass: str, slurmrestd_pass: str) -> None:
         """Configure etcd service for the first time."""
         logger.debug("## configuring etcd")
 
@@ -183,63 +237,92 @@ class EtcdOps:
         self.start()
 
         # some configs can only be applied with the server running
-        self.setup_default_roles(root_pass=root_pass, slurmd_pass=slurmd_pass)
+        self.setup_default_roles(root_pass=root_pass, slurmd_pass=slurmd_pass,
+                                 slurmrestd_pass=slurmrestd_pass)
 
-    def setup_default_roles(self, root_pass: str, slurmd_pass: str) -> None:
+    def setup_default_roles(self, root_pass: str, slurmd_pass: str,
+                            slurmrestd_pass: str) -> None:
         """Set up default etcd roles.
 
-        We use three roles:
+        We use four roles:
         - root: for slurmctld operations
             - has full r/w permissions
         - slurmd: for slurmd charms
             - has r/w permissions only for nodes/* keys
         - munge: for external accounts reading the munge key
             - has r permissions for munge/* keys
+        - slurmrestd: for slurmrestd charms
+            - has r permissions only for config/* keys
+
+        Only what is missing is created, so this is safe to run again.
         """
         logger.debug("## creating default etcd roles/users")
-        cmds = [# create root account
-                f"etcdctl user add root:{root_pass}",
-                # create root role
-                "etcdctl role add root",
-                "etcdctl user grant-role root root",
-
-                # create slurmd user
-                f"etcdctl user add slurmd:{slurmd_pass}",
-                # create slurmd role
-                "etcdctl role add slurmd",
-                "etcdctl role grant-permission slurmd readwrite --prefix=true nodes/",
-                # grant slurmd user the slurmd role
-                "etcdctl user grant-role slurmd slurmd",
-
-                # create munge role
-                "etcdctl role add munge-readers",
-                "etcdctl role grant-permission munge-readers read --prefix=true munge/",
-
-                # enable auth
-                "etcdctl auth enable",
-               ]
-
-        for cmd in cmds:
-            cmd_without_password = cmd.split(":")[0]
-            logger.debug(f"## executing command: {cmd_without_password}")
-            subprocess.run(shlex.split(cmd))
+        # authentication is not enabled the first time we run
+        client = self._client(root_pass, authenticate=False)
+
+        roles = client.role_list()
+        for role, permissions in DEFAULT_ROLES.items():
+            if role not in roles:
+                logger.debug(f"## creating etcd role: {role}")
+                client.role_add(role)
+                current_permissions = set()
+            else:
+                current_permissions = client.role_prefix_permissions(role)
+
+            for permission in permissions - current_permissions:
+                logger.debug(f"## granting etcd role {role} permission: {permission}")
+                client.role_grant_prefix_permission(role, *permission)
+
+        users = client.user_list()
+        passwords = {"root": root_pass, "slurmd": slurmd_pass, "slurmrestd": slurmrestd_pass}
+        for user, password in passwords.items():
+            if user not in users:
+                logger.debug(f"## creating etcd user: {user}")
+                client.user_add(user, password)
+            if user not in client.user_roles(user):
+                logger.debug(f"## granting etcd role {user} to user {user}")
+                client.user_grant_role(user, user)
+
+        if not client.auth_enabled():
+            logger.debug("## enabling etcd authentication")
+            client.auth_enable()
 
     def create_new_munge_user(self, root_pass: str, user: str, password: str) -> None:
-        """Create new user in etcd with munge-readers role."""
+        """Create new user in etcd with munge-readers role.
+
+        If the user already exists, its password is updated, as long as it
+        only has the munge-readers role. The users of the charms, and the
+        ones with other roles, are refused with a ValueError.
+        """
+        if user in CHARM_USERS:
+            raise ValueError(f"{user} is reserved for the charms")
+
         logger.debug("## creating new account to query munge key")
-        auth = f"--user root --password {root_pass}"
+        client = self._client(root_pass)
+
+        if user in client.user_list():
+            if set(client.user_roles(user)) != {"munge-readers"}:
+                raise ValueError(f"{user} already exists, with other roles than munge-readers")
+            client.user_change_password(user, password)
+        else:
+            client.user_add(user, password)
 
-        cmd = f"etcdctl {auth} user add {user}:{password}"
-        subprocess.run(shlex.split(cmd))
+        if "munge-readers" not in client.user_roles(user):
+            logger.debug("## granting role munge-readers to new account")
+            client.user_grant_role(user, "munge-readers")
 
-        logger.debug("## granting role munge-readers to new account")
-        cmd = f"etcdctl {auth} user grant-role {user} munge-readers"
-        subprocess.run(shlex.split(cmd))
+    def _store_token(self, token: str) -> None:
+        """Save the root auth token, to be reused in the next hooks."""
+        self._charm._stored.etcd_root_token = token
+        self._charm._stored.etcd_root_token_time = time()
 
-    def _client(self, root_pass: str) -> Etcd3AuthClient:
+    def _client(self, root_pass: str, authenticate: bool = True) -> Etcd3AuthClient:
         """Build an etcd client with the correct protocol.
 
-        Use https if we have TLS certs and HTTP otherwise.
+        Use https if we have TLS certs and HTTP otherwise. The client, and its
+        connection, is reused for the whole hook, and its auth token across
+        hooks, until it is about to expire. Without `authenticate`, the client
+        only authenticates if a request is denied.
         """
         protocol = "http"
         tls_cert = None
@@ -251,21 +334,76 @@ class EtcdOps:
 
             if self._charm._stored.use_tls_ca:
                 cacert = self._tls_ca_crt_path.as_posix()
-        logger.debug(f"## Created new etcd client using {protocol}, {tls_cert} and {cacert}")
-        client = Etcd3AuthClient(username="root", password=root_pass,
-                                 protocol=protocol, ca_cert=cacert,
-                                 cert_cert=tls_cert)
-        client.authenticate()
-        return client
-
-    def set_list_of_accounted_nodes(self, root_pass: str, nodes: List[str]) -> None:
-        """Set list of nodes on etcd."""
-        logger.debug(f"## setting on etcd: nodes/all_nodes/{nodes}")
+
+        client_key = (root_pass, protocol, tls_cert, cacert)
+        if self._cached_client is None or self._cached_client_key != client_key:
+            token = self._charm._stored.etcd_root_token
+            token_age = time() - self._charm._stored.etcd_root_token_time
+            if token_age > ETCD_TOKEN_TTL or self._cached_client_key is not None:
+                # the connection settings changed, get a new token
+                token = None
+
+            logger.debug(f"## Created new etcd client using {protocol}, {tls_cert} and {cacert}")
+            client = Etcd3AuthClient(username="root", password=root_pass,
+                                     protocol=protocol, ca_cert=cacert,
+                                     cert_cert=tls_cert, timeout=ETCD_TIMEOUT,
+                                     token=token, on_token=self._store_token)
+            if authenticate and not token:
+                client.authenticate()
+
+            self._cached_client = client
+            self._cached_client_key = client_key
+
+        # using the token resets its TTL
+        self._charm._stored.etcd_root_token_time = time()
+        return self._cached_client
+
+    def _accounted_nodes_changes(self, client: Etcd3AuthClient, nodes: List[str]):
+        """Return the keys to put and delete to account for nodes."""
+        accounted = {key[len(ACCOUNTED_NODES_PREFIX):]
+                     for key in client.get_prefix_keys(ACCOUNTED_NODES_PREFIX)}
+        added = set(nodes) - accounted
+        removed = accounted - set(nodes)
+        logger.debug(f"## accounting nodes on etcd, added: {added}, removed: {removed}")
+
+        puts = {f"{ACCOUNTED_NODES_PREFIX}{node}": "true" for node in added}
+        deletes = [f"{ACCOUNTED_NODES_PREFIX}{node}" for node in removed]
+        if added or removed:
+            puts[LEGACY_NODES_KEY] = json.dumps(sorted(nodes))
+        return puts, deletes
+
+    def set_list_of_accounted_nodes(self, root_pass: str, nodes: List[str],
+                                    munge_key: str = None, slurm_config: str = None) -> None:
+        """Account for nodes on etcd, using one key per node.
+
+        Each slurmd looks up its own nodes/accounted/<hostname> key, so only
+        the keys of added or removed nodes are written, with the list of all
+        nodes older slurmd units read. If given, the munge
+        key and the slurm config for slurmrestd are stored in the same
+        transaction.
+        """
         client = self._client(root_pass)
-        client.put(key="nodes/all_nodes", value=json.dumps(nodes))
+        puts, deletes = self._accounted_nodes_changes(client, nodes)
+        if munge_key:
+            puts["munge/key"] = munge_key
+        if slurm_config:
+            puts[SLURM_CONFIG_KEY] = slurm_config
+
+        self._write(client, puts, deletes)
 
     def store_munge_key(self, root_pass: str, key: str) -> None:
         """Store munge key on etcd."""
         logger.debug("## Storing munge key on etcd: munge/key")
-        client = self._client(root_pass)
-        client.put(key="munge/key", value=key)
+        self._write(self._client(root_pass), puts={"munge/key": key})
+
+    def store_slurm_config(self, root_pass: str, slurm_config: str) -> None:
+        """Store the slurm config for slurmrestd on etcd."""
+        logger.debug(f"## Storing slurm config on etcd: {SLURM_CONFIG_KEY}")
+        self._write(self._client(root_pass), puts={SLURM_CONFIG_KEY: slurm_config})
+
+    @staticmethod
+    def _write(client: Etcd3AuthClient, puts: Dict[str, str] = None,
+               deletes: List[str] = None) -> None:
+        """Write all changes to etcd in a single transaction."""
+        if puts or deletes:
+            client.batch(puts=puts, deletes=deletes)
@@ -0,0 +1,133 @@
+"""Hostlist expressions, e.g. `node[001-512]`, for compact slurm.conf files."""
+import json
+import re
+from typing import Dict, Iterable, List, Tuple
+
+_TRAILING_NUMBER = re.compile(r"^(.*?)(\d+)$")
+_RANGE_EXPRESSION = re.compile(r"^(.*)\[([\d,-]+)\]$")
+
+
+def _split(hostname: str) -> Tuple[str, int, int]:
+    """Split a hostname into prefix, zero padding width, and number.
+
+    Hostnames without a trailing number return a number of -1.
+    """
+    match = _TRAILING_NUMBER.match(hostname)
+    if not match:
+        return hostname, 0, -1
+
+    prefix, digits = match.groups()
+    # only zero padded numbers need a fixed width, e.g. node001
+    width = len(digits) if (digits.startswith("0") and len(digits) > 1) else 0
+    return prefix, width, int(digits)
+
+
+def _ranges(numbers: List[int], width: int) -> str:
+    """Return the comma separated ranges of sorted numbers, e.g. 1-3,7."""
+    ranges = list()
+    start = end = numbers[0]
+    for number in numbers[1:] + [None]:
+        if number is not None and number == end + 1:
+            end = number
+            continue
+
+        first = str(start).zfill(width)
+        ranges.append(first if start == end else f"{first}-{str(end).zfill(width)}")
+        if number is not None:
+            start = end = number
+    return ",".join(ranges)
+
+
+def compress(hostnames: Iterable[str]) -> List[str]:
+    """Compress hostnames into a list of hostlist expressions.
+
+    Hostnames sharing the same prefix and zero padding are collapsed into a
+    range expression, e.g. node001, node002, node003 become node[001-003].
+    """
+    groups: Dict[Tuple[str, int], List[int]] = dict()
+    expressions = list()
+    for hostname in hostnames:
+        prefix, width, number = _split(hostname)
+        if number < 0:
+            if hostname not in expressions:
+                expressions.append(hostname)
+            continue
+        groups.setdefault((prefix, width), list()).append(number)
+
+    for (prefix, width), numbers in groups.items():
+        numbers = sorted(set(numbers))
+        if len(numbers) == 1:
+            expressions.append(f"{prefix}{str(numbers[0]).zfill(width)}")
+        else:
+            expressions.append(f"{prefix}[{_ranges(numbers, width)}]")
+
+    return expressions
+
+
+def expand(expression: str) -> List[str]:
+    """Expand a single hostlist expression produced by `compress`."""
+    match = _RANGE_EXPRESSION.match(expression)
+    if not match:
+        return [expression]
+
+    prefix, ranges = match.groups()
+    hostnames = list()
+    for item in ranges.split(","):
+        first, _, last = item.partition("-")
+        last = last or first
+        width = len(first) if first.startswith("0") else 0
+        for number in range(int(first), int(last) + 1):
+            hostnames.append(f"{prefix}{str(number).zfill(width)}")
+    return hostnames
+
+
+def group_inventory(inventory: List[dict]) -> List[dict]:
+    """Collapse nodes with identical hardware into one inventory entry.
+
+    Nodes are bucketed by everything but their name and address, i.e. CPUs,
+    sockets, cores, threads, memory, GRES, weight, and state. Each bucket
+    becomes a single entry whose `node_name` is a hostlist expression and
+    whose `node_addr` lists the addresses in the same order Slurm expands
+    the names in.
+    """
+    buckets: Dict[str, List[dict]] = dict()
+    for node in inventory:
+        hardware = {k: v for k, v in node.items() if k not in ("node_name", "node_addr")}
+        key = json.dumps(hardware, sort_keys=True, default=str)
+        buckets.setdefault(key, list()).append(node)
+
+    grouped = list()
+    for nodes in buckets.values():
+        if len(nodes) == 1:
+            grouped.append(nodes[0])
+            continue
+
+        addresses = {node["node_name"]: node.get("node_addr") for node in nodes}
+        expressions = compress(addresses.keys())
+        hostnames = [hostname for expr in expressions for hostname in expand(expr)]
+
+        entry = dict(nodes[0])
+        entry["node_name"] = ",".join(expressions)
+        if all(addresses.values()):
+            entry["node_addr"] = ",".join(addresses[hostname] for hostname in hostnames)
+        else:
+            # Slurm resolves the names of all the nodes, not one's address
+            entry.pop("node_addr", None)
+        grouped.append(entry)
+
+    return grouped
+
+
+def compress_slurm_config(slurm_config: dict) -> dict:
+    """Return a copy of slurm_config with compressed node lists.
+
+    NodeName, PartitionName's Nodes, and DownNodes are rendered from the
+    partitions' inventories and down_nodes, so collapsing them here makes
+    slurm.conf grow with the number of distinct node types instead of the
+    number of nodes.
+    """
+    partitions = [{**partition, "inventory": group_inventory(partition["inventory"])}
+                  for partition in slurm_config.get("partitions", [])]
+    down_nodes = compress(slurm_config.get("down_nodes", []))
+
+    return {**slurm_config, "partitions": partitions, "down_nodes": down_nodes}
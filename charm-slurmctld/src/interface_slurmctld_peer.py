@@ -1,9 +1,8 @@
 #!/usr/bin/env python3
 """SlurmctldPeer."""
-import copy
 import json
 import logging
-import subprocess
+import os
 
 from ops.framework import EventBase, EventSource, Object, ObjectEvents
 
@@ -36,6 +35,9 @@ class SlurmctldPeer(Object):
         self._charm = charm
         self._relation_name = relation_name
 
+        # the hook and the peers the controllers were last scheduled for
+        self._scheduled = None
+
         self.framework.observe(
             self._charm.on[self._relation_name].relation_created,
             self._on_relation_created,
@@ -63,8 +65,8 @@ class SlurmctldPeer(Object):
         unit_relation_data["hostname"] = self._charm.hostname
         unit_relation_data["port"] = self._charm.port
 
-        # Call _on_relation_changed to assemble the slurmctld_info and
-        # emit the slurmctld_peer_available event.
+        # Assemble the slurmctld_info and emit the slurmctld_peer_available
+        # event.
         self._on_relation_changed(event)
 
     def _on_relation_changed(self, event):
@@ -72,102 +74,86 @@ class SlurmctldPeer(Object):
         # We only modify the slurmctld controller queue
         # if we are the leader. As such, we don't need to perform
         # any operations if we are not the leader.
-        if self.framework.model.unit.is_leader():
-            relation = self._relation
-
-            app_relation_data = relation.data[self.model.app]
-            unit_relation_data = relation.data[self.model.unit]
-
-            slurmctld_peers = _get_active_peers()
-            slurmctld_peers_tmp = copy.deepcopy(slurmctld_peers)
-
-            active_controller = app_relation_data.get("active_controller")
-            backup_controller = app_relation_data.get("backup_controller")
-
-            # Account for the active controller
-            # In this case, tightly couple the active controller to the leader.
-            #
-            # If we are the leader but are not the active controller,
-            # then the previous leader or active controller must have died.
-            if active_controller != self.model.unit.name:
-                app_relation_data["active_controller"] = self.model.unit.name
-
-            # Account for the backup and standby controllers
-            #
-            # If the backup controller exists in the application relation data
-            # then check that it also exists in the slurmctld_peers. If it does
-            # exist in the slurmctld peers then remove it from the list of
-            # active peers and set the rest of the peers to be standby
-            # controllers.
-            if backup_controller:
-                # Just because the backup_controller exists in the application
-                # data doesn't mean that it really exists. Check that the
-                # backup_controller that we have in the application data still
-                # exists in the list of active units. If the backup_controller
-                # isn't in the list of active units then check for
-                # slurmctld_peers > 0 and try to promote a standby to a backup.
-                if backup_controller in slurmctld_peers:
-                    slurmctld_peers_tmp.remove(backup_controller)
-                    app_relation_data["standby_controllers"] = json.dumps(
-                        slurmctld_peers_tmp
-                    )
-                else:
-                    if len(slurmctld_peers) > 0:
-                        app_relation_data[
-                            "backup_controller"
-                        ] = slurmctld_peers_tmp.pop()
-                        app_relation_data["standby_controllers"] = json.dumps(
-                            slurmctld_peers_tmp
-                        )
-                    else:
-                        app_relation_data["backup_controller"] = ""
-                        app_relation_data["standby_controllers"] = json.dumps([])
-            else:
-                if len(slurmctld_peers) > 0:
-                    app_relation_data["backup_controller"] = slurmctld_peers_tmp.pop()
-                    app_relation_data["standby_controllers"] = json.dumps(
-                        slurmctld_peers_tmp
-                    )
-                else:
-                    app_relation_data["standby_controllers"] = json.dumps([])
-
-            ctxt = {}
-            backup_controller = app_relation_data.get("backup_controller")
-
-            # NOTE: We only care about the active and backup controllers.
-            # Set the active controller info and check for and set the
-            # backup controller information if one exists.
-            ctxt["active_controller_ingress_address"] = unit_relation_data[
-                "ingress-address"
-            ]
-            ctxt["active_controller_hostname"] = self._charm.hostname
-            ctxt["active_controller_port"] = str(self._charm.port)
-
-            # If we have > 0 controllers (also have a backup), iterate over
-            # them retrieving the info for the backup and set it along with
-            # the info for the active controller, then emit the
-            # 'slurmctld_peer_available' event.
-            if backup_controller:
-                for unit in relation.units:
-                    if unit.name == backup_controller:
-                        unit_data = relation.data[unit]
-                        ctxt["backup_controller_ingress_address"] = unit_data[
-                            "ingress-address"
-                        ]
-                        ctxt["backup_controller_hostname"] = unit_data["hostname"]
-                        ctxt["backup_controller_port"] = unit_data["port"]
-            else:
-                ctxt["backup_controller_ingress_address"] = ""
-                ctxt["backup_controller_hostname"] = ""
-                ctxt["backup_controller_port"] = ""
-
-            app_relation_data["slurmctld_info"] = json.dumps(ctxt)
+        if self._schedule_controllers():
             self.on.slurmctld_peer_available.emit()
 
     def _on_relation_departed(self, event):
-        self._on_relation_changed(event)
+        """Schedule the controllers without the departed unit."""
+        self._schedule_controllers()
         self.on.slurmctld_peer_available.emit()
 
+    def _schedule_controllers(self) -> bool:
+        """Assign the active, backup and standby controllers, if we are the leader.
+
+        The roles only depend on the peers on the relation, so they are
+        assigned once per hook for a given set of peers, e.g. when
+        relation-created and deferred relation-changed events run in the
+        same hook. Return True if we are the leader.
+        """
+        if not self.framework.model.unit.is_leader():
+            return False
+
+        relation = self._relation
+        slurmctld_peers = _active_peers(relation)
+        scheduled = _hook_memo_key(slurmctld_peers)
+        if scheduled and scheduled == self._scheduled:
+            logger.debug("## slurmctld controllers already scheduled in this hook")
+            return True
+
+        app_relation_data = relation.data[self.model.app]
+        unit_relation_data = relation.data[self.model.unit]
+
+        # Account for the active controller
+        # In this case, tightly couple the active controller to the leader.
+        #
+        # If we are the leader but are not the active controller,
+        # then the previous leader or active controller must have died.
+        roles = {"active_controller": self.model.unit.name}
+
+        # Account for the backup and standby controllers
+        backup_controller, standby_controllers = _schedule_backup(
+            app_relation_data.get("backup_controller"), slurmctld_peers)
+        if backup_controller is not None:
+            roles["backup_controller"] = backup_controller
+        roles["standby_controllers"] = json.dumps(standby_controllers)
+
+        ctxt = {}
+
+        # NOTE: We only care about the active and backup controllers.
+        # Set the active controller info and check for and set the
+        # backup controller information if one exists.
+        ctxt["active_controller_ingress_address"] = unit_relation_data[
+            "ingress-address"
+        ]
+        ctxt["active_controller_hostname"] = self._charm.hostname
+        ctxt["active_controller_port"] = str(self._charm.port)
+
+        # If we have > 0 controllers (also have a backup), retrieve the info
+        # for the backup and set it along with the info for the active
+        # controller.
+        ctxt["backup_controller_ingress_address"] = ""
+        ctxt["backup_controller_hostname"] = ""
+        ctxt["backup_controller_port"] = ""
+        if backup_controller:
+            for unit in relation.units:
+                if unit.name == backup_controller:
+                    unit_data = relation.data[unit]
+                    ctxt["backup_controller_ingress_address"] = unit_data[
+                        "ingress-address"
+                    ]
+                    ctxt["backup_controller_hostname"] = unit_data["hostname"]
+                    ctxt["backup_controller_port"] = unit_data["port"]
+
+        roles["slurmctld_info"] = json.dumps(ctxt)
+
+        # only write what changed, every write is a relation-set call
+        for key, value in roles.items():
+            if app_relation_data.get(key) != value:
+                app_relation_data[key] = value
+
+        self._scheduled = scheduled
+        return True
+
     def get_slurmctld_info(self):
         """Return slurmctld info."""
         relation = self._relation
@@ -182,22 +168,33 @@ class SlurmctldPeer(Object):
         return None
 
 
-def _related_units(relid):
-    """List of related units."""
-    units_cmd_line = ["relation-list", "--format=json", "-r", relid]
-    return json.loads(subprocess.check_output(units_cmd_line).decode("UTF-8")) or []
-
-
-def _relation_ids(reltype):
-    """List of relation_ids."""
-    relid_cmd_line = ["relation-ids", "--format=json", reltype]
-    return json.loads(subprocess.check_output(relid_cmd_line).decode("UTF-8")) or []
-
-
-def _get_active_peers():
-    """Return the active_units."""
-    active_units = []
-    for rel_id in _relation_ids("slurmctld-peer"):
-        for unit in _related_units(rel_id):
-            active_units.append(unit)
-    return active_units
+def _active_peers(relation) -> list:
+    """Return the names of the peer units, sorted to schedule them in a stable order."""
+    return sorted(unit.name for unit in relation.units)
+
+
+def _hook_memo_key(peers: list):
+    """Return what identifies a scheduling in the running hook, None outside of Juju."""
+    context_id = os.environ.get("JUJU_CONTEXT_ID")
+    return (context_id, tuple(peers)) if context_id else None
+
+
+def _schedule_backup(backup_controller, slurmctld_peers: list):
+    """Return the backup and the standby controllers among the peers.
+
+    If the backup controller exists in the application relation data then
+    check that it also exists in the slurmctld_peers. If it does exist in the
+    slurmctld peers then remove it from the list of active peers and set the
+    rest of the peers to be standby controllers.
+    """
+    standby_controllers = list(slurmctld_peers)
+    # Just because the backup_controller exists in the application data
+    # doesn't mean that it really exists. If the backup_controller isn't in
+    # the list of active units then try to promote a standby to a backup.
+    if backup_controller in slurmctld_peers:
+        standby_controllers.remove(backup_controller)
+    elif standby_controllers:
+        backup_controller = standby_controllers.pop()
+    elif backup_controller:
+        backup_controller = ""
+    return backup_controller, standby_controllers
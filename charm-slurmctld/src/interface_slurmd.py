@@ -1,13 +1,14 @@
 #!/usr/bin/env python3
 """Interface slurmd."""
-import copy
-import json
 import logging
+from time import time
 
 from ops.framework import (
     EventBase, EventSource, Object, ObjectEvents, StoredState
 )
 
+import relation_codec
+
 
 logger = logging.getLogger()
 
@@ -44,6 +45,12 @@ class Slurmd(Object):
         self._charm = charm
         self._relation_name = relation_name
 
+        self._state.set_default(
+            pending_membership=list(),
+            membership_first_change=0.0,
+            membership_last_change=0.0,
+        )
+
         self.framework.observe(
             self._charm.on[self._relation_name].relation_created,
             self._on_relation_created,
@@ -63,6 +70,8 @@ class Slurmd(Object):
 
     def _on_relation_created(self, event):
         """Set our data on the relation."""
+        relation_codec.advertise(event.relation, self.model.unit)
+
         # Check that slurm has been installed so that we know the munge key is
         # available. Defer if slurm has not been installed yet.
         if not self._charm.is_slurm_installed():
@@ -96,14 +105,19 @@ class Slurmd(Object):
 
     def _on_relation_changed(self, event):
         """Emit slurmd available event."""
+        # units deployed before the codec existed did not advertise it
+        relation_codec.advertise(event.relation, self.model.unit)
+
         if event.relation.data[event.app].get("partition_info"):
             self._charm.set_slurmd_available(True)
+            self._record_membership_change(event.unit or event.app)
             self.on.slurmd_available.emit()
         else:
             event.defer()
 
     def _on_relation_departed(self, event):
         """Handle hook when 1 unit departs."""
+        self._record_membership_change(event.unit)
         self.on.slurmd_departed.emit()
 
     def _on_relation_broken(self, event):
@@ -115,6 +129,7 @@ class Slurmd(Object):
         # only. If there are no other partitions, we set slurmd_available to
         # False as well
         if self._num_relations:
+            self._record_membership_change(event.app)
             self.on.slurmd_available.emit()
         else:
             self._charm.set_slurmd_available(False)
@@ -133,8 +148,58 @@ class Slurmd(Object):
         else:
             return False
 
+    def _record_membership_change(self, member):
+        """Record a unit/application that joined, changed, or departed."""
+        if not self.framework.model.unit.is_leader() or member is None:
+            return
+
+        now = time()
+        if not self._state.pending_membership:
+            self._state.membership_first_change = now
+        self._state.membership_last_change = now
+
+        if member.name not in self._state.pending_membership:
+            self._state.pending_membership.append(member.name)
+
+    @property
+    def pending_membership(self) -> list:
+        """Return the units/applications changed since the last reconfiguration."""
+        return list(self._state.pending_membership)
+
+    def membership_settling(self, settle_time: int, max_delay: int) -> bool:
+        """Return True while a burst of membership changes is still going on.
+
+        The burst is over when no change was recorded in the last
+        `settle_time` seconds, or when the first pending change is older than
+        `max_delay` seconds.
+        """
+        if not self._state.pending_membership:
+            return False
+
+        now = time()
+        quiet = now - self._state.membership_last_change >= settle_time
+        overdue = now - self._state.membership_first_change >= max_delay
+        return not (quiet or overdue)
+
+    def clear_pending_membership(self):
+        """Forget the pending membership changes, they were applied."""
+        if self._state.pending_membership:
+            logger.debug(f"## applied slurmd membership changes: {self.pending_membership}")
+            self._state.pending_membership = list()
+
+    def _unit_inventory(self, relation, unit):
+        """Return the parsed inventory of a unit, or None if not available."""
+        inventory = relation.data[unit].get("inventory")
+        if not inventory:
+            return None
+        return relation_codec.decode(inventory)
+
     def get_slurmd_info(self) -> list:
-        """Return the node info for units of applications on the relation."""
+        """Return the node info for units of applications on the relation.
+
+        The inventories are shared by the partitions assembled from them,
+        they must not be modified.
+        """
         partitions = list()
         relations = self.framework.model.relations["slurmd"]
 
@@ -153,18 +218,31 @@ class Slurmd(Object):
                     logger.debug("## Not partition info data in relation")
                     return []
 
-                partition_info = json.loads(relation.data[app].get("partition_info"))
+                partition_info = relation_codec.decode(relation.data[app].get("partition_info"))
 
                 for unit in units:
-                    inv = relation.data[unit].get("inventory")
+                    inv = self._unit_inventory(relation, unit)
                     if inv:
-                        inventory.append(json.loads(inv))
+                        inventory.append(inv)
 
-                partition_info["inventory"] = inventory.copy()
+                partition_info["inventory"] = inventory
                 partitions.append(partition_info)
 
         return ensure_unique_partitions(partitions)
 
+    def get_raw_relation_data(self) -> list:
+        """Return the relation data get_slurmd_info() reads, as it is on the relations."""
+        relations_data = list()
+        for relation in self.framework.model.relations["slurmd"]:
+            app = relation.app
+            relations_data.append({
+                "app": app.name,
+                "partition_info": relation.data[app].get("partition_info"),
+                "units": {unit.name: relation.data[unit].get("inventory")
+                          for unit in relation.units},
+            })
+        return relations_data
+
     def set_nhc_params(self, params: str = ""):
         """Send NHC parameters to all slurmd."""
 
@@ -202,35 +280,14 @@ class Slurmd(Object):
 
 def ensure_unique_partitions(partitions):
     """Return a list of unique partitions."""
-    # Ensure we have partitions with unique inventory only
-    #
-    # 1) Create a temp copy of the partitions list and iterate
-    # over it.
-    #
-    # 2) On each pass create a temp copy of the partition itself.
-    #
-    # 3) Get the inventory from the temp partition and iterate over it to
-    # ensure we have unique entries.
-    #
-    # 4) Add the unique inventory back to the temp partition and
-    # subsequently add the temp partition back to the original partitions
-    # list.
-    #
-    # 5) Return the list of partitions with unique inventory.
-
-    partitions_tmp = copy.deepcopy(partitions)
-    for partition in partitions_tmp:
-
-        partition_tmp = copy.deepcopy(partition)
-        partitions.remove(partition)
-
-        inventory = partition_tmp["inventory"]
-
+    # Ensure we have partitions with unique inventory only, in a single pass
+    # over the nodes. The partitions are shallow copied, as the nodes'
+    # inventories are never modified.
+    unique_partitions = list()
+    for partition in partitions:
         unique_inventory = list(
-            {node["node_name"]: node for node in inventory}.values()
+            {node["node_name"]: node for node in partition["inventory"]}.values()
         )
+        unique_partitions.append({**partition, "inventory": unique_inventory})
 
-        partition_tmp["inventory"] = unique_inventory
-        partitions.append(partition_tmp)
-
-    return partitions
+    return unique_partitions
@@ -1,10 +1,11 @@
 #!/usr/bin/env python3
 """Slurmdbd."""
-import json
 import logging
 
 from ops.framework import EventBase, EventSource, Object, ObjectEvents
 
+import relation_codec
+
 
 logger = logging.getLogger()
 
@@ -58,6 +59,8 @@ class Slurmdbd(Object):
 
     def _on_relation_created(self, event):
         """Perform relation-created event operations."""
+        relation_codec.advertise(event.relation, self.model.unit)
+
         # Check that slurm has been installed so that we know the munge key is
         # available. Defer if slurm has not been installed yet.
         if not self._charm.is_slurm_installed():
@@ -77,6 +80,9 @@ class Slurmdbd(Object):
         event.relation.data[self.model.app]["cluster-name"] = self._charm.config.get("cluster-name")
 
     def _on_relation_changed(self, event):
+        # units deployed before the codec existed did not advertise it
+        relation_codec.advertise(event.relation, self.model.unit)
+
         event_app_data = event.relation.data.get(event.app)
         if event_app_data:
             slurmdbd_info = event_app_data.get("slurmdbd_info")
@@ -119,5 +125,5 @@ class Slurmdbd(Object):
                 if app_data:
                     slurmdbd_info = app_data.get("slurmdbd_info")
                     if slurmdbd_info:
-                        return json.loads(slurmdbd_info)
+                        return relation_codec.decode(slurmdbd_info)
         return None
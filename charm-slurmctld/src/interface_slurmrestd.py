@@ -1,13 +1,19 @@
 #!/usr/bin/env python3
 """SlurmrestdProvides."""
-import json
 import logging
 import uuid
 
 from ops.framework import EventBase, EventSource, Object, ObjectEvents
 
+import relation_codec
+
 logger = logging.getLogger()
 
+# slurmrestd units set this in their unit data when they fetch the slurm
+# config from etcd, older ones receive it on the relation
+CONFIG_DELIVERY_KEY = "slurm_config_delivery"
+CONFIG_DELIVERY_ETCD = "etcd"
+
 
 class SlurmrestdAvailableEvent(EventBase):
     """Emmited when slurmrestd is available."""
@@ -40,6 +46,10 @@ class Slurmrestd(Object):
             self._charm.on[relation_name].relation_created,
             self._on_relation_created
         )
+        self.framework.observe(
+            self._charm.on[relation_name].relation_changed,
+            self._on_relation_changed
+        )
         self.framework.observe(
             self._charm.on[relation_name].relation_broken,
             self._on_relation_broken
@@ -65,6 +75,12 @@ class Slurmrestd(Object):
             event.defer()
             return
 
+        # check if there's a password for the slurmrestd account, if not, defer
+        if not self._charm.etcd_slurmrestd_password:
+            logger.debug("## on_relation_created - deferring: leader not elected yet")
+            event.defer()
+            return
+
         # Get the munge_key from the slurm_ops_manager and set it to the app
         # data on the relation to be retrieved on the other side by slurmdbd.
         app_relation_data = event.relation.data[self.model.app]
@@ -73,25 +89,64 @@ class Slurmrestd(Object):
         self._charm.set_slurmrestd_available(True)
         self.on.slurmrestd_available.emit()
 
+    def _on_relation_changed(self, event):
+        """Publish the config again when the units switch to etcd.
+
+        The units announce they fetch the config from etcd after joining, the
+        config was sent on the relation until then. Endpoints published
+        before the etcd host was are completed too.
+        """
+        if not self.model.unit.is_leader() or not self._fetches_from_etcd(event.relation):
+            return
+
+        app_relation_data = event.relation.data[self.model.app]
+        if app_relation_data.get("slurm_config") or not app_relation_data.get("etcd_host"):
+            logger.debug("## slurmrestd units fetch the config from etcd, publishing it")
+            self.on.slurmrestd_available.emit()
+
     def _on_relation_broken(self, event):
         self._charm.set_slurmrestd_available(False)
         self.on.slurmrestd_unavailable.emit()
 
-    def set_slurm_config_on_app_relation_data(self, slurm_config):
-        """Set the slurm_conifg to the app data on the relation.
-
-        Setting data on the relation forces the units of related applications
-        to observe the relation-changed event so they can acquire and
-        render the updated slurm_config.
+    @staticmethod
+    def _fetches_from_etcd(relation) -> bool:
+        """Return True if all the slurmrestd units fetch the config from etcd."""
+        units = relation.units
+        return bool(units) and all(
+            relation.data[unit].get(CONFIG_DELIVERY_KEY) == CONFIG_DELIVERY_ETCD
+            for unit in units)
+
+    def publish_slurm_config(self, slurmrestd_config: dict):
+        """Announce a new version of the slurm config to slurmrestd.
+
+        Changing data on the relation forces the units of related
+        applications to observe the relation-changed event. Units fetching
+        the config from etcd get its version and hashes only, and restart
+        slurmrestd only when the restart hash changes. Older units get the
+        whole config and a restart signal, as before.
         """
         relations = self._charm.framework.model.relations.get(self._relation_name)
         for relation in relations:
             app_relation_data = relation.data[self.model.app]
-            app_relation_data["slurm_config"] = json.dumps(slurm_config)
-
-    def restart_slurmrestd(self):
-        """Send a restart signal to related slurmd applications."""
-        relations = self._charm.framework.model.relations.get(self._relation_name)
-        for relation in relations:
-            app_relation_data = relation.data[self.model.app]
-            app_relation_data["restart_slurmrestd_uuid"] = str(uuid.uuid4())
+            if self._fetches_from_etcd(relation):
+                updates = {
+                    # etcd runs on the leader, publishing the config
+                    "etcd_host": relation.data[self.model.unit].get("ingress-address", ""),
+                    "etcd_port": "2379",
+                    "etcd_slurmrestd_pass": self._charm.etcd_slurmrestd_password,
+                    "tls_cert": self._charm.model.config["tls-cert"],
+                    "ca_cert": self._charm.model.config["tls-ca-cert"],
+                    "slurm_config_version": str(slurmrestd_config["version"]),
+                    "slurm_config_hash": slurmrestd_config["hash"],
+                    "slurmrestd_restart_hash": slurmrestd_config["restart_hash"],
+                    # the whole config sent before the units were upgraded
+                    "slurm_config": "",
+                }
+                for key, value in updates.items():
+                    if app_relation_data.get(key, "") != value:
+                        app_relation_data[key] = value
+            else:
+                app_relation_data["slurm_config"] = relation_codec.encode(
+                    slurmrestd_config["slurm_config"],
+                    relation_codec.remote_decodes(relation))
+                app_relation_data["restart_slurmrestd_uuid"] = str(uuid.uuid4())
@@ -0,0 +1,83 @@
+"""Turn the slurmd inventories into the node definitions of slurm.conf.
+
+slurmd sends the NUMA and L3 cache topology of its node, and the resources
+it suggests to reserve for slurmd and the OS. The topology is informative,
+it is not rendered. The reservation is rendered as `node-specialization`
+asks for: `cores` renders CoreSpecCount, `cpus` the equivalent CpuSpecList,
+both with MemSpecLimit, and `none` renders none of them. Slurm refuses
+CoreSpecCount and CpuSpecList on the same node.
+
+slurmd also sends the features of its node, e.g. avx512 or a100, rendered
+as its Features. Partitions of the nodes with a feature can be added too.
+"""
+import logging
+from typing import Iterable, List
+
+import hostlist
+
+logger = logging.getLogger()
+
+NONE = "none"
+CORES = "cores"
+CPUS = "cpus"
+
+_TOPOLOGY_KEYS = ("numa_nodes", "topology")
+_RENDERED_SPEC_KEYS = {
+    NONE: (),
+    CORES: ("core_spec_count", "mem_spec_limit"),
+    CPUS: ("cpu_spec_list", "mem_spec_limit"),
+}
+_SPEC_KEYS = ("core_spec_count", "cpu_spec_list", "mem_spec_limit")
+
+
+def _dropped_keys(specialization: str) -> tuple:
+    """Return the inventory keys that are not part of the node definitions."""
+    if specialization not in _RENDERED_SPEC_KEYS:
+        logger.warning(f"## unknown node-specialization {specialization}, using {NONE}")
+        specialization = NONE
+
+    rendered = _RENDERED_SPEC_KEYS[specialization]
+    return _TOPOLOGY_KEYS + tuple(key for key in _SPEC_KEYS if key not in rendered)
+
+
+def node_definitions(inventory: List[dict], specialization: str) -> List[dict]:
+    """Return the node definitions of the nodes of a partition.
+
+    The inventories of nodes without topology nor reservation, e.g. of
+    slurmd charms that predate them, are returned as they are, the other
+    ones are shallow copied.
+    """
+    dropped = _dropped_keys(specialization)
+
+    definitions = list()
+    for node in inventory:
+        if not node.keys().isdisjoint(dropped):
+            node = dict(node)
+            for key in dropped:
+                node.pop(key, None)
+        definitions.append(node)
+    return definitions
+
+
+def feature_partitions(partitions: List[dict], features: Iterable[str]) -> str:
+    """Return the PartitionName lines of a partition per feature, of its nodes.
+
+    The nodes are defined in their own partitions, they are only listed in
+    these ones. Features named like a partition are skipped.
+    """
+    partition_names = {partition["partition_name"] for partition in partitions}
+
+    lines = list()
+    for feature in features:
+        if feature in partition_names:
+            logger.warning(f"## feature {feature} is named like a partition, skipping it")
+            continue
+
+        nodes = [node["node_name"]
+                 for partition in partitions
+                 for node in partition["inventory"]
+                 if feature in node.get("features", "").split(",")]
+        if nodes:
+            lines.append(f"PartitionName={feature} Nodes={','.join(hostlist.compress(nodes))} "
+                         "State=UP")
+    return "\n".join(lines)
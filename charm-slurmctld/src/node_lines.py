@@ -0,0 +1,99 @@
+"""Complete the NodeName lines of the slurm.conf slurm_ops_manager renders.
+
+The slurm.conf template of slurm_ops_manager only renders the base
+attributes of the nodes. slurmctld and slurmrestd render slurm.conf from the
+same slurm config, both complete the NodeName lines it rendered with the
+other attributes slurmd sends.
+"""
+import logging
+from pathlib import Path
+
+logger = logging.getLogger()
+
+# the NodeName attributes of slurm.conf completed here, by inventory key
+NODE_ATTRIBUTES = {
+    "gres": "Gres",
+    "tmp_disk": "TmpDisk",
+    "features": "Features",
+    "core_spec_count": "CoreSpecCount",
+    "cpu_spec_list": "CpuSpecList",
+    "mem_spec_limit": "MemSpecLimit",
+}
+
+
+def _gres(value) -> str:
+    """Return the GRES of a node, e.g. gpu:a100:4.
+
+    `set-node-gres` used to take a count of GPUs, e.g. 4, it is rendered as
+    gpu:4.
+    """
+    value = str(value).strip()
+    if value.isdigit():
+        return f"gpu:{value}" if int(value) else ""
+    return value
+
+
+def _node_attributes(node: dict) -> dict:
+    """Return the attributes completed here of a node definition."""
+    attributes = dict()
+    for key, attribute in NODE_ATTRIBUTES.items():
+        value = node.get(key)
+        if key == "gres" and value is not None:
+            value = _gres(value)
+        if value not in (None, ""):
+            attributes[attribute] = value
+    return attributes
+
+
+def _node_line(line: str, nodes: dict) -> str:
+    """Return a line of slurm.conf, with the attributes of its nodes if it defines some.
+
+    The attributes completed here replace the ones already on the line.
+    """
+    tokens = line.split()
+    name, _, value = tokens[0].partition("=") if tokens else ("", "", "")
+    node = nodes.get(value) if name.lower() == "nodename" else None
+    if node is None:
+        return line
+
+    rendered = {attribute.lower() for attribute in NODE_ATTRIBUTES.values()}
+    tokens = [token for token in tokens if token.partition("=")[0].lower() not in rendered]
+    tokens += [f"{attribute}={value}" for attribute, value in _node_attributes(node).items()]
+    return " ".join(tokens)
+
+
+def _gres_types(content: str, nodes: dict) -> str:
+    """Return the GresTypes line the GRES of the nodes need, if slurm.conf has none."""
+    if any(line.lower().startswith("grestypes=") for line in content.splitlines()):
+        return ""
+
+    types = {gres.partition(":")[0]
+             for node in nodes.values()
+             for gres in _node_attributes(node).get("Gres", "").split(",") if gres}
+    return f"GresTypes={','.join(sorted(types))}\n" if types else ""
+
+
+def complete(path: Path, slurm_config: dict) -> bool:
+    """Complete the NodeName lines of slurm.conf, return True if it changed.
+
+    The GresTypes of the nodes' GRES are added, unless slurm.conf sets
+    them already. slurm_config should be compressed, as it was rendered
+    with.
+    """
+    if not path.exists():
+        logger.debug(f"## no {path} to complete")
+        return False
+
+    nodes = {node["node_name"]: node
+             for partition in slurm_config.get("partitions", [])
+             for node in partition["inventory"]}
+    content = path.read_text()
+    completed = "".join(_node_line(line.rstrip("\n"), nodes) + "\n"
+                        for line in content.splitlines(keepends=True))
+    completed += _gres_types(completed, nodes)
+    if completed == content:
+        return False
+
+    logger.debug(f"## completing the node definitions of {path}")
+    path.write_text(completed)
+    return True
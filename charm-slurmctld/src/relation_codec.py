@@ -0,0 +1,56 @@
+"""Compressed JSON payloads in relation data.
+
+Big payloads, e.g. slurmd inventories or the slurm config sent to slurmrestd,
+go through the Juju controller every time they change. They are sent as
+`zlib+base64/<version>:<base64 of the zlib compressed JSON>` when all the
+units on the other side of the relation can decode it. Units announce the
+encodings they decode with `advertise()` in their unit data, so charms that
+predate this module keep receiving plain JSON.
+"""
+import base64
+import json
+import zlib
+
+ENCODING = "zlib+base64"
+VERSION = 1
+ENCODINGS_KEY = "relation_data_encodings"
+
+# what units advertise, and the prefix of the payloads, e.g. zlib+base64/1
+_TAG = f"{ENCODING}/{VERSION}"
+_PREFIX = f"{_TAG}:"
+
+
+def advertise(relation, unit) -> None:
+    """Announce on the relation that unit decodes compressed payloads."""
+    if relation.data[unit].get(ENCODINGS_KEY) != _TAG:
+        relation.data[unit][ENCODINGS_KEY] = _TAG
+
+
+def remote_decodes(relation) -> bool:
+    """Return True if all the remote units on the relation decode compressed payloads."""
+    units = relation.units
+    return bool(units) and all(
+        _TAG in relation.data[unit].get(ENCODINGS_KEY, "").split(",")
+        for unit in units)
+
+
+def encode(data, compress: bool = False) -> str:
+    """Return data as JSON, compressed if asked to and if it is smaller."""
+    serialized = json.dumps(data)
+    if not compress:
+        return serialized
+
+    packed = base64.b64encode(zlib.compress(serialized.encode())).decode()
+    encoded = f"{_PREFIX}{packed}"
+    return encoded if len(encoded) < len(serialized) else serialized
+
+
+def decode(value: str):
+    """Return the data of a plain or compressed JSON payload."""
+    if not value.startswith(f"{ENCODING}/"):
+        return json.loads(value)
+
+    if not value.startswith(_PREFIX):
+        raise ValueError(f"unsupported relation data encoding: {value.split(':', 1)[0]}")
+    packed = value[len(_PREFIX):]
+    return json.loads(zlib.decompress(base64.b64decode(packed)))
@@ -0,0 +1,92 @@
+"""The Slurm config files slurmctld renders itself, next to slurm.conf.
+
+slurm_ops_manager renders slurm.conf. The files rendered here come from the
+same slurm config, and are sent to slurmd with slurm.conf in configless
+mode. They are only written when their content changes.
+"""
+import logging
+from pathlib import Path
+
+from jinja2 import Environment, FileSystemLoader
+
+import node_lines
+
+logger = logging.getLogger()
+
+SLURM_CONF_DIR = Path("/etc/slurm")
+
+# slurm.conf settings of the jobs' private /tmp and /dev/shm
+JOB_CONTAINER_CONFIG = {"JobContainerType": "job_container/tmpfs", "PrologFlags": "Contain"}
+
+
+def with_job_container(custom_config: str) -> str:
+    """Return custom_config with the settings of job_container/tmpfs.
+
+    The settings the user already set in custom_config are kept as they are.
+    """
+    settings = dict()
+    for line in (custom_config or "").splitlines():
+        key, _, value = line.partition("=")
+        settings[key.strip().lower()] = value.strip()
+    lines = [f"{key}={value}" for key, value in JOB_CONTAINER_CONFIG.items()
+             if key.lower() not in settings]
+
+    # the X11 flag implies Contain
+    prolog_flags = settings.get("prologflags")
+    if prolog_flags is not None:
+        flags = {flag.strip().lower() for flag in prolog_flags.split(",")}
+        if not flags & {"contain", "x11"}:
+            logger.warning(f"## PrologFlags={prolog_flags} set in custom-config, "
+                           "job_container/tmpfs needs it to include Contain")
+    return "\n".join(filter(None, [custom_config, *lines]))
+
+
+class SlurmFiles:
+    """Render the Slurm config files slurm_ops_manager does not render."""
+
+    def __init__(self):
+        """Set the paths of the files."""
+        self._conf_dir = SLURM_CONF_DIR
+
+        template_dir = Path(__file__).parent / "templates"
+        self._environment = Environment(loader=FileSystemLoader(template_dir),
+                                        trim_blocks=True, lstrip_blocks=True)
+
+    def _write(self, name: str, template: str, ctxt: dict) -> bool:
+        """Render a file, return True if its content changed."""
+        content = self._environment.get_template(template).render(ctxt)
+        path = self._conf_dir / name
+        if path.exists() and path.read_text() == content:
+            return False
+
+        logger.debug(f"## writing {path}")
+        path.write_text(content)
+        return True
+
+    def write_node_definitions(self, slurm_config: dict) -> bool:
+        """Complete the NodeName lines of slurm.conf, see node_lines.complete()."""
+        return node_lines.complete(self._conf_dir / "slurm.conf", slurm_config)
+
+    def write_gres_conf(self, slurm_config: dict) -> bool:
+        """Write the gres.conf of the nodes that sent theirs.
+
+        Nodes grouped in hostlist expressions have the same devices, so
+        slurm_config should be compressed.
+        """
+        nodes = [node
+                 for partition in slurm_config.get("partitions", [])
+                 for node in partition["inventory"]
+                 if node.get("gres_conf")]
+        return self._write("gres.conf", "gres.conf.tmpl", {"nodes": nodes})
+
+    def write_job_container_conf(self, slurm_config: dict) -> bool:
+        """Write the job_container.conf of the jobs' private /tmp.
+
+        Nodes that sent a scratch_path keep the jobs' /tmp there, the other
+        ones in slurmd's spool directory.
+        """
+        nodes = [node
+                 for partition in slurm_config.get("partitions", [])
+                 for node in partition["inventory"]
+                 if node.get("scratch_path")]
+        return self._write("job_container.conf", "job_container.conf.tmpl", {"nodes": nodes})
@@ -1,10 +1,8 @@
 #!/usr/bin/env python3
 """SlurmdCharm."""
 import os
-import json
 import logging
 from pathlib import Path
-from time import sleep
 
 from omnietcd3 import Etcd3AuthClient
 from ops.charm import CharmBase, CharmEvents
@@ -13,6 +11,9 @@ from ops.main import main
 from ops.model import ActiveStatus, BlockedStatus, WaitingStatus
 from slurm_ops_manager import SlurmManager
 
+import probe_cache
+import readiness
+from hook_profile import HookProfiler
 from interface_slurmd import Slurmd
 from interface_slurmd_peer import SlurmdPeer
 
@@ -51,6 +52,8 @@ class SlurmdCharm(CharmBase):
     def __init__(self, *args):
         """Init _stored attributes and interfaces, observe events."""
         super().__init__(*args)
+        self._hook_profile = HookProfiler(self)
+        self._probes = probe_cache.ProbeCache(self)
 
         self._stored.set_default(
             nhc_conf=str(),
@@ -61,6 +64,8 @@ class SlurmdCharm(CharmBase):
             etcd_slurmd_pass=str(),
             etcd_tls_cert=str(),
             etcd_ca_cert=str(),
+            etcd_watched=False,
+            slurmd_starting=False,
         )
 
         self._slurm_manager = SlurmManager(self, "slurmd")
@@ -90,6 +95,7 @@ class SlurmdCharm(CharmBase):
             self.on.set_node_weight_action: self._on_set_node_weight_action,
             self.on.set_node_gres_action: self._on_set_node_gres_action,
             self.on.show_nhc_config_action: self._on_show_nhc_config,
+            self.on.hook_profile_action: self._on_hook_profile_action,
         }
         for event, handler in event_handler_bindings.items():
             self.framework.observe(event, handler)
@@ -107,6 +113,8 @@ class SlurmdCharm(CharmBase):
         custom_repo = self.config.get("custom-slurm-repo")
         successful_installation = self._slurm_manager.install(custom_repo, nhc_path)
         logger.debug(f"### slurmd installed: {successful_installation}")
+        # the host changed, e.g. it may need a reboot now
+        self._probes.invalidate()
 
         if successful_installation:
             self._stored.slurm_installed = True
@@ -130,9 +138,16 @@ class SlurmdCharm(CharmBase):
     def _on_upgrade(self, event):
         """Perform upgrade operations."""
         self.unit.set_workload_version(Path("version").read_text().strip())
+        self._probes.invalidate()
+
+        # send what the new revision reports of the hardware
+        self._slurmd.rescan_hardware()
+        self._slurmd.update_inventory()
 
     def _on_update_status(self, event):
         """Handle update status."""
+        # e.g. replaced DIMMs or GPUs, no-op unless the hardware changed
+        self._slurmd.update_inventory()
         self._check_status()
 
     def _check_status(self) -> bool:
@@ -143,7 +158,8 @@ class SlurmdCharm(CharmBase):
         - slurmctld available and working
         - munge key configured and working
         """
-        if self._slurm_manager.needs_reboot:
+        if not self._probes.check(probe_cache.REBOOT,
+                                  lambda: not self._slurm_manager.needs_reboot):
             self.unit.status = BlockedStatus("Machine needs reboot")
             return False
 
@@ -163,7 +179,7 @@ class SlurmdCharm(CharmBase):
             self.unit.status = WaitingStatus("Waiting on: slurmctld")
             return False
 
-        if not self._slurm_manager.check_munged():
+        if not self._probes.check(probe_cache.MUNGE, self._slurm_manager.check_munged):
             self.unit.status = BlockedStatus("Error configuring munge key")
             return False
 
@@ -174,26 +190,36 @@ class SlurmdCharm(CharmBase):
         self.unit.status = ActiveStatus("slurmd available")
         return True
 
-    def ensure_slurmd_starts(self, max_attemps=10) -> bool:
-        """Ensure slurmd is up and running."""
-        logger.debug("## Stoping slurmd")
-        self._slurm_manager.slurm_systemctl('stop')
+    def ensure_slurmd_starts(self) -> bool:
+        """Restart slurmd, return True once it is ready.
 
-        for i in range(max_attemps):
-            if self._slurm_manager.slurm_is_active():
-                logger.debug("## Slurmd running")
-                break
-            else:
-                logger.warning("## Slurmd not running, trying to start it")
-                self.unit.status = WaitingStatus("Starting slurmd")
-                self._slurm_manager.restart_slurm_component()
-                sleep(2 + i)
+        It has readiness.DEADLINE seconds to be active and to listen on its
+        port, the caller defers its event otherwise. The retries only wait
+        for slurmd, it is restarted again only if it is not active anymore.
+        """
+        if self._stored.slurmd_starting and self._slurm_manager.slurm_is_active():
+            logger.debug("## Slurmd already restarted, waiting for it")
+        else:
+            logger.debug("## Stoping slurmd")
+            self._slurm_manager.slurm_systemctl('stop')
+
+            self.unit.status = WaitingStatus("Starting slurmd")
+            self._slurm_manager.restart_slurm_component()
+            self._stored.slurmd_starting = True
 
-        if self._slurm_manager.slurm_is_active():
+        if readiness.wait(self._slurmd_ready):
+            logger.debug("## Slurmd running")
+            self._stored.slurmd_starting = False
             return True
-        else:
-            self.unit.status = BlockedStatus("Cannot start slurmd")
-            return False
+
+        logger.warning("## Slurmd not ready, retrying later")
+        self.unit.status = WaitingStatus("Waiting for slurmd to start, retrying")
+        return False
+
+    def _slurmd_ready(self) -> bool:
+        """Return True if slurmd is active and listening."""
+        return (self._slurm_manager.slurm_is_active()
+                and readiness.port_open(self._slurm_manager.port))
 
     def _set_slurmctld_available(self, flag: bool):
         """Change stored value for slurmctld availability."""
@@ -223,6 +249,7 @@ class SlurmdCharm(CharmBase):
         self._check_status()
 
         # check etcd for hostnames
+        self._stored.etcd_watched = False
         self.on.check_etcd.emit()
 
     @property
@@ -270,35 +297,37 @@ class SlurmdCharm(CharmBase):
             protocol = "https"
             ca_cert = Path("/etc/slurm/tls_cert.crt")
             ca_cert.write_text(self.etcd_tls_cert)
-            ca_cert = Path.as_posix()
+            ca_cert = ca_cert.as_posix()
         if self.etcd_ca_cert:
             ca_cert = Path("/etc/slurm/ca_cert.crt")
             ca_cert.write_text(self.etcd_ca_cert)
-            ca_cert = Path.as_posix()
+            ca_cert = ca_cert.as_posix()
 
         logger.debug(f"## Connecting to etcd3 in {protocol}://{host}:{port}, {ca_cert}")
         client = Etcd3AuthClient(host=host, port=port,
                                  protocol=protocol, ca_cert=ca_cert,
-                                 username=username, password=password)
-
-        logger.debug("## Querying etcd3 for node list")
+                                 username=username, password=password,
+                                 timeout=10)
+
+        # wait for slurmctld to account for this node, so slurmd starts as soon
+        # as it happens instead of on a future hook. Only the first check
+        # waits, the deferred ones look the key up without blocking their hook
+        key = f"nodes/accounted/{self.hostname}"
+        timeout = 0
+        if not self._stored.etcd_watched:
+            timeout = self.config.get("etcd-watch-timeout")
+            self._stored.etcd_watched = True
+        logger.debug(f"## Waiting up to {timeout}s for etcd3 key {key}")
         try:
-            v = client.get(key="nodes/all_nodes")
-            logger.debug(f"## Got: {v}")
+            node_accounted = client.wait_for_key(key, timeout)
         except Exception as e:
-            logger.error(f"## Unable to connect to {host} to get list of nodes: {e}")
+            logger.error(f"## Unable to connect to {host} to check node accounting: {e}")
             event.defer()
             return
 
-        node_accounted = False
-        if v:
-            hostnames = json.loads(v[0])
-            logger.debug(f"### etcd3 node list: {hostnames}")
-            if self.hostname in hostnames:
-                self.on.slurmctld_started.emit()
-                node_accounted = True
-
-        if not node_accounted:
+        if node_accounted:
+            self.on.slurmctld_started.emit()
+        else:
             logger.debug("## Node not accounted for. Deferring.")
             event.defer()
 
@@ -327,9 +356,10 @@ class SlurmdCharm(CharmBase):
         # slurmctld accounted for this node. It should be safe to start slurmd
         if self.ensure_slurmd_starts():
             logger.debug("## slurmctld started and slurmd is running")
+            self._check_status()
         else:
+            # keep the status telling slurmd is not ready
             event.defer()
-        self._check_status()
 
     def _on_config_changed(self, event):
         """Handle charm configuration changes."""
@@ -343,6 +373,9 @@ class SlurmdCharm(CharmBase):
                 self._stored.nhc_conf = nhc_conf
                 self._slurm_manager.render_nhc_config(nhc_conf)
 
+        # no-op unless the scratch path or the hardware changed
+        self._slurmd.update_inventory()
+
     def get_partition_name(self) -> str:
         """Return the partition_name in the slurmd relation."""
         # Determine if a user-supplied partition-name config exists, if so
@@ -379,7 +412,9 @@ class SlurmdCharm(CharmBase):
             self._slurmd.get_stored_munge_key()
         )
 
-        if self._slurm_manager.restart_munged():
+        restarted = self._slurm_manager.restart_munged()
+        self._probes.invalidate(probe_cache.MUNGE)
+        if restarted:
             logger.debug("## Munge restarted succesfully")
         else:
             logger.error("## Unable to restart munge")
@@ -399,7 +434,9 @@ class SlurmdCharm(CharmBase):
     def _on_node_configured_action(self, event):
         """Remove node from DownNodes."""
         # trigger reconfig
-        self._slurmd.configure_new_node()
+        if not self._slurmd.configure_new_node():
+            event.fail(message=f"slurmd is not ready: {self.unit.status.message}")
+            return
         logger.debug('### This node is not new anymore')
 
     def _on_get_node_inventory_action(self, event):
@@ -413,40 +450,30 @@ class SlurmdCharm(CharmBase):
 
     def _on_set_node_inventory_action(self, event):
         """Overwrite the node inventory."""
-        inventory = self._slurmd.node_inventory
-
-        # update local copy of inventory
-        memory = event.params.get("real-memory", inventory["real_memory"])
-        inventory["real_memory"] = memory
-
-        # send it to slurmctld
-        self._slurmd.node_inventory = inventory
+        memory = event.params.get("real-memory")
+        if memory is None:
+            memory = self._slurmd.node_inventory["real_memory"]
+        else:
+            # send it to slurmctld, and keep it over hardware scans
+            self._slurmd.override_inventory("real_memory", memory)
 
         event.set_results({"real-memory": memory})
 
     def _on_set_node_weight_action(self, event):
         """Overwrite the node inventory."""
-        inventory = self._slurmd.node_inventory
-
-        # update local copy of inventory
         weight = event.params.get("value")
-        inventory["weight"] = weight
 
-        # send it to slurmctld
-        self._slurmd.node_inventory = inventory
+        # send it to slurmctld, and keep it over hardware scans
+        self._slurmd.override_inventory("weight", weight)
 
         event.set_results({"weight": weight})
 
     def _on_set_node_gres_action(self, event):
         """Overwrite the node inventory."""
-        inventory = self._slurmd.node_inventory
-
-        # update local copy of inventory
         gres = event.params.get("value")
-        inventory["gres"] = gres
 
-        # send it to slurmctld
-        self._slurmd.node_inventory = inventory
+        # send it to slurmctld, and keep it over hardware scans
+        self._slurmd.override_inventory("gres", gres)
 
         event.set_results({"gres": gres})
 
@@ -455,6 +482,10 @@ class SlurmdCharm(CharmBase):
         nhc_conf = self._slurm_manager.get_nhc_config()
         event.set_results({"nhc.conf": nhc_conf})
 
+    def _on_hook_profile_action(self, event):
+        """Show the slowest of the last hooks and the calls they spent time in."""
+        event.set_results(self._hook_profile.report(event.params["limit"]))
+
     def _on_set_partition_info_on_app_relation_data(self, event):
         """Set the slurm partition info on the application relation data."""
         # Only the leader can set data on the relation.
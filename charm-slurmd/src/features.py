@@ -0,0 +1,125 @@
+"""Derive the node features jobs can be constrained to, e.g. `-C avx512`.
+
+The features are the instruction set tiers of the CPUs, their
+microarchitecture and the types of the GPUs. They are read from the first
+processor of /proc/cpuinfo, the processors of a node share their flags.
+"""
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+from sysfs import CPUINFO, ROOT
+
+# the x86-64 microarchitecture levels of the psABI, each one needs the
+# flags of the previous ones. /proc/cpuinfo names LZCNT abm, and SSE3 pni
+X86_64_LEVELS = (
+    ("x86_64_v2", {"cx16", "lahf_lm", "popcnt", "pni", "sse4_1", "sse4_2", "ssse3"}),
+    ("x86_64_v3", {"abm", "avx", "avx2", "bmi1", "bmi2", "f16c", "fma", "movbe", "xsave"}),
+    ("x86_64_v4", {"avx512bw", "avx512cd", "avx512dq", "avx512f", "avx512vl"}),
+)
+# instruction sets codes are commonly built for, and the flags they need
+ISA_FEATURES = {
+    "avx2": {"avx2"},
+    "avx512": {"avx512f"},
+    "avx512_vnni": {"avx512_vnni"},
+    "avx512_bf16": {"avx512_bf16"},
+    "amx": {"amx_tile"},
+    "sve": {"sve"},
+    "sve2": {"sve2"},
+}
+
+# microarchitectures of family 6 Intel CPUs, by model, and of Xeons sharing
+# their model, by their first stepping
+INTEL_MODELS = {
+    0x3f: "haswell",
+    0x4f: "broadwell",
+    0x56: "broadwell",
+    0x55: [(0, "skylake"), (5, "cascadelake"), (10, "cooperlake")],
+    0x6a: "icelake",
+    0x6c: "icelake",
+    0x8f: "sapphirerapids",
+    0xcf: "emeraldrapids",
+    0xad: "graniterapids",
+    0xae: "graniterapids",
+}
+# microarchitectures of AMD CPUs, by family and first model
+AMD_MODELS = {
+    0x17: [(0x00, "zen"), (0x30, "zen2")],
+    0x19: [(0x00, "zen3"), (0x10, "zen4"), (0x20, "zen3"), (0x60, "zen4")],
+    0x1a: [(0x00, "zen5")],
+}
+# microarchitectures of Arm CPUs, by implementer and part
+ARM_PARTS = {
+    ("0x41", "0xd0c"): "neoverse_n1",
+    ("0x41", "0xd40"): "neoverse_v1",
+    ("0x41", "0xd49"): "neoverse_n2",
+    ("0x41", "0xd4f"): "neoverse_v2",
+    ("0xc0", "0xac3"): "ampere1",
+}
+
+
+def processor(root: Path = ROOT) -> Dict[str, str]:
+    """Return the fields of the first processor of /proc/cpuinfo."""
+    fields = dict()
+    try:
+        with (root / CPUINFO).open() as cpuinfo:
+            for line in cpuinfo:
+                if not line.strip():
+                    if fields:
+                        break
+                    continue
+                key, _, value = line.partition(":")
+                fields[key.strip()] = value.strip()
+    except OSError:
+        pass
+    return fields
+
+
+def flags(cpu: Dict[str, str]) -> List[str]:
+    """Return the flags of a processor, x86 names them flags and arm Features."""
+    return (cpu.get("flags") or cpu.get("Features", "")).split()
+
+
+def _in_ranges(value: int, ranges: List[tuple]) -> str:
+    """Return the name of the last range starting at or before value."""
+    name = ""
+    for first, range_name in ranges:
+        if value >= first:
+            name = range_name
+    return name
+
+
+def microarchitecture(cpu: Dict[str, str]) -> str:
+    """Return the microarchitecture of a processor, empty if it is unknown."""
+    try:
+        if cpu.get("vendor_id") == "GenuineIntel" and cpu.get("cpu family") == "6":
+            name = INTEL_MODELS.get(int(cpu.get("model", "")), "")
+            if isinstance(name, list):
+                name = _in_ranges(int(cpu.get("stepping", "0")), name)
+            return name
+        if cpu.get("vendor_id") == "AuthenticAMD":
+            ranges = AMD_MODELS.get(int(cpu.get("cpu family", "")), [])
+            return _in_ranges(int(cpu.get("model", "")), ranges)
+    except ValueError:
+        return ""
+    return ARM_PARTS.get((cpu.get("CPU implementer"), cpu.get("CPU part")), "")
+
+
+def isa_features(cpu_flags: Iterable[str]) -> List[str]:
+    """Return the instruction set features of the flags of a processor."""
+    cpu_flags = set(cpu_flags)
+    features = list()
+    for level, needed in X86_64_LEVELS:
+        if not needed <= cpu_flags:
+            break
+        features.append(level)
+    features.extend(feature for feature, needed in ISA_FEATURES.items()
+                    if needed <= cpu_flags)
+    return features
+
+
+def node_features(gpu_types: Iterable[str] = (), root: Path = ROOT) -> List[str]:
+    """Return the sorted features of the node, e.g. avx512, icelake and a100."""
+    cpu = processor(root)
+    features = set(isa_features(flags(cpu))) | set(gpu_types)
+    features.add(microarchitecture(cpu))
+    return sorted(filter(None, features))
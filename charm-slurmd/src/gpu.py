@@ -0,0 +1,186 @@
+"""Discover the GPUs of the node, for its GRES and gres.conf.
+
+NVIDIA, AMD and Intel GPUs are found on the PCI bus. A GPU is only counted
+when its device file exists, i.e. when its driver is loaded: /dev/nvidiaN
+for NVIDIA, the DRM render node, e.g. /dev/dri/renderD128, for the others.
+Their type is a short name of their model, e.g. a100 or mi250x, and the
+cores they are close to are the cores of their NUMA node.
+"""
+import logging
+import re
+from pathlib import Path
+from typing import Dict, List
+
+from sysfs import (
+    ROOT, core_indexes, format_cpu_list, parse_cpu_list, pci_devices, read
+)
+
+logger = logging.getLogger()
+
+VENDORS = {"0x10de": "nvidia", "0x1002": "amd", "0x8086": "intel"}
+# PCI classes of display controllers, e.g. VGA or 3D controllers, and of
+# processing accelerators
+GPU_CLASSES = ("0x03", "0x12")
+# Intel integrated graphics are always at this address, they are no GPGPUs
+INTEGRATED_GRAPHICS = "0000:00:02.0"
+
+# the gpu plugins Slurm detects the GPUs of each vendor with, if it was
+# built with them
+AUTODETECT = {"nvidia": "nvml", "amd": "rsmi", "intel": "oneapi"}
+SLURM_PLUGIN_DIRS = ("usr/lib/x86_64-linux-gnu/slurm-wlm", "usr/lib64/slurm",
+                     "usr/lib/slurm", "usr/local/lib/slurm")
+
+PCI_IDS = ("usr/share/misc/pci.ids", "usr/share/hwdata/pci.ids")
+
+# words of model names that do not tell models apart
+_GENERIC_WORDS = {"nvidia", "amd", "ati", "intel", "corporation", "tesla", "instinct",
+                  "radeon", "data", "center", "gpu", "graphics", "accelerator", "pcie",
+                  "sxm", "sxm2", "sxm4", "sxm5", "nvl", "hbm2", "hbm2e", "hbm3"}
+
+
+def gres_type(model: str) -> str:
+    """Return the GRES type of a GPU model, e.g. a100 for NVIDIA A100-SXM4-40GB."""
+    # pci.ids puts the product name in brackets, e.g. GA100 [A100 SXM4 40GB]
+    bracketed = re.search(r"\[([^\]]+)\]", model)
+    if bracketed:
+        model = bracketed.group(1)
+
+    words = [word for word in re.split(r"[^a-z0-9]+", model.lower())
+             if word and word not in _GENERIC_WORDS and not re.fullmatch(r"\d+gb", word)]
+    for word in words:
+        if re.search(r"[a-z]", word) and re.search(r"\d", word):
+            return word
+    return "_".join(words)
+
+
+def _pci_ids_names(root: Path, vendor: str) -> Dict[str, str]:
+    """Return the names of the devices of a vendor in the pci.ids database."""
+    vendor_id = vendor[2:]
+    for pci_ids in PCI_IDS:
+        names = dict()
+        try:
+            with (root / pci_ids).open(errors="replace") as database:
+                in_vendor = False
+                for line in database:
+                    if not line.startswith("\t"):
+                        in_vendor = line.startswith(f"{vendor_id}  ")
+                        if names and not in_vendor:
+                            break
+                    elif in_vendor and not line.startswith("\t\t"):
+                        device_id, _, name = line.strip().partition("  ")
+                        names[f"0x{device_id}"] = name
+        except OSError:
+            continue
+        return names
+    return dict()
+
+
+def _nvidia_information(root: Path, address: str) -> Dict[str, str]:
+    """Return what the NVIDIA driver tells of a GPU, e.g. its model and minor."""
+    information = read(root / "proc/driver/nvidia/gpus" / address / "information")
+    fields = dict()
+    for line in information.splitlines():
+        key, _, value = line.partition(":")
+        fields[key.strip()] = value.strip()
+    return fields
+
+
+def _device_file(root: Path, device: Path, vendor: str, index: int, nvidia: dict) -> str:
+    """Return the device file of a GPU, or an empty string if it has none."""
+    if vendor == "nvidia":
+        # minors follow the PCI order, if the driver does not tell
+        minor = nvidia.get("Device Minor", str(index))
+        path = f"/dev/nvidia{minor}"
+    else:
+        render_nodes = sorted(node.name for node in (device / "drm").glob("renderD*"))
+        if not render_nodes:
+            return ""
+        path = f"/dev/dri/{render_nodes[0]}"
+
+    return path if (root / path.lstrip("/")).exists() else ""
+
+
+def _cores(device: Path, cores: Dict[int, int]) -> str:
+    """Return the Slurm core indexes close to a GPU, empty if they are all close."""
+    cpus = parse_cpu_list(read(device / "local_cpulist"))
+    local = {cores[cpu] for cpu in cpus if cpu in cores}
+    if not local or local == set(cores.values()):
+        return ""
+    return format_cpu_list(local)
+
+
+def discover(root: Path = ROOT) -> List[dict]:
+    """Return the GPUs with their vendor, type, device file, NUMA node and cores."""
+    cores = core_indexes(root)
+    model_names = dict()
+
+    gpus = list()
+    indexes = dict()
+    for device in pci_devices(root):
+        vendor = VENDORS.get(read(device / "vendor"))
+        if (not vendor or device.name == INTEGRATED_GRAPHICS
+                or not read(device / "class").startswith(GPU_CLASSES)):
+            continue
+        index = indexes[vendor] = indexes.get(vendor, -1) + 1
+
+        nvidia = _nvidia_information(root, device.name) if vendor == "nvidia" else dict()
+        device_file = _device_file(root, device, vendor, index, nvidia)
+        if not device_file:
+            logger.debug(f"## no device file for the GPU {device.name}, skipping it")
+            continue
+
+        device_id = read(device / "device")
+        model = nvidia.get("Model") or read(device / "product_name")
+        if not model:
+            if vendor not in model_names:
+                model_names[vendor] = _pci_ids_names(root, read(device / "vendor"))
+            model = model_names[vendor].get(device_id, "")
+
+        numa_node = int(read(device / "numa_node", "-1"))
+        gpus.append({
+            "vendor": vendor,
+            "type": gres_type(model) or f"{vendor}_{device_id[2:]}",
+            "file": device_file,
+            "numa_node": numa_node if numa_node >= 0 else None,
+            "cores": _cores(device, cores),
+        })
+    return gpus
+
+
+def gres(gpus: List[dict]) -> str:
+    """Return the GRES of the GPUs, e.g. gpu:a100:4."""
+    counts = dict()
+    for gpu in gpus:
+        counts[gpu["type"]] = counts.get(gpu["type"], 0) + 1
+    return ",".join(f"gpu:{gpu_type}:{count}" for gpu_type, count in sorted(counts.items()))
+
+
+def autodetect(gpus: List[dict], root: Path = ROOT) -> str:
+    """Return the AutoDetect plugin for the GPUs, empty if Slurm has none."""
+    vendors = {gpu["vendor"] for gpu in gpus}
+    if len(vendors) != 1:
+        return ""
+
+    plugin = AUTODETECT[vendors.pop()]
+    for plugin_dir in SLURM_PLUGIN_DIRS:
+        if (root / plugin_dir / f"gpu_{plugin}.so").exists():
+            return plugin
+    return ""
+
+
+def gres_conf(gpus: List[dict], root: Path = ROOT) -> dict:
+    """Return the gres.conf of the node: its AutoDetect plugin, or its devices."""
+    plugin = autodetect(gpus, root)
+    if plugin:
+        return {"autodetect": plugin}
+
+    return {"devices": [{"name": "gpu", "type": gpu["type"], "file": gpu["file"],
+                         "cores": gpu["cores"]}
+                        for gpu in gpus]}
+
+
+def device_files(root: Path = ROOT) -> List[str]:
+    """Return the GPU device files, they come and go with the drivers."""
+    dev = root / "dev"
+    return sorted([path.name for path in dev.glob("nvidia[0-9]*")]
+                  + [f"dri/{path.name}" for path in dev.glob("dri/renderD*")])
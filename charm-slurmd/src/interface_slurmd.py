@@ -7,7 +7,9 @@ from ops.framework import (
     EventBase, EventSource, Object, ObjectEvents, StoredState,
 )
 from ops.model import Relation
-from utils import get_inventory
+from utils import get_inventory, hardware_fingerprint
+
+import relation_codec
 
 logger = logging.getLogger(__name__)
 
@@ -45,7 +47,12 @@ class Slurmd(Object):
             slurmctld_addr=str(),
             slurmctld_port=str(),
             etcd_port=str(),
-            nhc_params=str()
+            nhc_params=str(),
+            hardware_fingerprint=str(),
+            # JSON, the nested values of the stored state do not serialize
+            hardware_inventory=str(),
+            # values set with the set-node-* actions, kept over scans
+            inventory_overrides=dict(),
         )
 
         self.framework.observe(
@@ -77,10 +84,35 @@ class Slurmd(Object):
         node_name = self._charm.hostname
         node_addr = event.relation.data[self.model.unit]["ingress-address"]
 
-        inv = get_inventory(node_name, node_addr)
+        inv = self._scan_inventory(node_name, node_addr)
         inv["new_node"] = True
         self.node_inventory = inv
 
+    def _scan_hardware(self, node_name: str, node_addr: str) -> bool:
+        """Scan the node inventory if the hardware changed, return True if it did."""
+        scratch_path = self._charm.config.get("scratch-path")
+        fingerprint = hardware_fingerprint(scratch_path=scratch_path)
+        if fingerprint == self._stored.hardware_fingerprint:
+            return False
+
+        logger.debug("## hardware changed, scanning the node inventory")
+        inventory = get_inventory(node_name, node_addr, scratch_path=scratch_path)
+        self._stored.hardware_inventory = json.dumps(inventory)
+        self._stored.hardware_fingerprint = fingerprint
+        return True
+
+    def _inventory(self, node_name: str, node_addr: str) -> dict:
+        """Return the last scanned inventory, with the values set by the actions."""
+        return {**json.loads(self._stored.hardware_inventory),
+                **self._stored.inventory_overrides,
+                "node_name": node_name,
+                "node_addr": node_addr}
+
+    def _scan_inventory(self, node_name: str, node_addr: str) -> dict:
+        """Return the node inventory, scanning the hardware only if it changed."""
+        self._scan_hardware(node_name, node_addr)
+        return self._inventory(node_name, node_addr)
+
     def _on_relation_joined(self, event):
         """Handle the relation-joined event.
 
@@ -120,12 +152,17 @@ class Slurmd(Object):
         Possible scenarios:
         - nhc parameters changed
         - tls parameters changed
+        - slurmctld units now decode compressed inventories
         """
 
         app_data = event.relation.data[event.app]
         self._store_nhc_params(app_data.get("nhc_params"))
         self._store_tls_params(app_data.get("tls_cert"), app_data.get("ca_cert"))
 
+        # re-encode the inventory, it is only rewritten if the encoding changed
+        if self._relation.data[self.model.unit].get("inventory"):
+            self.node_inventory = self.node_inventory
+
     def _on_relation_broken(self, event):
         """Perform relation broken operations."""
         self.on.slurmctld_unavailable.emit()
@@ -156,12 +193,15 @@ class Slurmd(Object):
     @property
     def node_inventory(self) -> dict:
         """Return unit inventory."""
-        return json.loads(self._relation.data[self.model.unit]["inventory"])
+        return relation_codec.decode(self._relation.data[self.model.unit]["inventory"])
 
     @node_inventory.setter
     def node_inventory(self, inventory: dict):
-        """Set unit inventory."""
-        self._relation.data[self.model.unit]["inventory"] = json.dumps(inventory)
+        """Set unit inventory, compressed if all slurmctld units decode it."""
+        relation = self._relation
+        encoded = relation_codec.encode(inventory, relation_codec.remote_decodes(relation))
+        if relation.data[self.model.unit].get("inventory") != encoded:
+            relation.data[self.model.unit]["inventory"] = encoded
 
     def set_partition_info_on_app_relation_data(self, partition_info):
         """Set the slurmd partition on the app relation data.
@@ -173,8 +213,8 @@ class Slurmd(Object):
         # there is only one slurmctld, so there should be only one relation here
         relations = self._charm.framework.model.relations["slurmd"]
         for relation in relations:
-            relation.data[self.model.app]["partition_info"] = json.dumps(
-                partition_info
+            relation.data[self.model.app]["partition_info"] = relation_codec.encode(
+                partition_info, relation_codec.remote_decodes(relation)
             )
 
     def _store_munge_key(self, munge_key: str):
@@ -234,10 +274,50 @@ class Slurmd(Object):
         """Retrieve the munge_key from the StoredState."""
         return self._stored.munge_key
 
-    def configure_new_node(self):
-        """Set this node as not new and trigger a reconfiguration."""
+    def update_inventory(self):
+        """Scan the hardware again, and send the inventory if it changed.
+
+        The hardware is only scanned when its fingerprint changes, which is
+        cheap enough for every update-status, and the inventory is only
+        written to the relation when its values change. The new_node flag and
+        the values set with the set-node-* actions are kept.
+        """
+        if not (self.is_joined and self._relation.data[self.model.unit].get("inventory")):
+            return
+
+        inventory = self.node_inventory
+        if not self._scan_hardware(inventory["node_name"], inventory["node_addr"]):
+            return
+
+        scanned = self._inventory(inventory["node_name"], inventory["node_addr"])
+        scanned["new_node"] = inventory.get("new_node", False)
+        if scanned != inventory:
+            logger.info("## node inventory changed, sending it to slurmctld")
+            self.node_inventory = scanned
+
+    def rescan_hardware(self):
+        """Scan the hardware at the next inventory update, even if it did not change.
+
+        A new charm revision may report more of the same hardware.
+        """
+        self._stored.hardware_fingerprint = ""
+
+    def override_inventory(self, key: str, value):
+        """Set a value of the inventory, kept when the hardware is scanned again."""
+        self._stored.inventory_overrides[key] = value
+        inventory = self.node_inventory
+        inventory[key] = value
+        self.node_inventory = inventory
+
+    def configure_new_node(self) -> bool:
+        """Set this node as not new and trigger a reconfiguration.
+
+        Return False if slurmd is not ready after its restart.
+        """
         inv = self.node_inventory
         inv["new_node"] = False
         self.node_inventory = inv
-        self._charm.ensure_slurmd_starts()
+        if not self._charm.ensure_slurmd_starts():
+            return False
         self._charm._check_status()
+        return True
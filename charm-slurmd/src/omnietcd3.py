@@ -4,7 +4,10 @@
 import logging
 
 from etcd3gw.client import Etcd3Client
-from etcd3gw.exceptions import Etcd3Exception
+from etcd3gw.exceptions import (
+    ConnectionFailedError, ConnectionTimeoutError, Etcd3Exception, WatchTimedOut,
+)
+from etcd3gw.utils import _decode, _encode, _increment_last_byte
 
 logger = logging.getLogger(__name__)
 
@@ -13,8 +16,14 @@ class Etcd3AuthClient(Etcd3Client):
     """Handle etcd3 requests with auth."""
     def __init__(self, host='localhost', port=2379, protocol="http",
                  ca_cert=None, cert_key=None, cert_cert=None, timeout=None,
-                 username=None, password=None, api_path="/v3/"):
-        """Initialize class."""
+                 username=None, password=None, api_path="/v3/", token=None,
+                 on_token=None):
+        """Initialize class.
+
+        A token from a previous authentication can be reused with `token`,
+        `on_token` is called with the new token every time the client
+        (re)authenticates.
+        """
         super(Etcd3AuthClient, self).__init__(host=host,
                                               port=port,
                                               protocol=protocol,
@@ -25,6 +34,17 @@ class Etcd3AuthClient(Etcd3Client):
                                               api_path=api_path)
         self.username = username
         self.password = password
+        # etcd3gw sets the timeout on the session, which requests ignores,
+        # so we pass it on every request
+        self.timeout = timeout
+        self.on_token = on_token
+        if token:
+            self.session.headers['Authorization'] = token
+
+    @property
+    def token(self):
+        """Return the current auth token."""
+        return self.session.headers.get('Authorization')
 
     def authenticate(self):
         """Authenticate the client."""
@@ -41,7 +61,8 @@ class Etcd3AuthClient(Etcd3Client):
         # that called post.
         response = super(Etcd3AuthClient, self).post(
             self.get_url('/auth/authenticate'),
-            json={"name": self.username, "password": self.password}
+            json={"name": self.username, "password": self.password},
+            timeout=self.timeout,
         )
 
         # Add Authorization header with the received token to the
@@ -51,14 +72,20 @@ class Etcd3AuthClient(Etcd3Client):
         # covered by adding a header to kwargs in the following post
         # method.
         self.session.headers['Authorization'] = response['token']
+        if self.on_token:
+            self.on_token(response['token'])
 
     def post(self, *args, **kwargs):
         """Wrap the internal post function with authentication."""
+        kwargs.setdefault("timeout", self.timeout)
         try:
             # Try the post. If no authentication is needed, or if an
             # Authorization token has been added to the session's
             # headers, and is still valid, this should succeed.
             return super(Etcd3AuthClient, self).post(*args, **kwargs)
+        except (ConnectionFailedError, ConnectionTimeoutError):
+            # (re)authenticating would not help
+            raise
         except Etcd3Exception as e:
             if self.username and self.password:
                 # Etcd auth credentials are configured, so assume the
@@ -72,3 +99,103 @@ class Etcd3AuthClient(Etcd3Client):
                 return super(Etcd3AuthClient, self).post(*args, **kwargs)
 
             raise
+
+    def get_prefix_keys(self, key_prefix):
+        """Return the keys, without values, starting with key_prefix."""
+        payload = {"key": _encode(key_prefix),
+                   "range_end": _encode(_increment_last_byte(key_prefix)),
+                   "keys_only": True}
+        result = self.post(self.get_url("/kv/range"), json=payload)
+        return [_decode(kv["key"]).decode() for kv in result.get("kvs", [])]
+
+    def batch(self, puts=None, deletes=None, max_ops=128):
+        """Put and delete keys with as few transactions as possible.
+
+        etcd limits the number of operations in a transaction (128 by
+        default, see --max-txn-ops), bigger batches are split.
+        """
+        ops = [{"request_put": {"key": _encode(key), "value": _encode(value)}}
+               for key, value in (puts or {}).items()]
+        ops.extend({"request_delete_range": {"key": _encode(key)}}
+                   for key in (deletes or []))
+
+        for i in range(0, len(ops), max_ops):
+            self.transaction({"compare": [],
+                              "success": ops[i:i + max_ops],
+                              "failure": []})
+
+    def wait_for_key(self, key, timeout):
+        """Return True if key exists or is created within timeout seconds."""
+        result = self.post(self.get_url("/kv/range"),
+                           json={"key": _encode(key), "count_only": True})
+        if int(result.get("count", 0)) > 0:
+            return True
+
+        if not timeout:
+            return False
+
+        # watch from the revision we just read, so a key created in between
+        # is not missed
+        revision = int(result["header"]["revision"])
+        try:
+            event = self.watch_once(key, timeout=timeout, start_revision=revision + 1)
+        except WatchTimedOut:
+            return False
+
+        # PUT is the default event type, which etcd omits from the response
+        return event.get("type", "PUT") == "PUT"
+
+    def _auth(self, path, **payload):
+        """Post a request to the auth API."""
+        return self.post(self.get_url(f"/auth/{path}"), json=payload)
+
+    def auth_enabled(self):
+        """Return True if authentication is enabled."""
+        return bool(self._auth("status").get("enabled"))
+
+    def auth_enable(self):
+        """Enable authentication."""
+        self._auth("enable")
+
+    def user_list(self):
+        """Return the names of all users."""
+        return self._auth("user/list").get("users", [])
+
+    def user_add(self, name, password):
+        """Create a new user."""
+        self._auth("user/add", name=name, password=password)
+
+    def user_change_password(self, name, password):
+        """Change the password of an existing user."""
+        self._auth("user/changepw", name=name, password=password)
+
+    def user_roles(self, name):
+        """Return the roles granted to a user."""
+        return self._auth("user/get", name=name).get("roles", [])
+
+    def user_grant_role(self, name, role):
+        """Grant a role to a user."""
+        self._auth("user/grant", user=name, role=role)
+
+    def role_list(self):
+        """Return the names of all roles."""
+        return self._auth("role/list").get("roles", [])
+
+    def role_add(self, name):
+        """Create a new role."""
+        self._auth("role/add", name=name)
+
+    def role_prefix_permissions(self, name):
+        """Return the role permissions as a set of (type, key prefix) tuples."""
+        permissions = set()
+        for perm in self._auth("role/get", role=name).get("perm", []):
+            # READ is the default permission type, which etcd omits
+            permissions.add((perm.get("permType", "READ"), _decode(perm["key"]).decode()))
+        return permissions
+
+    def role_grant_prefix_permission(self, name, perm_type, key_prefix):
+        """Grant a role the READ, WRITE, or READWRITE permission to a key prefix."""
+        perm = {"permType": perm_type,
+                "key": _encode(key_prefix),
+                "range_end": _encode(_increment_last_byte(key_prefix))}
+        self._auth("role/grant", name=name, perm=perm)
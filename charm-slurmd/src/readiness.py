@@ -0,0 +1,48 @@
+"""Wait for a Slurm daemon to be ready, for a bounded time.
+
+A daemon is ready when systemd reports it active and it accepts
+connections on its port. It is polled with an exponential backoff, from
+`FIRST_DELAY` to `MAX_DELAY` seconds between polls, until `DEADLINE`
+seconds have passed. The charm returns as soon as the daemon is ready, and
+defers its event otherwise, instead of sleeping through the whole hook.
+"""
+import logging
+import socket
+from time import sleep, time
+from typing import Callable
+
+logger = logging.getLogger()
+
+FIRST_DELAY = 0.5
+MAX_DELAY = 5
+DEADLINE = 20
+
+# connections to the daemons are local, they are answered or refused at once
+CONNECT_TIMEOUT = 1
+
+
+def port_open(port: int, host: str = "127.0.0.1") -> bool:
+    """Return True if something accepts connections on the port."""
+    try:
+        with socket.create_connection((host, int(port)), timeout=CONNECT_TIMEOUT):
+            return True
+    except (OSError, ValueError):
+        return False
+
+
+def wait(ready: Callable[[], bool], deadline: float = DEADLINE) -> bool:
+    """Poll ready until it returns True, return False if it did not by the deadline."""
+    end = time() + deadline
+    delay = FIRST_DELAY
+    polls = 0
+    while True:
+        polls += 1
+        if ready():
+            return True
+
+        remaining = end - time()
+        if remaining <= 0:
+            logger.debug(f"## not ready after {polls} polls in {deadline}s")
+            return False
+        sleep(min(delay, remaining))
+        delay = min(delay * 2, MAX_DELAY)
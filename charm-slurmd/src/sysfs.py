@@ -0,0 +1,80 @@
+"""Read the kernel's view of the hardware from /sys and /proc.
+
+All the functions take the root of the filesystem to read, so they can be
+pointed at a copy of the host's /sys and /proc.
+"""
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+ROOT = Path("/")
+
+CPU_DIR = "sys/devices/system/cpu"
+NODE_DIR = "sys/devices/system/node"
+CPUINFO = "proc/cpuinfo"
+MEMINFO = "proc/meminfo"
+MOUNTS = "proc/mounts"
+PCI_DIR = "sys/bus/pci/devices"
+
+
+def read(path: Path, default: str = "") -> str:
+    """Return the stripped content of a file, or default if it can not be read."""
+    try:
+        return path.read_text().strip()
+    except OSError:
+        return default
+
+
+def parse_cpu_list(cpu_list: str) -> List[int]:
+    """Return the ids in a kernel cpu list, e.g. 0-3,8,10-11."""
+    ids = list()
+    for item in cpu_list.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        first, _, last = item.partition("-")
+        ids.extend(range(int(first), int(last or first) + 1))
+    return ids
+
+
+def format_cpu_list(ids: Iterable[int]) -> str:
+    """Return the kernel cpu list of ids, e.g. 0-3,8,10-11."""
+    ranges = list()
+    for cpu in sorted(set(ids)):
+        if ranges and cpu == ranges[-1][1] + 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ",".join(str(first) if first == last else f"{first}-{last}"
+                    for first, last in ranges)
+
+
+def online_cpus(root: Path = ROOT) -> List[int]:
+    """Return the ids of the online CPUs."""
+    cpu_dir = root / CPU_DIR
+    return (parse_cpu_list(read(cpu_dir / "online"))
+            or parse_cpu_list(read(cpu_dir / "present")))
+
+
+def core_indexes(root: Path = ROOT) -> Dict[int, int]:
+    """Return Slurm's abstract core index of each online CPU.
+
+    Slurm numbers the cores socket by socket, in the order of their ids,
+    whatever ids the kernel gives them.
+    """
+    cpu_dir = root / CPU_DIR
+    cores = dict()
+    for cpu in online_cpus(root):
+        topology = cpu_dir / f"cpu{cpu}" / "topology"
+        socket = int(read(topology / "physical_package_id", "0"))
+        cores[cpu] = (socket, int(read(topology / "core_id", str(cpu))))
+
+    indexes = {core: index for index, core in enumerate(sorted(set(cores.values())))}
+    return {cpu: indexes[core] for cpu, core in cores.items()}
+
+
+def pci_devices(root: Path = ROOT) -> List[Path]:
+    """Return the PCI devices, none if /sys/bus/pci is not available."""
+    try:
+        return sorted((root / PCI_DIR).iterdir())
+    except OSError:
+        return list()
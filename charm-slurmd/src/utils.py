@@ -1,78 +1,239 @@
 #!/usr/bin/env python3
-"""utils.py module for slurmd charm."""
+"""utils.py module for slurmd charm.
+
+The node inventory is read from /sys and /proc, without running lscpu,
+lspci, or free. All the functions take the root of the filesystem to read,
+see sysfs.py.
+"""
+import hashlib
+import json
 import os
-import subprocess
-import sys
+from pathlib import Path
+from typing import List, Tuple
+
+import features
+import gpu
+from sysfs import (
+    CPU_DIR, MEMINFO, MOUNTS, NODE_DIR, ROOT, format_cpu_list, online_cpus,
+    parse_cpu_list, pci_devices, read
+)
 
-from slurm_ops_manager.utils import get_real_mem
+# the resources reserved for slurmd and the OS: no cores on sockets with less
+# than 4 cores, and 1/32 of the memory, between 1 and 16GiB, on nodes with at
+# least 8GiB
+SPEC_MIN_CORES_PER_SOCKET = 4
+SPEC_MIN_MEMORY = 8192
+SPEC_MEMORY_FRACTION = 32
+SPEC_MIN_MEM_LIMIT = 1024
+SPEC_MAX_MEM_LIMIT = 16384
 
+# filesystems of local block devices, that can hold the scratch space of jobs
+LOCAL_FILESYSTEMS = ("ext2", "ext3", "ext4", "xfs", "btrfs", "f2fs")
+# local filesystems that are not for scratch space, and the ones under /snap
+SYSTEM_MOUNTS = ("/", "/boot", "/boot/efi", "/home", "/usr", "/var")
+# directory of the jobs on the scratch filesystem found by the charm
+SCRATCH_DIR = "slurm"
 
-def lscpu():
-    """Return lscpu as a python dictionary."""
 
-    def format_key(lscpu_key):
-        key_lower = lscpu_key.lower()
-        replace_hyphen = key_lower.replace("-", "_")
-        replace_lparen = replace_hyphen.replace("(", "")
-        replace_rparen = replace_lparen.replace(")", "")
-        return replace_rparen.replace(" ", "_")
+def cpu_info(root: Path = ROOT) -> dict:
+    """Return cpu info needed to generate node inventory.
 
-    lscpu_out = subprocess.check_output(["lscpu"])
-    lscpu_lines = lscpu_out.decode().strip().split("\n")
+    The values are strings, as lscpu printed them.
+    """
+    cpu_dir = root / CPU_DIR
+    present = parse_cpu_list(read(cpu_dir / "present"))
+    online = online_cpus(root)
 
+    sockets = set()
+    cores = set()
+    for cpu in online:
+        topology = cpu_dir / f"cpu{cpu}" / "topology"
+        socket = read(topology / "physical_package_id", "0")
+        sockets.add(socket)
+        cores.add((socket, read(topology / "core_id", str(cpu))))
+
+    sockets_count = max(len(sockets), 1)
+    cores_count = max(len(cores), 1)
     return {
-        format_key(line.split(":")[0].strip()): line.split(":")[1].strip()
-        for line in lscpu_lines
+        "cpus": str(len(present) or len(online)),
+        "threads_per_core": str(max(len(online) // cores_count, 1)),
+        "cores_per_socket": str(max(cores_count // sockets_count, 1)),
+        "sockets_per_board": str(sockets_count),
     }
 
 
-def cpu_info():
-    """Return cpu info needed to generate node inventory."""
-    ls_cpu = lscpu()
+def numa_info(root: Path = ROOT) -> List[dict]:
+    """Return the CPU list and the memory, in MiB, of each NUMA node."""
+    node_dir = root / NODE_DIR
+    numa = list()
+    for node in parse_cpu_list(read(node_dir / "online")):
+        memory = 0
+        for line in read(node_dir / f"node{node}" / "meminfo").splitlines():
+            # e.g. Node 0 MemTotal:       131899580 kB
+            fields = line.split()
+            if fields[2:3] == ["MemTotal:"] and fields[3].isdigit():
+                memory = int(fields[3]) // 1024
+        numa.append({
+            "node": node,
+            "cpus": read(node_dir / f"node{node}" / "cpulist"),
+            "memory": memory,
+        })
+    return numa
+
+
+def l3_domains(root: Path = ROOT) -> List[str]:
+    """Return the CPU lists of the L3 caches, one per cache."""
+    cpu_dir = root / CPU_DIR
+    domains = set()
+    for cpu in online_cpus(root):
+        for index in (cpu_dir / f"cpu{cpu}" / "cache").glob("index[0-9]*"):
+            if read(index / "level") == "3":
+                domains.add(read(index / "shared_cpu_list"))
+    domains.discard("")
+    return sorted(domains, key=parse_cpu_list)
+
+
+def specialization(cpus: dict, real_memory: str) -> dict:
+    """Return the resources slurmd suggests to reserve for itself and the OS.
+
+    The last core of every socket, as a CoreSpecCount and as the equivalent
+    CpuSpecList, and a share of the memory as MemSpecLimit, in MiB. Small
+    nodes do not get a reservation.
+    """
+    sockets = int(cpus["sockets_per_board"])
+    cores = int(cpus["cores_per_socket"])
+    threads = int(cpus["threads_per_core"])
+    memory = int(real_memory)
+
+    spec = dict()
+    if cores >= SPEC_MIN_CORES_PER_SOCKET:
+        # CpuSpecList holds Slurm's abstract CPU ids, which number the
+        # threads core by core and socket by socket
+        last_cores = ((socket * cores + cores - 1) * threads + thread
+                      for socket in range(sockets)
+                      for thread in range(threads))
+        spec["core_spec_count"] = str(sockets)
+        spec["cpu_spec_list"] = format_cpu_list(last_cores)
+    if memory >= SPEC_MIN_MEMORY:
+        limit = min(max(memory // SPEC_MEMORY_FRACTION, SPEC_MIN_MEM_LIMIT), SPEC_MAX_MEM_LIMIT)
+        spec["mem_spec_limit"] = str(limit)
+    return spec
+
+
+def meminfo(root: Path = ROOT) -> dict:
+    """Return /proc/meminfo, in kB."""
+    info = dict()
+    for line in read(root / MEMINFO).splitlines():
+        key, _, value = line.partition(":")
+        fields = value.split()
+        if fields and fields[0].isdigit():
+            info[key.strip()] = int(fields[0])
+    return info
+
+
+def get_real_mem(root: Path = ROOT) -> str:
+    """Return the total memory in MiB, as `free -m` reports it."""
+    return str(meminfo(root).get("MemTotal", 0) // 1024)
 
-    return {
-        "cpus": ls_cpu["cpus"],
-        "threads_per_core": ls_cpu["threads_per_core"],
-        "cores_per_socket": ls_cpu["cores_per_socket"],
-        "sockets_per_board": ls_cpu["sockets"],
-    }
 
+def local_mounts(root: Path = ROOT) -> List[Tuple[str, str]]:
+    """Return the device and mount point of the local filesystems."""
+    mounts = list()
+    for line in read(root / MOUNTS).splitlines():
+        fields = line.split()
+        if len(fields) < 3 or fields[2] not in LOCAL_FILESYSTEMS:
+            continue
+        # spaces and tabs of mount points are octal escapes, e.g. \040
+        mount_point = fields[1].encode().decode("unicode_escape")
+        mounts.append((fields[0], mount_point))
+    return mounts
+
+
+def filesystem_size(path: str, root: Path = ROOT) -> int:
+    """Return the size, in MiB, of the filesystem of path, or of its closest parent."""
+    target = root / path.lstrip("/")
+    while not target.exists() and target != root:
+        target = target.parent
 
-def lspci_nvidia():
-    """Check for and return the count of nvidia gpus."""
-    gpus = 0
     try:
-        gpus = int(
-            subprocess.check_output(
-                "lspci | grep -i nvidia | awk '{print $1}' "
-                "| cut -d : -f 1 | sort -u | wc -l",
-                shell=True,
-            )
-            .decode()
-            .strip()
-        )
-    except subprocess.CalledProcessError as e:
-        print(e)
-        sys.exit(-1)
-
-    for graphics_processing_unit in range(gpus):
-        gpu_path = "/dev/nvidia" + str(graphics_processing_unit)
-        if not os.path.exists(gpu_path):
-            return 0
-    return gpus
-
-
-def get_inventory(node_name, node_addr):
+        stat = os.statvfs(target)
+    except OSError:
+        return 0
+    return stat.f_blocks * stat.f_frsize // 2**20
+
+
+def scratch(path: str = "", root: Path = ROOT) -> Tuple[str, int]:
+    """Return the scratch directory of jobs, and the size of its filesystem in MiB.
+
+    A configured path is used as it is. Otherwise, the largest local
+    filesystem that is not a system one, if it is larger than the filesystem
+    of /tmp. The directory is empty if jobs use /tmp.
+    """
+    if path:
+        return path, filesystem_size(path, root)
+
+    tmp_size = filesystem_size("/tmp", root)
+    sizes = {mount_point: filesystem_size(mount_point, root)
+             for _, mount_point in local_mounts(root)
+             if mount_point not in SYSTEM_MOUNTS and not mount_point.startswith("/snap/")}
+    if sizes:
+        largest = max(sorted(sizes), key=sizes.get)
+        if sizes[largest] > tmp_size:
+            return f"{largest.rstrip('/')}/{SCRATCH_DIR}", sizes[largest]
+    return "", tmp_size
+
+
+def hardware_fingerprint(root: Path = ROOT, scratch_path: str = "") -> str:
+    """Return a hash of the hardware the inventory describes.
+
+    It only reads a few files and lists a few directories, so it is cheap
+    enough to tell on every hook if the inventory must be scanned again. The
+    configured scratch path is part of it, as it changes the inventory too.
+    """
+    cpu_dir = root / CPU_DIR
+    hardware = {
+        "present": read(cpu_dir / "present"),
+        "online": read(cpu_dir / "online"),
+        "nodes": read(root / NODE_DIR / "online"),
+        "memory": meminfo(root).get("MemTotal"),
+        "pci": [device.name for device in pci_devices(root)],
+        "gpu_device_files": gpu.device_files(root),
+        # new kernels and microcodes may tell of new instruction sets
+        "cpu_flags": features.flags(features.processor(root)),
+        "mounts": local_mounts(root),
+        "scratch_path": scratch_path,
+    }
+    return hashlib.sha256(json.dumps(hardware, sort_keys=True).encode()).hexdigest()
+
+
+def get_inventory(node_name, node_addr, root: Path = ROOT, scratch_path: str = ""):
     """Assemble and return the node info."""
+    cpus = cpu_info(root)
+    real_memory = get_real_mem(root)
+    numa = numa_info(root)
     inventory = {
         "node_name": node_name,
         "node_addr": node_addr,
         "state": "UNKNOWN",
-        "real_memory": get_real_mem(),
-        **cpu_info(),
+        "real_memory": real_memory,
+        **cpus,
+        "numa_nodes": str(len(numa) or 1),
+        "topology": {"numa": numa, "l3": l3_domains(root)},
+        **specialization(cpus, real_memory),
     }
 
-    gpus = lspci_nvidia()
-    if gpus > 0:
-        inventory["gres"] = gpus
+    gpus = gpu.discover(root)
+    if gpus:
+        inventory["gres"] = gpu.gres(gpus)
+        inventory["gres_conf"] = gpu.gres_conf(gpus, root)
+
+    node_features = features.node_features([gpu["type"] for gpu in gpus], root)
+    if node_features:
+        inventory["features"] = ",".join(node_features)
+
+    scratch_path, tmp_disk = scratch(scratch_path, root)
+    if tmp_disk:
+        inventory["tmp_disk"] = str(tmp_disk)
+    if scratch_path:
+        inventory["scratch_path"] = scratch_path
     return inventory
@@ -2,8 +2,10 @@
 """Slurmdbd Operator Charm."""
 import logging
 from pathlib import Path
-from time import sleep
 
+import probe_cache
+import readiness
+from hook_profile import HookProfiler
 from interface_mysql import MySQLClient
 from interface_slurmdbd import Slurmdbd
 from interface_slurmdbd_peer import SlurmdbdPeer
@@ -30,11 +32,16 @@ class WriteConfigAndRestartSlurmdbd(EventBase):
     """Emitted when config needs to be written."""
 
 
+class CheckSlurmdbd(EventBase):
+    """Emitted when slurmdbd was restarted, deferred until it is ready."""
+
+
 class SlurmdbdCharmEvents(CharmEvents):
     """Slurmdbd emitted events."""
     jwt_available = EventSource(JwtAvailable)
     munge_available = EventSource(MungeAvailable)
     write_config = EventSource(WriteConfigAndRestartSlurmdbd)
+    check_slurmdbd = EventSource(CheckSlurmdbd)
 
 
 class SlurmdbdCharm(CharmBase):
@@ -46,6 +53,8 @@ class SlurmdbdCharm(CharmBase):
     def __init__(self, *args):
         """Set the default class attributes."""
         super().__init__(*args)
+        self._hook_profile = HookProfiler(self)
+        self._probes = probe_cache.ProbeCache(self)
 
         self._stored.set_default(
             db_info=dict(),
@@ -69,6 +78,7 @@ class SlurmdbdCharm(CharmBase):
             self.on.jwt_available: self._on_jwt_available,
             self.on.munge_available: self._on_munge_available,
             self.on.write_config: self._write_config_and_restart_slurmdbd,
+            self.on.check_slurmdbd: self._on_check_slurmdbd,
             self._db.on.database_available: self._write_config_and_restart_slurmdbd,
             self._db.on.database_unavailable: self._on_db_unavailable,
             self._slurmdbd_peer.on.slurmdbd_peer_available: self._write_config_and_restart_slurmdbd,
@@ -76,6 +86,8 @@ class SlurmdbdCharm(CharmBase):
             self._slurmdbd.on.slurmctld_unavailable: self._on_slurmctld_unavailable,
             # fluentbit
             self.on["fluentbit"].relation_created: self._on_fluentbit_relation_created,
+            # actions
+            self.on.hook_profile_action: self._on_hook_profile_action,
         }
         for event, handler in event_handler_bindings.items():
             self.framework.observe(event, handler)
@@ -88,6 +100,8 @@ class SlurmdbdCharm(CharmBase):
 
         custom_repo = self.config.get("custom-slurm-repo")
         successful_installation = self._slurm_manager.install(custom_repo)
+        # the host changed, e.g. it may need a reboot now
+        self._probes.invalidate()
 
         if successful_installation:
             self._stored.slurm_installed = True
@@ -103,6 +117,10 @@ class SlurmdbdCharm(CharmBase):
         """Set up Fluentbit log forwarding."""
         self._configure_fluentbit()
 
+    def _on_hook_profile_action(self, event):
+        """Show the slowest of the last hooks and the calls they spent time in."""
+        event.set_results(self._hook_profile.report(event.params["limit"]))
+
     def _configure_fluentbit(self):
         logger.debug("## Configuring fluentbit")
         cfg = list()
@@ -113,6 +131,7 @@ class SlurmdbdCharm(CharmBase):
     def _on_upgrade(self, event):
         """Perform upgrade operations."""
         self.unit.set_workload_version(Path("version").read_text().strip())
+        self._probes.invalidate()
 
     def _on_update_status(self, event):
         """Handle update status."""
@@ -139,7 +158,9 @@ class SlurmdbdCharm(CharmBase):
         munge_key = self._slurmdbd.get_munge_key()
         self._slurm_manager.configure_munge_key(munge_key)
 
-        if self._slurm_manager.restart_munged():
+        restarted = self._slurm_manager.restart_munged()
+        self._probes.invalidate(probe_cache.MUNGE)
+        if restarted:
             logger.debug("## Munge restarted succesfully")
             self._stored.munge_available = True
         else:
@@ -192,11 +213,6 @@ class SlurmdbdCharm(CharmBase):
         self._slurm_manager.slurm_systemctl("stop")
         self._slurm_manager.render_slurm_configs(slurmdbd_config)
 
-        # At this point, we must guarantee that slurmdbd is correctly
-        # initialized. Its startup might take a while, so we have to wait
-        # for it.
-        self._check_slurmdbd()
-
         # Only the leader can set relation data on the application.
         # Enforce that no one other then the leader trys to set
         # application relation data.
@@ -205,30 +221,50 @@ class SlurmdbdCharm(CharmBase):
                 slurmdbd_config,
             )
 
-        self._check_status()
+        # At this point, we must guarantee that slurmdbd is correctly
+        # initialized. Its startup might take a while, e.g. to upgrade the
+        # database, so it is waited for in an event deferred until it is
+        # ready, instead of in this hook.
+        self.on.check_slurmdbd.emit()
+
+    def _on_check_slurmdbd(self, event):
+        """Start slurmdbd if it is not running, and wait for it to be ready."""
+        if self._check_slurmdbd():
+            self._check_status()
+        else:
+            # keep the status telling slurmdbd is not ready
+            event.defer()
 
-    def _check_slurmdbd(self, max_attemps=3) -> None:
-        """Ensure slurmdbd is up and running."""
+    def _check_slurmdbd(self) -> bool:
+        """Ensure slurmdbd is up and running, return True once it is ready.
+
+        It has readiness.DEADLINE seconds to be active and to listen on its
+        port.
+        """
         logger.debug("## Checking if slurmdbd is active")
 
-        for i in range(max_attemps):
-            if self._slurm_manager.slurm_is_active():
-                logger.debug("## Slurmdbd running")
-                break
-            else:
-                logger.warning("## Slurmdbd not running, trying to start it")
-                self.unit.status = WaitingStatus("Starting slurmdbd")
-                self._slurm_manager.restart_slurm_component()
-                sleep(1 + i)
-
-        if self._slurm_manager.slurm_is_active():
-            self._check_status()
-        else:
-            self.unit.status = BlockedStatus("Cannot start slurmdbd")
+        if not self._slurm_manager.slurm_is_active():
+            logger.warning("## Slurmdbd not running, trying to start it")
+            self.unit.status = WaitingStatus("Starting slurmdbd")
+            self._slurm_manager.restart_slurm_component()
+
+        if readiness.wait(self._slurmdbd_ready):
+            logger.debug("## Slurmdbd running")
+            return True
+
+        logger.warning("## Slurmdbd not ready, retrying later")
+        self.unit.status = WaitingStatus("Waiting for slurmdbd to start, retrying")
+        return False
+
+    def _slurmdbd_ready(self) -> bool:
+        """Return True if slurmdbd is active and listening."""
+        return (self._slurm_manager.slurm_is_active()
+                and readiness.port_open(self._slurm_manager.port))
 
     def _check_status(self) -> bool:
         """Check that we have the things we need."""
-        if self._slurm_manager.needs_reboot:
+        if not self._probes.check(probe_cache.REBOOT,
+                                  lambda: not self._slurm_manager.needs_reboot):
             self.unit.status = BlockedStatus("Machine needs reboot")
             return False
 
@@ -269,7 +305,7 @@ class SlurmdbdCharm(CharmBase):
             self.unit.status = WaitingStatus("slurmdbd starting")
             return False
 
-        if not self._slurm_manager.check_munged():
+        if not self._probes.check(probe_cache.MUNGE, self._slurm_manager.check_munged):
             self.unit.status = WaitingStatus("munged starting")
             return False
 
@@ -0,0 +1,240 @@
+"""Time the hooks, and the commands, requests and renders they spend it in.
+
+Profiling is off unless the `hook-profile` config is set. The profiler then
+wraps the public functions the charms and slurm-ops-manager call out of the
+process with:
+
+- subprocess calls, e.g. `systemctl` or `scontrol`
+- etcd and InfluxDB requests
+- jinja2 template renders
+
+The Juju hook tools ops runs are not wrapped, their time is part of the
+hook duration only.
+
+At the end of every profiled hook one JSON line with the hook duration, the
+time spent in each category and call, and the slowest calls is appended to
+`hook-profile.jsonl` in the charm directory. Only the last `MAX_HOOKS` hooks
+are kept.
+"""
+import functools
+import json
+import logging
+import os
+import subprocess
+import time
+from pathlib import Path
+from typing import Callable, Optional
+from urllib.parse import urlparse
+
+from ops.framework import Object
+
+logger = logging.getLogger()
+
+CONFIG_KEY = "hook-profile"
+PROFILE_FILE = "hook-profile.jsonl"
+MAX_HOOKS = 200
+SLOWEST_CALLS = 5
+
+# the profiler of the running hook, the wrappers record nothing without one
+_profiler: Optional["HookProfiler"] = None
+# calls nested in a timed call, e.g. subprocess.check_output() calling
+# subprocess.run(), are part of the outer call
+_depth = 0
+
+
+def _command(args, **kwargs) -> str:
+    """Describe a command without the values of its arguments.
+
+    Commands may receive secrets as key=value arguments, so only the program
+    and its first two arguments, cut at "=", are recorded.
+    """
+    argv = args if isinstance(args, (list, tuple)) else str(args).split()
+    if not argv:
+        return ""
+    words = [Path(str(argv[0])).name] + [str(arg).partition("=")[0] for arg in argv[1:3]]
+    return " ".join(words)
+
+
+def _etcd_request(client, url, *args, **kwargs) -> str:
+    """Describe an etcd request by its API path, e.g. /v3/kv/range."""
+    return urlparse(str(url)).path
+
+
+def _etcd_watch(client, key, *args, **kwargs) -> str:
+    """Describe an etcd watch."""
+    return "watch"
+
+
+def _influxdb_request(client, url, method="GET", *args, **kwargs) -> str:
+    """Describe an InfluxDB request by its method and endpoint."""
+    return f"{method} {url}"
+
+
+def _render(template, *args, **kwargs) -> str:
+    """Describe a template render by the template name."""
+    return str(template.name)
+
+
+def _timed(category: str, describe: Callable, func: Callable) -> Callable:
+    """Return func recording its duration in the running hook's profile."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        global _depth
+        if _profiler is None or _depth:
+            return func(*args, **kwargs)
+
+        _depth += 1
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _depth -= 1
+            _profiler.record(category, describe(*args, **kwargs),
+                             time.perf_counter() - start)
+
+    wrapper.hook_profile = True
+    return wrapper
+
+
+def _patch(owner, name: str, category: str, describe: Callable) -> None:
+    """Wrap owner.name once per process."""
+    func = getattr(owner, name)
+    if not getattr(func, "hook_profile", False):
+        setattr(owner, name, _timed(category, describe, func))
+
+
+def _install() -> None:
+    """Wrap the functions that leave the charm's process."""
+    for name in ("run", "call", "check_call", "check_output"):
+        _patch(subprocess, name, "subprocess", _command)
+
+    # not all the charms install the etcd, InfluxDB, and jinja2 libraries
+    try:
+        from etcd3gw.client import Etcd3Client
+        _patch(Etcd3Client, "post", "etcd", _etcd_request)
+        _patch(Etcd3Client, "watch_once", "etcd", _etcd_watch)
+    except ImportError:
+        pass
+
+    try:
+        from influxdb import InfluxDBClient
+        _patch(InfluxDBClient, "request", "influxdb", _influxdb_request)
+    except ImportError:
+        pass
+
+    try:
+        from jinja2 import Template
+        _patch(Template, "render", "render", _render)
+    except ImportError:
+        pass
+
+
+def _hook_name() -> str:
+    """Return the name of the running hook or action."""
+    action = os.environ.get("JUJU_ACTION_NAME")
+    if action:
+        return f"{action}-action"
+    return os.environ.get("JUJU_HOOK_NAME") or Path(os.environ.get("JUJU_DISPATCH_PATH", "")).name
+
+
+class HookProfiler(Object):
+    """Profile the running hook and keep the profiles of the last hooks."""
+
+    def __init__(self, charm, filename: str = PROFILE_FILE):
+        """Start profiling the hook, if the hook-profile config is set."""
+        super().__init__(charm, "hook-profile")
+        global _profiler
+
+        self._path = Path(charm.charm_dir) / filename
+        self.enabled = bool(charm.config.get(CONFIG_KEY))
+        if not self.enabled:
+            return
+
+        self._start_time = time.time()
+        self._start = time.perf_counter()
+        self._categories = dict()
+        self._calls = dict()
+        self._slowest = list()
+
+        _install()
+        _profiler = self
+        # the framework commits once the hook and the deferred events ran
+        self.framework.observe(self.framework.on.commit, self._on_commit)
+
+    def record(self, category: str, call: str, seconds: float) -> None:
+        """Account for a call of the running hook."""
+        for totals, key in ((self._categories, category), (self._calls, f"{category} {call}")):
+            count, total = totals.get(key, (0, 0.0))
+            totals[key] = (count + 1, total + seconds)
+
+        self._slowest.append((seconds, category, call))
+        self._slowest.sort(reverse=True)
+        del self._slowest[SLOWEST_CALLS:]
+
+    def profile(self) -> dict:
+        """Return the profile of the running hook."""
+        def totals(entries):
+            return {key: {"count": count, "seconds": round(seconds, 6)}
+                    for key, (count, seconds) in entries.items()}
+
+        return {
+            "hook": _hook_name(),
+            "unit": self.model.unit.name,
+            "start": self._start_time,
+            "seconds": round(time.perf_counter() - self._start, 6),
+            "categories": totals(self._categories),
+            "calls": totals(self._calls),
+            "slowest": [{"category": category, "call": call, "seconds": round(seconds, 6)}
+                        for seconds, category, call in self._slowest],
+        }
+
+    def _on_commit(self, event):
+        """Append the profile of the hook to the profile file."""
+        try:
+            lines = self._read_lines()[-(MAX_HOOKS - 1):]
+            lines.append(json.dumps(self.profile(), sort_keys=True))
+            tmp = self._path.with_suffix(".tmp")
+            tmp.write_text("\n".join(lines) + "\n")
+            tmp.replace(self._path)
+        except OSError as e:
+            logger.warning(f"## could not write the hook profile: {e}")
+
+    def _read_lines(self) -> list:
+        if not self._path.exists():
+            return list()
+        return self._path.read_text().splitlines()
+
+    def profiles(self) -> list:
+        """Return the profiles of the last hooks, oldest first."""
+        profiles = list()
+        for line in self._read_lines():
+            try:
+                profiles.append(json.loads(line))
+            except json.JSONDecodeError:
+                logger.debug("## skipping a corrupted hook profile")
+        return profiles
+
+    def report(self, limit: int = 10) -> dict:
+        """Return the slowest hooks and the calls most time was spent in.
+
+        The results are formatted to be returned by an action.
+        """
+        profiles = self.profiles()
+
+        calls = dict()
+        for profile in profiles:
+            for call, totals in profile["calls"].items():
+                entry = calls.setdefault(call, {"count": 0, "seconds": 0.0, "hooks": 0})
+                entry["count"] += totals["count"]
+                entry["seconds"] = round(entry["seconds"] + totals["seconds"], 6)
+                entry["hooks"] += 1
+
+        slowest_hooks = sorted(profiles, key=lambda profile: profile["seconds"], reverse=True)
+        slowest_calls = sorted(calls.items(), key=lambda item: item[1]["seconds"], reverse=True)
+
+        return {
+            "hooks": json.dumps(slowest_hooks[:limit], indent=2),
+            "calls": json.dumps(dict(slowest_calls[:limit]), indent=2),
+            "profiled-hooks": len(profiles),
+            "profiling": "on" if self.enabled else f"off, set the {CONFIG_KEY} config",
+        }
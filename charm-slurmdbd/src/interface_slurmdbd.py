@@ -1,12 +1,13 @@
 #! /usr/bin/env python3
 """Slurmdbd."""
-import json
 import logging
 
 from ops.framework import (
     EventBase, EventSource, Object, ObjectEvents, StoredState,
 )
 
+import relation_codec
+
 
 logger = logging.getLogger()
 
@@ -125,8 +126,8 @@ class Slurmdbd(Object):
         # Iterate over each of the relations setting the relation data.
         for relation in relations:
             if slurmdbd_info != "":
-                relation.data[self.model.app]["slurmdbd_info"] = json.dumps(
-                    slurmdbd_info
+                relation.data[self.model.app]["slurmdbd_info"] = relation_codec.encode(
+                    slurmdbd_info, relation_codec.remote_decodes(relation)
                 )
             else:
                 relation.data[self.model.app]["slurmdbd_info"] = ""
@@ -1,9 +1,8 @@
 #!/usr/bin/env python3
 """SlurmdbdPeer."""
-import copy
 import json
 import logging
-import subprocess
+import os
 
 from ops.framework import EventBase, EventSource, Object, ObjectEvents
 
@@ -31,6 +30,9 @@ class SlurmdbdPeer(Object):
         self._charm = charm
         self._relation_name = relation_name
 
+        # the hook and the peers slurmdbd was last scheduled for
+        self._scheduled = None
+
         self.framework.observe(
             self._charm.on[self._relation_name].relation_created,
             self._on_relation_created,
@@ -54,8 +56,8 @@ class SlurmdbdPeer(Object):
         unit_relation_data["hostname"] = self._charm.get_hostname()
         unit_relation_data["port"] = self._charm.get_port()
 
-        # Call _on_relation_changed to assemble the slurmdbd_info and
-        # emit the slurmdbd_peer_available event.
+        # Assemble the slurmdbd_info and emit the slurmdbd_peer_available
+        # event.
         self._on_relation_changed(event)
 
     def _on_relation_changed(self, event):
@@ -63,99 +65,86 @@ class SlurmdbdPeer(Object):
         # We only modify the slurmdbd queue if we are the leaader.
         # As such, we dont need to preform any operations here
         # if we are not the leader.
-        if self.framework.model.unit.is_leader():
-            relation = self.framework.model.get_relation(self._relation_name)
-
-            app_relation_data = relation.data[self.model.app]
-            unit_relation_data = relation.data[self.model.unit]
-
-            slurmdbd_peers = _get_active_peers()
-            slurmdbd_peers_tmp = copy.deepcopy(slurmdbd_peers)
-
-            active_slurmdbd = app_relation_data.get("active_slurmdbd")
-            backup_slurmdbd = app_relation_data.get("backup_slurmdbd")
-
-            # Account for the active slurmdbd
-            # In this case, tightly couple the active slurmdbd to the leader.
-            #
-            # If we are the leader but are not the active slurmdbd,
-            # then the previous slurmdbd leader must have died.
-            # Set our unit to the active_slurmdbd.
-            if active_slurmdbd != self.model.unit.name:
-                app_relation_data["active_slurmdbd"] = self.model.unit.name
-
-            # Account for the backup and standby slurmdbd
-            #
-            # If the backup slurmdbd exists in the application relation data
-            # then check that it also exists in the slurmdbd_peers. If it does
-            # exist in the slurmdbd peers then remove it from the list of
-            # active peers and set the rest of the peers to be standbys.
-            if backup_slurmdbd:
-                # Just because the backup_slurmdbd exists in the application
-                # data doesn't mean that it really exists. Check that the
-                # backup_slurmdbd that we have in the application data still
-                # exists in the list of active units. If the backup_slurmdbd
-                # isn't in the list of active units then check for
-                # slurmdbd_peers > 0 and try to promote a standby to a backup.
-                if backup_slurmdbd in slurmdbd_peers:
-                    slurmdbd_peers_tmp.remove(backup_slurmdbd)
-                    app_relation_data["standby_slurmdbd"] = json.dumps(
-                        slurmdbd_peers_tmp
-                    )
-                else:
-                    if len(slurmdbd_peers) > 0:
-                        app_relation_data["backup_slurmdbd"] = slurmdbd_peers_tmp.pop()
-                        app_relation_data["standby_slurmdbd"] = json.dumps(
-                            slurmdbd_peers_tmp
-                        )
-                    else:
-                        app_relation_data["backup_slurmdbd"] = ""
-                        app_relation_data["standby_slurmdbd"] = json.dumps([])
-            else:
-                if len(slurmdbd_peers) > 0:
-                    app_relation_data["backup_slurmdbd"] = slurmdbd_peers_tmp.pop()
-                    app_relation_data["standby_slurmdbd"] = json.dumps(
-                        slurmdbd_peers_tmp
-                    )
-                else:
-                    app_relation_data["standby_slurmdbd"] = json.dumps([])
-
-            ctxt = {}
-            backup_slurmdbd = app_relation_data.get("backup_slurmdbd")
-
-            # NOTE: We only care about the active and backup slurdbd.
-            # Set the active slurmdbd info and check for and set the
-            # backup slurmdbd information if one exists.
-            ctxt["active_slurmdbd_ingress_address"] = unit_relation_data[
-                "ingress-address"
-            ]
-            ctxt["active_slurmdbd_hostname"] = self._charm.get_hostname()
-            ctxt["active_slurmdbd_port"] = str(self._charm.get_port())
-
-            # If we have > 0 slurmdbd (also have a backup), iterate over
-            # them retrieving the info for the backup and set it along with
-            # the info for the active slurmdbd, then emit the
-            # 'slurmdbd_peer_available' event.
-            if backup_slurmdbd:
-                for unit in relation.units:
-                    if unit.name == backup_slurmdbd:
-                        unit_data = relation.data[unit]
-                        ctxt["backup_slurmdbd_ingress_address"] = unit_data[
-                            "ingress-address"
-                        ]
-                        ctxt["backup_slurmdbd_hostname"] = unit_data["hostname"]
-                        ctxt["backup_slurmdbd_port"] = unit_data["port"]
-            else:
-                ctxt["backup_slurmdbd_ingress_address"] = ""
-                ctxt["backup_slurmdbd_hostname"] = ""
-                ctxt["backup_slurmdbd_port"] = ""
-
-            app_relation_data["slurmdbd_info"] = json.dumps(ctxt)
+        if self._schedule_slurmdbd():
             self.on.slurmdbd_peer_available.emit()
 
     def _on_relation_departed(self, event):
+        """Schedule the slurmdbd without the departed unit."""
+        self._schedule_slurmdbd()
         self.on.slurmdbd_peer_available.emit()
 
+    def _schedule_slurmdbd(self) -> bool:
+        """Assign the active, backup and standby slurmdbd, if we are the leader.
+
+        The roles only depend on the peers on the relation, so they are
+        assigned once per hook for a given set of peers, e.g. when
+        relation-created and deferred relation-changed events run in the
+        same hook. Return True if we are the leader.
+        """
+        if not self.framework.model.unit.is_leader():
+            return False
+
+        relation = self._relation
+        slurmdbd_peers = _active_peers(relation)
+        scheduled = _hook_memo_key(slurmdbd_peers)
+        if scheduled and scheduled == self._scheduled:
+            logger.debug("## slurmdbd already scheduled in this hook")
+            return True
+
+        app_relation_data = relation.data[self.model.app]
+        unit_relation_data = relation.data[self.model.unit]
+
+        # Account for the active slurmdbd
+        # In this case, tightly couple the active slurmdbd to the leader.
+        #
+        # If we are the leader but are not the active slurmdbd,
+        # then the previous slurmdbd leader must have died.
+        # Set our unit to the active_slurmdbd.
+        roles = {"active_slurmdbd": self.model.unit.name}
+
+        # Account for the backup and standby slurmdbd
+        backup_slurmdbd, standby_slurmdbd = _schedule_backup(
+            app_relation_data.get("backup_slurmdbd"), slurmdbd_peers)
+        if backup_slurmdbd is not None:
+            roles["backup_slurmdbd"] = backup_slurmdbd
+        roles["standby_slurmdbd"] = json.dumps(standby_slurmdbd)
+
+        ctxt = {}
+
+        # NOTE: We only care about the active and backup slurdbd.
+        # Set the active slurmdbd info and check for and set the
+        # backup slurmdbd information if one exists.
+        ctxt["active_slurmdbd_ingress_address"] = unit_relation_data[
+            "ingress-address"
+        ]
+        ctxt["active_slurmdbd_hostname"] = self._charm.get_hostname()
+        ctxt["active_slurmdbd_port"] = str(self._charm.get_port())
+
+        # If we have > 0 slurmdbd (also have a backup), retrieve the info for
+        # the backup and set it along with the info for the active slurmdbd.
+        ctxt["backup_slurmdbd_ingress_address"] = ""
+        ctxt["backup_slurmdbd_hostname"] = ""
+        ctxt["backup_slurmdbd_port"] = ""
+        if backup_slurmdbd:
+            for unit in relation.units:
+                if unit.name == backup_slurmdbd:
+                    unit_data = relation.data[unit]
+                    ctxt["backup_slurmdbd_ingress_address"] = unit_data[
+                        "ingress-address"
+                    ]
+                    ctxt["backup_slurmdbd_hostname"] = unit_data["hostname"]
+                    ctxt["backup_slurmdbd_port"] = unit_data["port"]
+
+        roles["slurmdbd_info"] = json.dumps(ctxt)
+
+        # only write what changed, every write is a relation-set call
+        for key, value in roles.items():
+            if app_relation_data.get(key) != value:
+                app_relation_data[key] = value
+
+        self._scheduled = scheduled
+        return True
+
     @property
     def _relation(self):
         return self.framework.model.get_relation(self._relation_name)
@@ -172,22 +161,33 @@ class SlurmdbdPeer(Object):
         return {}
 
 
-def _related_units(relid):
-    """List of related units."""
-    units_cmd_line = ["relation-list", "--format=json", "-r", relid]
-    return json.loads(subprocess.check_output(units_cmd_line).decode("UTF-8")) or []
-
-
-def _relation_ids(reltype):
-    """List of relation_ids."""
-    relid_cmd_line = ["relation-ids", "--format=json", reltype]
-    return json.loads(subprocess.check_output(relid_cmd_line).decode("UTF-8")) or []
-
-
-def _get_active_peers():
-    """Return the active_units."""
-    active_units = []
-    for rel_id in _relation_ids("slurmdbd-peer"):
-        for unit in _related_units(rel_id):
-            active_units.append(unit)
-    return active_units
+def _active_peers(relation) -> list:
+    """Return the names of the peer units, sorted to schedule them in a stable order."""
+    return sorted(unit.name for unit in relation.units)
+
+
+def _hook_memo_key(peers: list):
+    """Return what identifies a scheduling in the running hook, None outside of Juju."""
+    context_id = os.environ.get("JUJU_CONTEXT_ID")
+    return (context_id, tuple(peers)) if context_id else None
+
+
+def _schedule_backup(backup_slurmdbd, slurmdbd_peers: list):
+    """Return the backup and the standby slurmdbd among the peers.
+
+    If the backup slurmdbd exists in the application relation data then
+    check that it also exists in the slurmdbd_peers. If it does exist in the
+    slurmdbd peers then remove it from the list of active peers and set the
+    rest of the peers to be standbys.
+    """
+    standby_slurmdbd = list(slurmdbd_peers)
+    # Just because the backup_slurmdbd exists in the application data doesn't
+    # mean that it really exists. If the backup_slurmdbd isn't in the list of
+    # active units then try to promote a standby to a backup.
+    if backup_slurmdbd in slurmdbd_peers:
+        standby_slurmdbd.remove(backup_slurmdbd)
+    elif standby_slurmdbd:
+        backup_slurmdbd = standby_slurmdbd.pop()
+    elif backup_slurmdbd:
+        backup_slurmdbd = ""
+    return backup_slurmdbd, standby_slurmdbd
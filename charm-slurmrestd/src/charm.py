@@ -12,12 +12,18 @@ from ops.model import (
     WaitingStatus,
 )
 from slurm_ops_manager import SlurmManager
+import node_lines
+import probe_cache
+from hook_profile import HookProfiler
 from interface_slurmrestd import SlurmrestdRequires
 
 from charms.fluentbit.v0.fluentbit import FluentbitClient
 
 logger = logging.getLogger()
 
+# the slurm.conf slurm_ops_manager renders
+SLURM_CONF = Path("/etc/slurm/slurm.conf")
+
 
 class SlurmrestdCharm(CharmBase):
     """Operator charm responsible for lifecycle operations for slurmrestd."""
@@ -27,14 +33,18 @@ class SlurmrestdCharm(CharmBase):
     def __init__(self, *args):
         """Initialize charm and configure states and events to observe."""
         super().__init__(*args)
+        self._hook_profile = HookProfiler(self)
+        self._probes = probe_cache.ProbeCache(self)
 
         self._stored.set_default(
             slurm_installed=False,
             slurmrestd_restarted=False,
+            slurmrestd_restart_hash=str(),
             cluster_name=str()
         )
 
         self._slurm_manager = SlurmManager(self, "slurmrestd")
+        self._slurm_conf = SLURM_CONF
         self._slurmrestd = SlurmrestdRequires(self, 'slurmrestd')
         self._fluentbit = FluentbitClient(self, "fluentbit")
 
@@ -49,6 +59,8 @@ class SlurmrestdCharm(CharmBase):
             self._slurmrestd.on.restart_slurmrestd: self._on_restart_slurmrestd,
             # fluentbit
             self.on["fluentbit"].relation_created: self._on_fluentbit_relation_created,
+            # actions
+            self.on.hook_profile_action: self._on_hook_profile_action,
         }
         for event, handler in event_handler_bindings.items():
             self.framework.observe(event, handler)
@@ -61,12 +73,15 @@ class SlurmrestdCharm(CharmBase):
 
         custom_repo = self.config.get("custom-slurm-repo")
         successful_installation = self._slurm_manager.install(custom_repo)
+        # the host changed, e.g. it may need a reboot now
+        self._probes.invalidate()
 
         if successful_installation:
             self.unit.status = ActiveStatus("slurmrestd installed")
             self._stored.slurm_installed = True
 
             self._slurm_manager.start_munged()
+            self._probes.invalidate(probe_cache.MUNGE)
         else:
             self.unit.status = BlockedStatus("Error installing slurmrestd")
             event.defer()
@@ -77,6 +92,10 @@ class SlurmrestdCharm(CharmBase):
         """Set up Fluentbit log forwarding."""
         self._configure_fluentbit()
 
+    def _on_hook_profile_action(self, event):
+        """Show the slowest of the last hooks and the calls they spent time in."""
+        event.set_results(self._hook_profile.report(event.params["limit"]))
+
     def _configure_fluentbit(self):
         logger.debug("## Configuring fluentbit")
         cfg = list()
@@ -87,6 +106,7 @@ class SlurmrestdCharm(CharmBase):
     def _on_upgrade(self, event):
         """Perform upgrade operations."""
         self.unit.set_workload_version(Path("version").read_text().strip())
+        self._probes.invalidate()
         self._check_status()
 
     def _on_update_status(self, event):
@@ -126,6 +146,7 @@ class SlurmrestdCharm(CharmBase):
         munge_key = self._slurmrestd.get_stored_munge_key()
         self._slurm_manager.configure_munge_key(munge_key)
         self._slurm_manager.restart_munged()
+        self._probes.invalidate(probe_cache.MUNGE)
 
     def _on_configure_jwt_rsa(self, event):
         if not self._stored.slurm_installed:
@@ -137,7 +158,8 @@ class SlurmrestdCharm(CharmBase):
         self._slurm_manager.configure_jwt_rsa(jwt_rsa)
 
     def _check_status(self) -> bool:
-        if self._slurm_manager.needs_reboot:
+        if not self._probes.check(probe_cache.REBOOT,
+                                  lambda: not self._slurm_manager.needs_reboot):
             self.unit.status = BlockedStatus("Machine needs reboot")
             return False
 
@@ -152,7 +174,7 @@ class SlurmrestdCharm(CharmBase):
 
         slurmctld_available = (self._slurmrestd.get_stored_munge_key()
                                and self._slurmrestd.get_stored_jwt_rsa()
-                               and self._slurmrestd.get_stored_slurm_config())
+                               and self._slurmrestd.config_published)
         if not slurmctld_available:
             self.unit.status = WaitingStatus("Waiting on: slurmctld")
             return True
@@ -166,15 +188,33 @@ class SlurmrestdCharm(CharmBase):
             event.defer()
             return
 
-        slurm_config = self._slurmrestd.get_stored_slurm_config()
-        if slurm_config:
-            self._slurm_manager.render_slurm_configs(slurm_config)
-            self.cluster_name = slurm_config.get("cluster_name")
-        else:
+        try:
+            slurmrestd_config = self._slurmrestd.fetch_slurm_config()
+        except Exception as e:
+            logger.error(f"## Unable to fetch the slurm config from etcd: {e}")
+            event.defer()
+            return
+
+        slurm_config = slurmrestd_config.get("slurm_config")
+        if not slurm_config:
             logger.error(f"## weird slurmconfig: {slurm_config}")
+            event.defer()
+            return
 
-        # Only restart slurmrestd the first time the node is brought up.
-        if not self._stored.slurmrestd_restarted:
+        self._slurm_manager.render_slurm_configs(slurm_config)
+        # the same node definitions as the slurm.conf of slurmctld
+        node_lines.complete(self._slurm_conf, slurm_config)
+        self.cluster_name = slurm_config.get("cluster_name")
+        self._slurmrestd.store_slurm_config_hash(slurmrestd_config["hash"])
+
+        # Restart slurmrestd the first time the node is brought up, and when
+        # the controllers, slurmdbd, or the cluster parameters changed. Nodes
+        # joining or leaving the cluster do not need a restart. slurmctld
+        # versions without the restart hash send a restart event instead.
+        restart_hash = slurmrestd_config.get("restart_hash", "")
+        if (not self._stored.slurmrestd_restarted
+                or restart_hash != self._stored.slurmrestd_restart_hash):
+            self._stored.slurmrestd_restart_hash = restart_hash
             self._on_restart_slurmrestd(event)
 
         if self._fluentbit._relation is not None:
@@ -1,8 +1,9 @@
 #!/usr/bin/env python3
 """SlurmrestdRequiries."""
+import hashlib
 import json
 import logging
-
+from pathlib import Path
 
 from ops.framework import (
     EventBase,
@@ -12,9 +13,18 @@ from ops.framework import (
     StoredState,
 )
 
+import relation_codec
+from omnietcd3 import Etcd3AuthClient
+
 
 logger = logging.getLogger()
 
+# tell slurmctld we fetch the slurm config from etcd, so it only sends its
+# version and hashes on the relation
+CONFIG_DELIVERY_KEY = "slurm_config_delivery"
+CONFIG_DELIVERY_ETCD = "etcd"
+SLURM_CONFIG_KEY = "config/slurm_config"
+
 
 class SlurmrestdAvailableEvent(EventBase):
     """SlurmctldAvailableEvent."""
@@ -62,10 +72,14 @@ class SlurmrestdRequires(Object):
         self._stored.set_default(
             munge_key=str(),
             jwt_rsa=str(),
-            slurm_config=dict(),
+            slurm_config_hash=str(),
             restart_slurmrestd_uuid=str(),
         )
 
+        self.framework.observe(
+            self._charm.on[relation_name].relation_created,
+            self._on_relation_created
+        )
         self.framework.observe(
             self._charm.on[relation_name].relation_joined,
             self._on_relation_joined
@@ -79,6 +93,16 @@ class SlurmrestdRequires(Object):
             self._on_relation_broken
         )
 
+    def _on_relation_created(self, event):
+        """Announce that we decode compressed slurm configs and fetch them from etcd."""
+        relation_codec.advertise(event.relation, self.model.unit)
+        self._advertise_config_delivery(event.relation)
+
+    def _advertise_config_delivery(self, relation):
+        unit_data = relation.data[self.model.unit]
+        if unit_data.get(CONFIG_DELIVERY_KEY) != CONFIG_DELIVERY_ETCD:
+            unit_data[CONFIG_DELIVERY_KEY] = CONFIG_DELIVERY_ETCD
+
     def _on_relation_joined(self, event):
         """Get the munge/jwt keys from slurmctld on relation joined."""
         # Since we are in relation-joined (with the app on the other side)
@@ -112,6 +136,11 @@ class SlurmrestdRequires(Object):
 
     def _on_relation_changed(self, event):
         """Check for the munge_key in the relation data."""
+        # units deployed before the codec and the etcd delivery existed did
+        # not advertise them
+        relation_codec.advertise(event.relation, self.model.unit)
+        self._advertise_config_delivery(event.relation)
+
         event_app_data = event.relation.data.get(event.app)
         if not event_app_data:
             event.defer()
@@ -122,9 +151,9 @@ class SlurmrestdRequires(Object):
         munge_key = event_app_data.get('munge_key')
         jwt_rsa = event_app_data.get('jwt_rsa')
         restart_slurmrestd_uuid = event_app_data.get("restart_slurmrestd_uuid")
-        slurm_config = self._get_slurm_config_from_relation()
+        config_hash = self._published_config_hash(event_app_data)
 
-        if not (munge_key and jwt_rsa and slurm_config):
+        if not (munge_key and jwt_rsa and config_hash):
             logger.debug("## Deferring event: missing munge, jwt, and/or config")
             event.defer()
             return
@@ -139,9 +168,9 @@ class SlurmrestdRequires(Object):
             self._store_jwt_rsa(jwt_rsa)
             self.on.jwt_rsa_available.emit()
 
-        # Store the slurm_config in the interface StoredState if it has changed
-        if slurm_config != self.get_stored_slurm_config():
-            self._store_slurm_config(slurm_config)
+        # the charm fetches and renders the config if it changed, see
+        # fetch_slurm_config()
+        if config_hash != self._stored.slurm_config_hash:
             self.on.config_available.emit()
 
         if restart_slurmrestd_uuid:
@@ -152,20 +181,89 @@ class SlurmrestdRequires(Object):
     def _on_relation_broken(self, event):
         self._store_munge_key("")
         self._store_jwt_rsa("")
+        self._stored.slurm_config_hash = ""
         self.on.config_unavailable.emit()
 
-    def _get_slurm_config_from_relation(self) -> dict:
-        """Return slurm_config."""
+    @staticmethod
+    def _published_config_hash(app_data) -> str:
+        """Return the hash of the slurm config slurmctld published.
+
+        slurmctld versions that predate the etcd delivery send the whole
+        config on the relation.
+        """
+        slurm_config = app_data.get("slurm_config")
+        if slurm_config:
+            return hashlib.sha256(slurm_config.encode()).hexdigest()
+        return app_data.get("slurm_config_hash", "")
+
+    @property
+    def _app_data(self):
         relation = self._relation
-        if relation:
-            app = relation.app
-            if app:
-                app_data = self._relation.data.get(app)
-                if app_data:
-                    slurm_config = app_data.get('slurm_config')
-                    if slurm_config:
-                        return json.loads(slurm_config)
-        return {}
+        if relation and relation.app:
+            return relation.data.get(relation.app)
+        return None
+
+    @property
+    def config_published(self) -> bool:
+        """Return True if slurmctld published a slurm config."""
+        app_data = self._app_data
+        return bool(app_data and self._published_config_hash(app_data))
+
+    def fetch_slurm_config(self) -> dict:
+        """Return the last slurm config published by slurmctld.
+
+        The returned dict holds the config in `slurm_config`, its `hash` and
+        the `restart_hash` of the parts slurmrestd needs a restart for, empty
+        if slurmctld sent the config on the relation. Raise an exception if
+        etcd can not be reached.
+        """
+        app_data = self._app_data
+        if not app_data:
+            return {}
+
+        slurm_config = app_data.get("slurm_config")
+        if slurm_config:
+            return {
+                "hash": self._published_config_hash(app_data),
+                "restart_hash": "",
+                "slurm_config": relation_codec.decode(slurm_config),
+            }
+
+        values = self._etcd_client(app_data).get(SLURM_CONFIG_KEY)
+        if not values:
+            return {}
+        return json.loads(values[0])
+
+    def _etcd_client(self, app_data) -> Etcd3AuthClient:
+        """Return a client of the etcd on slurmctld, as the slurmrestd user."""
+        # etcd runs on the slurmctld leader, which publishes its address
+        host = app_data.get("etcd_host")
+        if not host:
+            raise ConnectionError("slurmctld did not publish the etcd address")
+        port = app_data.get("etcd_port")
+
+        protocol = "http"
+        ca_cert = None
+        if app_data.get("tls_cert"):
+            protocol = "https"
+            ca_cert = Path("/etc/slurm/tls_cert.crt")
+            ca_cert.write_text(app_data["tls_cert"])
+            ca_cert = ca_cert.as_posix()
+        if app_data.get("ca_cert"):
+            ca_cert = Path("/etc/slurm/ca_cert.crt")
+            ca_cert.write_text(app_data["ca_cert"])
+            ca_cert = ca_cert.as_posix()
+
+        logger.debug(f"## Connecting to etcd3 in {protocol}://{host}:{port}, {ca_cert}")
+        return Etcd3AuthClient(host=host, port=port,
+                               protocol=protocol, ca_cert=ca_cert,
+                               username="slurmrestd",
+                               password=app_data.get("etcd_slurmrestd_pass"),
+                               timeout=10)
+
+    def store_slurm_config_hash(self, config_hash: str):
+        """Remember the hash of the rendered slurm config."""
+        self._stored.slurm_config_hash = config_hash
 
     @property
     def _relation(self):
@@ -198,10 +296,3 @@ class SlurmrestdRequires(Object):
     def get_stored_jwt_rsa(self):
         """Retrieve the jwt_rsa from stored state."""
         return self._stored.jwt_rsa
-
-    def _store_slurm_config(self, slurm_config: dict):
-        self._stored.slurm_config = slurm_config
-
-    def get_stored_slurm_config(self) -> dict:
-        """Retrieve the slurm_config from stored state."""
-        return dict(self._stored.slurm_config)
@@ -0,0 +1,59 @@
+"""Cache the results of the health probes the charm status depends on.
+
+`_check_status()` runs several times per hook, and its probes leave the
+process: `needs_reboot` inspects the host, `check_munged` does a munge
+round trip, and slurmctld asks systemd if etcd is active. A healthy result
+is reused for `TTL` seconds, i.e. for the rest of the hook and by the hooks
+that follow it, e.g. update-status. Failed probes are not cached, so they
+run again at their next use.
+
+The charm must invalidate a probe when it restarts, or reconfigures, what
+the probe checks.
+"""
+import logging
+from time import time
+from typing import Callable
+
+from ops.framework import Object, StoredState
+
+logger = logging.getLogger()
+
+TTL = 30
+
+# the probes
+REBOOT = "reboot"
+MUNGE = "munge"
+ETCD = "etcd"
+
+
+class ProbeCache(Object):
+    """Healthy probe results, kept for a few seconds across hooks."""
+
+    _stored = StoredState()
+
+    def __init__(self, charm, ttl: int = TTL):
+        """Initialize the cache."""
+        super().__init__(charm, "probe-cache")
+        self._ttl = ttl
+        # probe name -> time of its last healthy result
+        self._stored.set_default(healthy=dict())
+
+    def check(self, name: str, probe: Callable[[], bool]) -> bool:
+        """Return True if the probe passes, running it only if needed."""
+        last_healthy = self._stored.healthy.get(name)
+        if last_healthy is not None and 0 <= time() - last_healthy < self._ttl:
+            return True
+
+        healthy = bool(probe())
+        if healthy:
+            self._stored.healthy[name] = time()
+        else:
+            logger.debug(f"## probe failed: {name}")
+            self.invalidate(name)
+        return healthy
+
+    def invalidate(self, *names: str) -> None:
+        """Forget the results of some probes, or of all of them."""
+        for name in names or list(self._stored.healthy.keys()):
+            if name in self._stored.healthy:
+                del self._stored.healthy[name]
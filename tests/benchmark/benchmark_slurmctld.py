@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""Benchmark the slurmctld config assembly pipeline at cluster scale.
+
+Synthesize slurmd relations with thousands of units using the ops Harness,
+time the functions slurmctld runs to assemble slurm.conf, and record their
+peak memory. The results are written as a JSON baseline that can be compared
+against a previous run:
+
+    python tests/benchmark/benchmark_slurmctld.py --output baseline.json
+    python tests/benchmark/benchmark_slurmctld.py --compare baseline.json
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from unittest import mock
+
+CHARM_DIR = Path(__file__).resolve().parents[2] / "charm-slurmctld"
+sys.path[:0] = [str(CHARM_DIR / "src"), str(CHARM_DIR / "lib")]
+
+from ops.testing import Harness  # noqa: E402
+
+import charm  # noqa: E402
+import config_changes  # noqa: E402
+import hostlist  # noqa: E402
+from interface_slurmd import ensure_unique_partitions  # noqa: E402
+from synthetic import add_units, node_inventory  # noqa: E402
+
+# (units, partitions) of each synthesized cluster
+SCENARIOS = [(10, 1), (100, 2), (1000, 10), (5000, 25), (20000, 50)]
+
+# a result is a regression if it is this much worse than the baseline
+DEFAULT_THRESHOLD = 1.25
+# timings shorter than this are mostly noise, they are not compared
+MIN_SECONDS = 0.001
+
+
+def build_harness(units: int, partitions: int) -> Harness:
+    """Return a Harness of a slurmctld leader related to the synthetic cluster."""
+    harness = Harness(charm.SlurmctldCharm)
+    harness.set_leader(True)
+    harness.begin()
+    harness.charm._slurm_manager.slurm_config_nhc_values.return_value = {}
+
+    # populate the relations without running the hooks, we only want to
+    # time the assembly functions
+    harness.disable_hooks()
+
+    peer = harness.add_relation("slurmctld-peer", "slurmctld")
+    harness.update_relation_data(peer, "slurmctld", {"slurmctld_info": json.dumps({
+        "active_controller_hostname": "ctl-0",
+        "active_controller_ingress_address": "10.0.0.1",
+        "active_controller_port": "6817",
+    })})
+
+    slurmdbd = harness.add_relation("slurmdbd", "slurmdbd")
+    harness.add_relation_unit(slurmdbd, "slurmdbd/0")
+    harness.update_relation_data(slurmdbd, "slurmdbd", {"slurmdbd_info": json.dumps({
+        "slurmdbd_host": "dbd-0",
+        "slurmdbd_port": "6819",
+    })})
+
+    per_partition = units // partitions
+    for partition in range(partitions):
+        app = f"partition{partition}"
+        relation = harness.add_relation("slurmd", app)
+        harness.update_relation_data(relation, app, {"partition_info": json.dumps({
+            "partition_name": app,
+            "partition_state": "UP",
+            "partition_config": "",
+        })})
+        add_units(harness, relation, {
+            f"{app}/{index}": {"inventory": json.dumps(node_inventory(partition, index))}
+            for index in range(per_partition)
+        })
+
+    harness.enable_hooks()
+    return harness
+
+
+def measure(func, repeat: int) -> dict:
+    """Return the median wall time and the peak memory of func()."""
+    timings = list()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"seconds": statistics.median(timings), "peak_bytes": peak}
+
+
+def run_scenario(units: int, partitions: int, repeat: int) -> dict:
+    """Run all the benchmarks for a synthesized cluster."""
+    harness = build_harness(units, partitions)
+    slurmctld = harness.charm
+    slurmd = slurmctld._slurmd
+
+    slurmd_info = slurmd.get_slurmd_info()
+    sections = slurmctld._assemble_slurm_config_sections()
+    slurm_config = slurmctld._merge_slurm_config_sections(sections)
+
+    benchmarks = {
+        "get_slurmd_info": slurmd.get_slurmd_info,
+        "ensure_unique_partitions": lambda: ensure_unique_partitions(slurmd_info),
+        "_assemble_partitions": lambda: slurmctld._assemble_partitions(slurmd_info),
+        "_assemble_down_nodes": lambda: slurmctld._assemble_down_nodes(slurmd_info),
+        "_assemble_all_nodes": lambda: slurmctld._assemble_all_nodes(slurmd_info),
+        "_assemble_slurm_config": slurmctld._assemble_slurm_config,
+        "config_changes.fingerprint": lambda: config_changes.fingerprint(sections),
+        "hostlist.compress_slurm_config": lambda: hostlist.compress_slurm_config(slurm_config),
+    }
+
+    results = dict()
+    for name, func in benchmarks.items():
+        # the slowest functions are not worth repeating on big clusters
+        results[name] = measure(func, repeat if units <= 5000 else max(1, repeat // 3))
+        print(f"{units:>6} units {partitions:>3} partitions  {name:<32}"
+              f"{results[name]['seconds'] * 1000:>10.2f} ms"
+              f"{results[name]['peak_bytes'] / 2**20:>10.2f} MiB", file=sys.stderr)
+
+    harness.cleanup()
+    return results
+
+
+def git_commit() -> str:
+    """Return the commit being benchmarked, if any."""
+    try:
+        cmd = ["git", "-C", str(CHARM_DIR), "rev-parse", "--short", "HEAD"]
+        return subprocess.check_output(cmd, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list:
+    """Return the benchmarks that regressed compared to the baseline."""
+    regressions = list()
+    for scenario, results in current["results"].items():
+        for name, result in results.items():
+            previous = baseline.get("results", {}).get(scenario, {}).get(name)
+            if not previous:
+                continue
+            for metric in ("seconds", "peak_bytes"):
+                if metric == "seconds" and previous[metric] < MIN_SECONDS:
+                    continue
+                if previous[metric] and result[metric] > previous[metric] * threshold:
+                    ratio = result[metric] / previous[metric]
+                    regressions.append(f"{scenario} {name} {metric}: "
+                                       f"{previous[metric]:.6g} -> {result[metric]:.6g} "
+                                       f"({ratio:.2f}x)")
+    return regressions
+
+
+def parse_args():
+    """Parse the command line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", type=Path,
+                        help="write the results to this JSON file")
+    parser.add_argument("--compare", type=Path,
+                        help="compare the results with this JSON baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="ratio over the baseline considered a regression")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="number of timed runs of each function")
+    parser.add_argument("--max-units", type=int, default=SCENARIOS[-1][0],
+                        help="skip the scenarios with more units than this")
+    return parser.parse_args()
+
+
+def main():
+    """Run the benchmarks."""
+    args = parse_args()
+
+    current = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "results": dict(),
+    }
+    # the benchmarks must not touch the host slurm installation
+    with mock.patch.object(charm, "SlurmManager"):
+        for units, partitions in SCENARIOS:
+            if units > args.max_units:
+                continue
+            scenario = f"{units}x{partitions}"
+            current["results"][scenario] = run_scenario(units, partitions, args.repeat)
+
+    output = json.dumps(current, indent=2, sort_keys=True)
+    if args.output:
+        args.output.write_text(output)
+    else:
+        print(output)
+
+    if args.compare:
+        regressions = compare(json.loads(args.compare.read_text()), current, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
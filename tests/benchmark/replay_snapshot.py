@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""Replay a slurmctld config snapshot through the slurm.conf assembly.
+
+Snapshots are written by the `snapshot-slurm-config` action of slurmctld.
+The snapshot's slurmd relations are loaded into an ops Harness, then the
+same code the charm runs in a hook assembles, fingerprints, classifies and
+compresses the slurm config. Each stage is timed as in
+benchmark_slurmctld.py, and the whole pipeline runs once under cProfile:
+
+    python tests/benchmark/replay_snapshot.py snapshot.json.gz
+    python tests/benchmark/replay_snapshot.py snapshot.json.gz --output case.json
+    python tests/benchmark/replay_snapshot.py snapshot.json.gz --compare case.json
+
+slurm.conf itself is rendered by slurm-ops-manager into the system paths,
+so rendering is not replayed.
+"""
+import argparse
+import contextlib
+import cProfile
+import io
+import json
+import platform
+import pstats
+import sys
+from pathlib import Path
+from unittest import mock
+
+from benchmark_slurmctld import DEFAULT_THRESHOLD, compare, git_commit, measure
+from ops.testing import Harness
+from synthetic import add_units
+
+# benchmark_slurmctld put the slurmctld charm on the path
+import charm  # noqa: I100
+import config_changes
+import config_snapshot
+import hostlist
+
+
+def build_harness(snapshot: dict) -> Harness:
+    """Return a Harness of a slurmctld leader with the snapshot's slurmd relations."""
+    harness = Harness(charm.SlurmctldCharm)
+    harness.set_leader(True)
+    harness.begin()
+    harness.disable_hooks()
+    harness.update_config({key: value for key, value in snapshot["config"].items()
+                           if value is not None})
+
+    for relation in snapshot["slurmd"]:
+        app = relation["app"]
+        relation_id = harness.add_relation("slurmd", app)
+        if relation["partition_info"]:
+            harness.update_relation_data(relation_id, app,
+                                         {"partition_info": relation["partition_info"]})
+        add_units(harness, relation_id, {
+            unit: {"inventory": inventory} if inventory else {}
+            for unit, inventory in relation["units"].items()
+        })
+
+    harness.enable_hooks()
+    return harness
+
+
+def patch_infos(snapshot: dict) -> list:
+    """Return patches serving the snapshot's infos instead of the relations'."""
+    properties = {
+        "_slurmctld_info": snapshot["slurmctld_info"],
+        "slurmdbd_info": snapshot["slurmdbd_info"],
+        "_cluster_info": snapshot["cluster_info"],
+        "_addons_info": snapshot["addons_info"],
+    }
+    return [mock.patch.object(charm.SlurmctldCharm, name,
+                              new_callable=mock.PropertyMock, return_value=value)
+            for name, value in properties.items()]
+
+
+def pipeline(slurmctld, previous_fingerprints: dict) -> str:
+    """Run what _on_write_slurm_config() runs before rendering."""
+    sections = slurmctld._assemble_slurm_config_sections()
+    slurm_config = slurmctld._merge_slurm_config_sections(sections)
+    action = config_changes.classify(previous_fingerprints, config_changes.fingerprint(sections))
+    hostlist.compress_slurm_config(slurm_config)
+    return action
+
+
+def replay(snapshot: dict, repeat: int, profile_lines: int, pstats_path: Path) -> dict:
+    """Time the stages of the assembly on the snapshot and profile it."""
+    harness = build_harness(snapshot)
+    slurmctld = harness.charm
+    slurmd = slurmctld._slurmd
+    previous = snapshot["fingerprints"]
+
+    sections = slurmctld._assemble_slurm_config_sections()
+    if not sections:
+        sys.exit("the snapshot does not hold all slurm.conf needs, nothing to replay")
+    slurm_config = slurmctld._merge_slurm_config_sections(sections)
+    fingerprints = config_changes.fingerprint(sections)
+
+    nodes = sum(len(partition["inventory"]) for partition in sections["partitions"])
+    print(f"{len(sections['partitions'])} partitions, {nodes} nodes, "
+          f"the hook would {config_changes.classify(previous, fingerprints)}", file=sys.stderr)
+    if previous and previous != fingerprints:
+        print("the last written config differs from the snapshot's relation data",
+              file=sys.stderr)
+
+    benchmarks = {
+        "get_slurmd_info": slurmd.get_slurmd_info,
+        "_assemble_slurm_config_sections": slurmctld._assemble_slurm_config_sections,
+        "config_changes.fingerprint": lambda: config_changes.fingerprint(sections),
+        "hostlist.compress_slurm_config": lambda: hostlist.compress_slurm_config(slurm_config),
+        "pipeline": lambda: pipeline(slurmctld, previous),
+    }
+    results = dict()
+    for name, func in benchmarks.items():
+        results[name] = measure(func, repeat)
+        print(f"{name:<36}{results[name]['seconds'] * 1000:>10.2f} ms"
+              f"{results[name]['peak_bytes'] / 2**20:>10.2f} MiB", file=sys.stderr)
+
+    profiler = cProfile.Profile()
+    profiler.runcall(pipeline, slurmctld, previous)
+    if pstats_path:
+        profiler.dump_stats(str(pstats_path))
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(profile_lines)
+    print(stream.getvalue(), file=sys.stderr)
+
+    harness.cleanup()
+    return results
+
+
+def parse_args():
+    """Parse the command line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("snapshot", type=Path,
+                        help="snapshot written by the snapshot-slurm-config action")
+    parser.add_argument("--output", type=Path,
+                        help="write the results to this JSON file")
+    parser.add_argument("--compare", type=Path,
+                        help="compare the results with this JSON baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="ratio over the baseline considered a regression")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="number of timed runs of each stage")
+    parser.add_argument("--profile-lines", type=int, default=25,
+                        help="number of functions of the profile to show")
+    parser.add_argument("--pstats", type=Path,
+                        help="write the cProfile stats to this file")
+    return parser.parse_args()
+
+
+def main():
+    """Replay the snapshot."""
+    args = parse_args()
+    snapshot = config_snapshot.load(args.snapshot)
+
+    current = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "snapshot": {"unit": snapshot["unit"], "created": snapshot["created"]},
+        "results": dict(),
+    }
+    # the replay must not touch the host slurm installation
+    with mock.patch.object(charm, "SlurmManager"), contextlib.ExitStack() as stack:
+        for patch in patch_infos(snapshot):
+            stack.enter_context(patch)
+        results = replay(snapshot, args.repeat, args.profile_lines, args.pstats)
+        current["results"][args.snapshot.name] = results
+
+    output = json.dumps(current, indent=2, sort_keys=True)
+    if args.output:
+        args.output.write_text(output)
+    else:
+        print(output)
+
+    if args.compare:
+        regressions = compare(json.loads(args.compare.read_text()), current, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Synthetic slurmd nodes for the benchmarks and the simulator."""
+from ops.testing import Harness
+
+
+def node_inventory(partition: int, index: int) -> dict:
+    """Return the inventory of a synthetic node, as slurmd would send it."""
+    return {
+        "node_name": f"p{partition}-node{index:05d}",
+        "node_addr": f"10.{partition}.{index // 256}.{index % 256}",
+        "state": "UNKNOWN",
+        "real_memory": 257000 if partition % 2 else 128000,
+        "cpus": 64,
+        "threads_per_core": 2,
+        "cores_per_socket": 16,
+        "sockets_per_board": 2,
+        "numa_nodes": "2",
+        "topology": {
+            "numa": [{"node": node, "cpus": f"{node * 16}-{node * 16 + 15},{node * 16 + 32}-"
+                                            f"{node * 16 + 47}", "memory": 64000}
+                     for node in range(2)],
+            "l3": ["0-15,32-47", "16-31,48-63"],
+        },
+        "core_spec_count": "2",
+        "cpu_spec_list": "30-31,62-63",
+        "mem_spec_limit": "8031" if partition % 2 else "4000",
+        "features": "avx2,avx512,icelake,x86_64_v2,x86_64_v3,x86_64_v4",
+        "new_node": index % 10 == 0,
+    }
+
+
+def add_units(harness: Harness, relation_id: int, units: dict) -> None:
+    """Add units, and their relation data, to a relation without any hook.
+
+    Harness.add_relation_unit() and update_relation_data() rebuild the whole
+    relation for every unit, which is quadratic and takes longer than the
+    benchmarks themselves with thousands of units. Fill the Harness backend
+    directly and invalidate the relation once instead.
+    """
+    backend = harness._backend
+    for unit, data in units.items():
+        backend._relation_list_map[relation_id].append(unit)
+        backend._relation_app_and_units[relation_id]["units"].append(unit)
+        backend._relation_data[relation_id][unit] = data
+    harness.model.relations._invalidate(backend._relation_names[relation_id])
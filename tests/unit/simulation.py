@@ -0,0 +1,61 @@
+"""Run the charms in ops Harnesses on the fake host of the benchmark simulator.
+
+The charms are loaded once per test run, each one with its own modules, see
+simulate.LoadedCharm. The modules other tests imported from the charms'
+src/ directories are hidden while loading them.
+"""
+import contextlib
+import sys
+from pathlib import Path
+from unittest import mock
+
+BENCHMARK_DIR = Path(__file__).resolve().parents[1] / "benchmark"
+sys.path.insert(0, str(BENCHMARK_DIR))
+
+import simulate  # noqa: E402
+from simulate import relate_slurmd, slurmctld_cluster, slurmd_unit  # noqa: E402,F401
+from synthetic import node_inventory  # noqa: E402,F401
+
+_LOADED_CHARMS = dict()
+
+
+def loaded_charms() -> dict:
+    """Return the loaded charms, by name."""
+    if not _LOADED_CHARMS:
+        charm_dirs = str(simulate.REPO_DIR / "charm-")
+        with mock.patch.dict(sys.modules):
+            for name, module in list(sys.modules.items()):
+                if str(getattr(module, "__file__", None)).startswith(charm_dirs):
+                    del sys.modules[name]
+            for name in simulate.CHARM_CLASSES:
+                _LOADED_CHARMS[name] = simulate.LoadedCharm(name)
+    return _LOADED_CHARMS
+
+
+def simulation(legacy_peers: bool = False) -> simulate.Simulation:
+    """Return a fake host for the charms, to be used as a context manager.
+
+    With legacy_peers, the synthetic units do not decode compressed relation
+    data.
+    """
+    return simulate.Simulation(loaded_charms(), legacy_peers)
+
+
+def charm_module(charm: str, module: str):
+    """Return a module of a charm, as the charm imported it."""
+    return loaded_charms()[charm].modules[module]
+
+
+@contextlib.contextmanager
+def app_data_writes(harness, relation_id: int):
+    """Record the keys a charm writes to its application data on a relation."""
+    writes = list()
+    relation_set = harness._backend.relation_set
+
+    def recording_relation_set(rel_id, key, value, is_app):
+        if rel_id == relation_id and is_app:
+            writes.append(key)
+        return relation_set(rel_id, key, value, is_app)
+
+    with mock.patch.object(harness._backend, "relation_set", recording_relation_set):
+        yield writes
@@ -0,0 +1,73 @@
+"""Fixture /sys and /proc trees of the slurmd charm tests."""
+import sys
+from pathlib import Path
+
+CHARM_DIR = Path(__file__).resolve().parents[2] / "charm-slurmd"
+sys.path.insert(0, str(CHARM_DIR / "src"))
+
+import sysfs  # noqa: E402
+
+
+def write(root: Path, path: str, content: str) -> None:
+    """Write a file of the fixture tree."""
+    target = root / path
+    target.parent.mkdir(parents=True, exist_ok=True)
+    target.write_text(content)
+
+
+def cpu_tree(root: Path, sockets: int, cores: int, threads: int, offline=()) -> None:
+    """Write the sysfs topology of a host, numbering CPUs like Linux does on x86."""
+    cpus = sockets * cores * threads
+    write(root, f"{sysfs.CPU_DIR}/present", f"0-{cpus - 1}\n")
+    online = [cpu for cpu in range(cpus) if cpu not in offline]
+    write(root, f"{sysfs.CPU_DIR}/online", ",".join(str(cpu) for cpu in online) + "\n")
+
+    for cpu in range(cpus):
+        thread, core = divmod(cpu, sockets * cores)
+        socket, core_id = divmod(core, cores)
+        topology = f"{sysfs.CPU_DIR}/cpu{cpu}/topology"
+        if cpu not in offline:
+            write(root, f"{topology}/physical_package_id", f"{socket}\n")
+            write(root, f"{topology}/core_id", f"{core_id}\n")
+
+
+def numa_tree(root: Path, sockets: int, cores: int, threads: int, memory_kb: int) -> None:
+    """Write one NUMA node and one L3 cache per socket, as cpu_tree numbers the CPUs."""
+    cpus_per_thread = sockets * cores
+    write(root, f"{sysfs.NODE_DIR}/online", f"0-{sockets - 1}\n" if sockets > 1 else "0\n")
+    for socket in range(sockets):
+        cpus = sysfs.format_cpu_list(
+            thread * cpus_per_thread + socket * cores + core
+            for thread in range(threads) for core in range(cores))
+        write(root, f"{sysfs.NODE_DIR}/node{socket}/cpulist", f"{cpus}\n")
+        write(root, f"{sysfs.NODE_DIR}/node{socket}/meminfo",
+              f"Node {socket} MemTotal:       {memory_kb} kB\n"
+              f"Node {socket} MemFree:        {memory_kb // 2} kB\n")
+
+        for cpu in sysfs.parse_cpu_list(cpus):
+            cache = f"{sysfs.CPU_DIR}/cpu{cpu}/cache"
+            write(root, f"{cache}/index2/level", "2\n")
+            write(root, f"{cache}/index2/shared_cpu_list", f"{cpu}\n")
+            write(root, f"{cache}/index3/level", "3\n")
+            write(root, f"{cache}/index3/shared_cpu_list", f"{cpus}\n")
+
+
+def pci_device(root: Path, address: str, vendor: str, device_class: str, device: str = "0x0000",
+               numa_node: int = -1, local_cpus: str = "", render_node: str = "") -> None:
+    """Write a PCI device of the fixture tree, and its DRM render node if any."""
+    device_dir = f"{sysfs.PCI_DIR}/{address}"
+    write(root, f"{device_dir}/vendor", f"{vendor}\n")
+    write(root, f"{device_dir}/class", f"{device_class}\n")
+    write(root, f"{device_dir}/device", f"{device}\n")
+    write(root, f"{device_dir}/numa_node", f"{numa_node}\n")
+    if local_cpus:
+        write(root, f"{device_dir}/local_cpulist", f"{local_cpus}\n")
+    if render_node:
+        write(root, f"{device_dir}/drm/{render_node}/dev", "226:128\n")
+
+
+MEMINFO = """MemTotal:       263856284 kB
+MemFree:        259441236 kB
+MemAvailable:   259880380 kB
+HugePages_Total:       0
+"""
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Test profiling the hooks of the charms."""
+import json
+import subprocess
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from simulation import charm_module, simulation
+
+REPO_DIR = Path(__file__).resolve().parents[2]
+CHARMS = ("slurmctld", "slurmd", "slurmdbd", "slurmrestd")
+
+
+class TestHookProfile(unittest.TestCase):
+    """Profile the hooks only when the hook-profile config is set."""
+
+    def setUp(self):
+        """Undo the wrappers the profiler installs when the test ends."""
+        self.sim = simulation().__enter__()
+        self.addCleanup(self.sim.__exit__, None, None, None)
+
+        self.hook_profile = charm_module("slurmrestd", "hook_profile")
+        patchers = [mock.patch.object(self.hook_profile, "_profiler", None)]
+        patchers += [mock.patch.object(subprocess, name, getattr(subprocess, name))
+                     for name in ("run", "call", "check_call", "check_output")]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def harness(self, config: dict = None):
+        """Return a slurmrestd unit, keeping its profiles in a temporary dir."""
+        harness = self.sim.harness("slurmrestd", config=config)
+        harness.charm._hook_profile._path = self.sim._tmp_dir / "hook-profile.jsonl"
+        return harness
+
+    def test_off(self):
+        """By default nothing is wrapped, and no profile is written."""
+        harness = self.harness()
+        subprocess.call(["systemctl", "is-active", "slurmrestd"])
+        harness.framework.commit()
+
+        self.assertFalse(getattr(subprocess.call, "hook_profile", False))
+        self.assertFalse((self.sim._tmp_dir / "hook-profile.jsonl").exists())
+        self.assertEqual(harness.charm._hook_profile.report()["profiled-hooks"], 0)
+
+    def test_on(self):
+        """The commands of a hook are recorded, without their arguments' values."""
+        harness = self.harness({"hook-profile": True})
+        subprocess.call(["systemctl", "is-active", "slurmrestd"])
+        subprocess.call(["relation-set", "password=secret"])
+        harness.framework.commit()
+
+        lines = (self.sim._tmp_dir / "hook-profile.jsonl").read_text().splitlines()
+        self.assertEqual(len(lines), 1)
+        profile = json.loads(lines[0])
+        self.assertEqual(set(profile["calls"]), {"subprocess systemctl is-active slurmrestd",
+                                                 "subprocess relation-set password"})
+        self.assertNotIn("secret", lines[0])
+        self.assertEqual(harness.charm._hook_profile.report()["profiling"], "on")
+
+    def test_copies(self):
+        """Every charm ships the same profiler."""
+        source = (REPO_DIR / "charm-slurmctld" / "src" / "hook_profile.py").read_text()
+        for charm in CHARMS[1:]:
+            copy = REPO_DIR / f"charm-{charm}" / "src" / "hook_profile.py"
+            self.assertEqual(copy.read_text(), source, charm)
+
+    def test_config(self):
+        """Every charm has the config, off by default."""
+        for charm in CHARMS:
+            harness = self.sim.harness(charm, leader=False)
+            self.assertIs(harness.charm.config["hook-profile"], False, charm)
+            self.assertFalse(harness.charm._hook_profile.enabled, charm)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""Test the cache of the health probes, and when the charms invalidate it."""
+import os
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from simulation import charm_module, simulation
+
+REPO_DIR = Path(__file__).resolve().parents[2]
+CHARMS = ("slurmctld", "slurmd", "slurmdbd", "slurmrestd")
+
+
+class TestProbeCache(unittest.TestCase):
+    """Reuse healthy probe results for TTL seconds."""
+
+    def setUp(self):
+        """Start a charm, in simulated time."""
+        self.sim = simulation().__enter__()
+        self.addCleanup(self.sim.__exit__, None, None, None)
+        self.probe_cache = charm_module("slurmctld", "probe_cache")
+        self.probes = self.sim.harness("slurmctld").charm._probes
+        self.runs = 0
+
+    def probe(self, healthy: bool = True):
+        """Return a probe counting its runs."""
+        def run() -> bool:
+            self.runs += 1
+            return healthy
+        return run
+
+    def test_ttl(self):
+        """A healthy result is reused until it is TTL seconds old."""
+        self.assertTrue(self.probes.check("munge", self.probe()))
+        self.sim.clock.sleep(self.probe_cache.TTL - 1)
+        self.assertTrue(self.probes.check("munge", self.probe()))
+        self.assertEqual(self.runs, 1)
+
+        self.sim.clock.sleep(1)
+        self.assertTrue(self.probes.check("munge", self.probe()))
+        self.assertEqual(self.runs, 2)
+
+    def test_failed_probe(self):
+        """A failed probe runs again at its next use."""
+        self.assertFalse(self.probes.check("munge", self.probe(healthy=False)))
+        self.assertFalse(self.probes.check("munge", self.probe(healthy=False)))
+        self.assertTrue(self.probes.check("munge", self.probe()))
+        self.assertTrue(self.probes.check("munge", self.probe()))
+        self.assertEqual(self.runs, 3)
+
+    def test_invalidate(self):
+        """Invalidated probes run again, the others are still cached."""
+        for name in ("reboot", "munge", "etcd"):
+            self.probes.check(name, self.probe())
+        self.probes.invalidate("munge")
+        for name in ("reboot", "munge", "etcd"):
+            self.probes.check(name, self.probe())
+        self.assertEqual(self.runs, 4)
+
+        self.probes.invalidate()
+        for name in ("reboot", "munge", "etcd"):
+            self.probes.check(name, self.probe())
+        self.assertEqual(self.runs, 7)
+
+    def test_copies(self):
+        """Every charm ships the same cache."""
+        source = (REPO_DIR / "charm-slurmctld" / "src" / "probe_cache.py").read_text()
+        for charm in CHARMS[1:]:
+            copy = REPO_DIR / f"charm-{charm}" / "src" / "probe_cache.py"
+            self.assertEqual(copy.read_text(), source, charm)
+
+
+class TestInvalidation(unittest.TestCase):
+    """The charms forget the probes of what they install, upgrade or restart."""
+
+    def setUp(self):
+        """Run the charms in a directory with their version file."""
+        self.sim = simulation().__enter__()
+        self.addCleanup(self.sim.__exit__, None, None, None)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(self.sim._tmp_dir)
+        Path("version").write_text("1.0.0\n")
+
+    def check_invalidates(self, charm_name: str, operation, names: set):
+        """Check that the operation of a charm forgets exactly the named probes."""
+        charm = self.sim.harness(charm_name, leader=False).charm
+        charm._stored.slurm_installed = True
+        probes = charm._probes
+        everything = {"reboot", "munge", "etcd"}
+
+        invalidated = set()
+        with mock.patch.object(probes, "invalidate", wraps=probes.invalidate) as invalidate:
+            operation(charm)
+        for call in invalidate.call_args_list:
+            invalidated.update(call.args or everything)
+        self.assertEqual(invalidated, names, charm_name)
+
+    def test_install(self):
+        """Installing changes the host, every probe runs again."""
+        for charm in CHARMS:
+            self.check_invalidates(charm, lambda charm: charm.on.install.emit(),
+                                   {"reboot", "munge", "etcd"})
+
+    def test_upgrade(self):
+        """A new charm revision runs every probe again."""
+        for charm in CHARMS:
+            self.check_invalidates(charm, lambda charm: charm.on.upgrade_charm.emit(),
+                                   {"reboot", "munge", "etcd"})
+
+    def test_munge_restart(self):
+        """A new munge key restarts munge, only its probe runs again."""
+        event = mock.Mock()
+        operations = {
+            "slurmd": lambda charm: charm._write_munge_key_and_restart_munge(),
+            "slurmdbd": lambda charm: charm._on_munge_available(event),
+            "slurmrestd": lambda charm: charm._on_configure_munge_key(event),
+        }
+        for charm, operation in operations.items():
+            self.check_invalidates(charm, operation, {"munge"})
+
+    def test_etcd_restart(self):
+        """Restarting etcd runs its probe again."""
+        for operation in ("start", "restart"):
+            self.check_invalidates("slurmctld",
+                                   lambda charm: getattr(charm._etcd, operation)(),
+                                   {"etcd"})
+
+
+if __name__ == "__main__":
+    unittest.main()
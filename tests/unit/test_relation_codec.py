@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""Test the compressed JSON payloads in relation data."""
+import sys
+import unittest
+from pathlib import Path
+
+from simulation import node_inventory, simulation, slurmctld_cluster
+
+REPO_DIR = Path(__file__).resolve().parents[2]
+CHARM_DIR = REPO_DIR / "charm-slurmctld"
+sys.path.insert(0, str(CHARM_DIR / "src"))
+
+import relation_codec  # noqa: E402
+
+TAG = f"{relation_codec.ENCODING}/{relation_codec.VERSION}"
+
+
+class UnitData(dict):
+    """The relation data of a unit, counting the writes."""
+
+    writes = 0
+
+    def __setitem__(self, key, value):
+        """Count the write."""
+        self.writes += 1
+        super().__setitem__(key, value)
+
+
+class Relation:
+    """The parts of an ops Relation the codec uses."""
+
+    def __init__(self, **units):
+        """Relate to the remote units, with their unit data."""
+        self.units = set(units)
+        self.data = {unit: UnitData(data) for unit, data in units.items()}
+        self.data["local/0"] = UnitData()
+
+
+class TestEncode(unittest.TestCase):
+    """Encode and decode payloads."""
+
+    def test_round_trips(self):
+        """Decoding an encoded payload returns its data, compressed or not."""
+        payloads = {
+            "inventory": node_inventory(0, 1),
+            "list": [node_inventory(0, index) for index in range(20)],
+            "string": "slurm.conf\n" * 100,
+            "unicode": {"partition_name": "défaut", "nodes": ["nœud"] * 100},
+            "empty": {},
+        }
+        for case, data in payloads.items():
+            for compress in (False, True):
+                encoded = relation_codec.encode(data, compress)
+                self.assertEqual(relation_codec.decode(encoded), data, (case, compress))
+
+    def test_compress_if_smaller(self):
+        """Payloads are only compressed if asked to, and if it makes them smaller."""
+        big = [node_inventory(0, index) for index in range(20)]
+        self.assertTrue(relation_codec.encode(big, True).startswith(f"{TAG}:"))
+        self.assertLess(len(relation_codec.encode(big, True)),
+                        len(relation_codec.encode(big)))
+        self.assertEqual(relation_codec.encode(big), relation_codec.json.dumps(big))
+
+        small = {"a": 1}
+        self.assertEqual(relation_codec.encode(small, True), '{"a": 1}')
+
+    def test_plain_json(self):
+        """Payloads of units predating the codec are plain JSON."""
+        self.assertEqual(relation_codec.decode('{"node_name": "node1"}'),
+                         {"node_name": "node1"})
+
+    def test_unsupported_version(self):
+        """Payloads of a newer codec version are refused."""
+        with self.assertRaises(ValueError):
+            relation_codec.decode(f"{relation_codec.ENCODING}/{relation_codec.VERSION + 1}:eJw=")
+
+
+class TestAdvertise(unittest.TestCase):
+    """Announce and check the encodings units decode."""
+
+    def test_advertise_once(self):
+        """The encoding is only written to the unit data the first time."""
+        relation = Relation()
+        relation_codec.advertise(relation, "local/0")
+        relation_codec.advertise(relation, "local/0")
+        self.assertEqual(relation.data["local/0"], {relation_codec.ENCODINGS_KEY: TAG})
+        self.assertEqual(relation.data["local/0"].writes, 1)
+
+    def test_remote_decodes(self):
+        """Payloads are compressed only if every remote unit decodes them."""
+        advertised = {relation_codec.ENCODINGS_KEY: TAG}
+        cases = {
+            "no units": (Relation(), False),
+            "all advertise": (Relation(a=advertised, b=advertised), True),
+            "one predates the codec": (Relation(a=advertised, b={}), False),
+            "none advertise": (Relation(a={}, b={}), False),
+            "several encodings": (
+                Relation(a={relation_codec.ENCODINGS_KEY: f"other/1,{TAG}"}), True),
+            "other version": (
+                Relation(a={relation_codec.ENCODINGS_KEY: f"{relation_codec.ENCODING}/0"}), False),
+        }
+        for case, (relation, decodes) in cases.items():
+            self.assertEqual(relation_codec.remote_decodes(relation), decodes, case)
+
+    def test_copies(self):
+        """Every charm ships the same codec."""
+        source = (CHARM_DIR / "src" / "relation_codec.py").read_text()
+        for charm in ("slurmd", "slurmdbd", "slurmrestd"):
+            copy = REPO_DIR / f"charm-{charm}" / "src" / "relation_codec.py"
+            self.assertEqual(copy.read_text(), source, charm)
+
+
+class TestMixedVersions(unittest.TestCase):
+    """slurmctld reads the inventories of slurmd units, whatever their version."""
+
+    def inventories(self, legacy_peers: bool):
+        """Return the inventories slurmctld sees, and the encoded ones."""
+        sim = simulation(legacy_peers).__enter__()
+        self.addCleanup(sim.__exit__, None, None, None)
+        harness, relations = slurmctld_cluster(sim, nodes=2)
+        sim.hook(harness, harness.add_relation_unit, relations["slurmd"], "slurmd/2")
+        sim.hook(harness, harness.update_relation_data, relations["slurmd"], "slurmd/2",
+                 {"inventory": sim.encode(node_inventory(0, 2))})
+
+        relation = harness.model.get_relation("slurmd", relations["slurmd"])
+        slurmd = harness.charm._slurmd
+        units = sorted(relation.units, key=lambda unit: unit.name)
+        encoded = [relation.data[unit]["inventory"] for unit in units]
+        inventories = [slurmd._unit_inventory(relation, unit) for unit in units]
+        self.assertEqual(relation.data[harness.charm.unit][relation_codec.ENCODINGS_KEY], TAG)
+        return inventories, encoded
+
+    def test_compressed_inventories(self):
+        """Units decoding compressed data send compressed inventories."""
+        inventories, encoded = self.inventories(legacy_peers=False)
+        self.assertEqual(inventories, [node_inventory(0, index) for index in range(3)])
+        self.assertTrue(all(value.startswith(f"{TAG}:") for value in encoded))
+
+    def test_plain_inventories(self):
+        """Units predating the codec send plain JSON, which is still read."""
+        inventories, encoded = self.inventories(legacy_peers=True)
+        self.assertEqual(inventories, [node_inventory(0, index) for index in range(3)])
+        self.assertTrue(all(value.startswith("{") for value in encoded))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Test how slurmctld applies the changes of the slurm config."""
+import sys
+import unittest
+from pathlib import Path
+
+CHARM_DIR = Path(__file__).resolve().parents[2] / "charm-slurmctld"
+sys.path.insert(0, str(CHARM_DIR / "src"))
+
+import config_changes  # noqa: E402
+from config_changes import NO_CHANGE, RECONFIGURE, RESTART  # noqa: E402
+
+NODE = {"node_name": "node1", "node_addr": "10.0.0.1", "real_memory": "257000"}
+
+SECTIONS = {
+    "partitions": [{"partition_name": "batch", "inventory": [NODE]}],
+    "down_nodes": [],
+    "slurmctld_info": {"active_controller_hostname": "slurmctld-0"},
+    "slurmdbd_info": {"active_slurmdbd_hostname": "slurmdbd-0"},
+    "addons_info": {"acct_gather_frequency": "task=30"},
+    "cluster_info": {
+        "cluster_name": "osd-cluster",
+        "custom_config": "FirstJobId=1234",
+        "proctrack_type": "proctrack/cgroup",
+        "cgroup_config": "ConstrainCores=yes",
+    },
+}
+
+
+def changed(section: str, **values) -> dict:
+    """Return SECTIONS with values changed in a section."""
+    return {**SECTIONS, section: {**SECTIONS[section], **values}}
+
+
+class TestClassify(unittest.TestCase):
+    """Restart slurmctld only for the changes a reconfigure does not apply."""
+
+    def test_changes(self):
+        """Each change takes the action of the most demanding section it changes."""
+        batch = SECTIONS["partitions"][0]
+        node2 = {**NODE, "node_name": "node2"}
+        changes = {
+            "nothing": (SECTIONS, NO_CHANGE),
+            "node joins": ({**SECTIONS, "partitions": [
+                {**batch, "inventory": [NODE, node2]}]}, RESTART),
+            "node memory": ({**SECTIONS, "partitions": [
+                {**batch, "inventory": [{**NODE, "real_memory": "128000"}]}]}, RECONFIGURE),
+            "partition state": ({**SECTIONS, "partitions": [
+                {**batch, "partition_state": "DOWN"}]}, RECONFIGURE),
+            "down nodes": ({**SECTIONS, "down_nodes": ["node1"]}, RECONFIGURE),
+            "controller moves": (changed("slurmctld_info",
+                                         active_controller_hostname="slurmctld-1"), RESTART),
+            "slurmdbd moves": (changed("slurmdbd_info",
+                                       active_slurmdbd_hostname="slurmdbd-1"), RESTART),
+            "addons": (changed("addons_info", acct_gather_frequency="task=60"), RECONFIGURE),
+            "cgroup.conf": (changed("cluster_info", cgroup_config="ConstrainCores=no"),
+                            RECONFIGURE),
+            "custom parameter": (changed("cluster_info", custom_config="FirstJobId=1"),
+                                 RECONFIGURE),
+            "proctrack type": (changed("cluster_info", proctrack_type="proctrack/linuxproc"),
+                               RESTART),
+            "cluster name": (changed("cluster_info", cluster_name="other"), RESTART),
+            "custom select type": (changed("cluster_info",
+                                           custom_config="FirstJobId=1234\nSelectType=select/linear"),
+                                   RESTART),
+            "custom plugin, any case": (changed("cluster_info",
+                                                custom_config="taskplugin=task/affinity"),
+                                        RESTART),
+            "commented out plugin": (changed("cluster_info",
+                                             custom_config="FirstJobId=1234\n#SelectType=x"),
+                                     RECONFIGURE),
+        }
+        previous = config_changes.fingerprint(SECTIONS)
+        for change, (sections, action) in changes.items():
+            current = config_changes.fingerprint(sections)
+            self.assertEqual(config_changes.classify(previous, current), action, change)
+
+    def test_first_write(self):
+        """Without previous fingerprints, slurmctld is restarted."""
+        current = config_changes.fingerprint(SECTIONS)
+        self.assertEqual(config_changes.classify({}, current), RESTART)
+
+    def test_missing_section(self):
+        """Fingerprints of a previous charm revision miss sections, they changed."""
+        current = config_changes.fingerprint(SECTIONS)
+        previous = {section: value for section, value in current.items()
+                    if section != "restart_parameters"}
+        self.assertEqual(config_changes.classify(previous, current), RESTART)
+
+    def test_order_is_not_a_change(self):
+        """Juju lists relations and units in any order."""
+        node2 = {**NODE, "node_name": "node2"}
+        other = {"partition_name": "other", "inventory": []}
+        sections = {**SECTIONS, "partitions": [
+            {"partition_name": "batch", "inventory": [NODE, node2]}, other]}
+        reordered = {**SECTIONS, "partitions": [
+            other, {"partition_name": "batch", "inventory": [node2, NODE]}]}
+        self.assertEqual(config_changes.classify(config_changes.fingerprint(sections),
+                                                 config_changes.fingerprint(reordered)),
+                         NO_CHANGE)
+
+
+if __name__ == "__main__":
+    unittest.main()
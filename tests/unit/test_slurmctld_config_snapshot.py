@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""Test the snapshots of what slurmctld assembles slurm.conf from."""
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+CHARM_DIR = Path(__file__).resolve().parents[2] / "charm-slurmctld"
+sys.path.insert(0, str(CHARM_DIR / "src"))
+
+import config_snapshot  # noqa: E402
+
+SNAPSHOT = {"version": config_snapshot.SNAPSHOT_VERSION, "slurmd": []}
+
+
+class TestWrite(unittest.TestCase):
+    """Write the snapshots only readable by their owner."""
+
+    def setUp(self):
+        """Write the snapshots in a temporary directory."""
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp_dir.cleanup)
+        self.path = Path(self._tmp_dir.name) / "snapshot.json.gz"
+
+    def test_new(self):
+        """A new snapshot is only readable by its owner."""
+        size = config_snapshot.write(SNAPSHOT, self.path)
+        self.assertEqual(size, self.path.stat().st_size)
+        self.assertEqual(self.path.stat().st_mode & 0o777, 0o600)
+        self.assertEqual(config_snapshot.load(self.path), SNAPSHOT)
+
+    def test_existing(self):
+        """An existing file readable by all is overwritten, and its mode restricted."""
+        self.path.write_text("a longer content than the snapshot" * 100)
+        self.path.chmod(0o644)
+        config_snapshot.write(SNAPSHOT, self.path)
+        self.assertEqual(self.path.stat().st_mode & 0o777, 0o600)
+        self.assertEqual(config_snapshot.load(self.path), SNAPSHOT)
+
+    def test_symlink(self):
+        """A symbolic link is not followed."""
+        target = Path(self._tmp_dir.name) / "target"
+        target.write_text("kept")
+        self.path.symlink_to(target)
+        with self.assertRaises(OSError):
+            config_snapshot.write(SNAPSHOT, self.path)
+        self.assertEqual(target.read_text(), "kept")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""Test the etcd accounts slurmctld creates for the munge key."""
+import json
+import unittest
+from unittest import mock
+
+from simulation import simulation, slurmctld_cluster
+
+
+class TestMungeUser(unittest.TestCase):
+    """Create etcd accounts reading the munge key."""
+
+    def setUp(self):
+        """Start a slurmctld leader with the default etcd roles and users."""
+        self.sim = simulation().__enter__()
+        self.addCleanup(self.sim.__exit__, None, None, None)
+        self.harness, _ = slurmctld_cluster(self.sim, nodes=1)
+        self.charm = self.harness.charm
+        self.root_pass = self.charm._stored.etcd_root_pass
+        self.charm._etcd.setup_default_roles(self.root_pass, "slurmd-pass", "slurmrestd-pass")
+        self.etcd = self.sim.etcd
+
+    def create(self, user: str, password: str) -> None:
+        """Create the account, as the action does."""
+        self.charm._etcd.create_new_munge_user(self.root_pass, user, password)
+
+    def test_new_user(self):
+        """A new account only reads the munge key."""
+        self.create("munge-reader", "secret")
+        self.assertEqual(self.etcd.users["munge-reader"], {"munge-readers"})
+        self.assertEqual(self.etcd.passwords["munge-reader"], "secret")
+
+    def test_existing_munge_user(self):
+        """The password of an existing account is updated."""
+        self.create("munge-reader", "secret")
+        self.create("munge-reader", "new-secret")
+        self.assertEqual(self.etcd.users["munge-reader"], {"munge-readers"})
+        self.assertEqual(self.etcd.passwords["munge-reader"], "new-secret")
+
+    def test_charm_users(self):
+        """The users of the charms are refused, and left as they are."""
+        for user in ("root", "slurmd", "slurmrestd"):
+            with self.assertRaises(ValueError):
+                self.create(user, "secret")
+            self.assertEqual(self.etcd.users[user], {user})
+            self.assertNotEqual(self.etcd.passwords[user], "secret")
+
+    def test_user_with_other_roles(self):
+        """An account with more than the munge-readers role is refused."""
+        self.create("operator", "secret")
+        self.etcd.users["operator"].add("slurmd")
+        with self.assertRaises(ValueError):
+            self.create("operator", "new-secret")
+        self.assertEqual(self.etcd.passwords["operator"], "secret")
+
+    def test_action_fails(self):
+        """The action reports the refused user."""
+        event = mock.Mock(params={"user": "root", "password": "secret"})
+        self.charm._create_etcd_user_for_munge_key_ops(event)
+        event.fail.assert_called_once()
+        event.set_results.assert_not_called()
+        self.assertEqual(self.etcd.passwords["root"], self.root_pass)
+
+
+class TestAccountedNodes(unittest.TestCase):
+    """Account for the slurmd nodes, for upgraded and older slurmd units."""
+
+    def setUp(self):
+        """Start a slurmctld leader, upgraded from a version writing the node list only."""
+        self.sim = simulation().__enter__()
+        self.addCleanup(self.sim.__exit__, None, None, None)
+        harness, _ = slurmctld_cluster(self.sim, nodes=1)
+        self.charm = harness.charm
+        self.etcd = self.sim.etcd
+        self.etcd.kv.clear()
+        self.etcd.kv["nodes/all_nodes"] = json.dumps(["node1", "node2"])
+
+    def account(self, nodes: list) -> int:
+        """Account for the nodes, return the number of etcd transactions."""
+        transactions = self.sim.counters["etcd transactions"]
+        self.charm._etcd.set_list_of_accounted_nodes(self.charm._stored.etcd_root_pass, nodes)
+        return self.sim.counters["etcd transactions"] - transactions
+
+    def legacy_nodes(self) -> list:
+        """Return the nodes slurmd units predating the per-node keys see."""
+        return json.loads(self.etcd.kv["nodes/all_nodes"])
+
+    def test_transition(self):
+        """The node list is kept up to date with the per-node keys, in one transaction."""
+        self.assertEqual(self.account(["node1", "node2", "node3"]), 1)
+        self.assertEqual(self.legacy_nodes(), ["node1", "node2", "node3"])
+        self.assertEqual(sorted(key for key in self.etcd.kv if key != "nodes/all_nodes"),
+                         ["nodes/accounted/node1", "nodes/accounted/node2",
+                          "nodes/accounted/node3"])
+
+        self.assertEqual(self.account(["node1", "node3", "node4"]), 1)
+        self.assertEqual(self.legacy_nodes(), ["node1", "node3", "node4"])
+        self.assertNotIn("nodes/accounted/node2", self.etcd.kv)
+
+    def test_unchanged(self):
+        """Nothing is written when no node is added nor removed."""
+        self.account(["node1", "node2"])
+        writes = self.sim.counters["etcd writes"]
+        self.assertEqual(self.account(["node2", "node1"]), 0)
+        self.assertEqual(self.sim.counters["etcd writes"], writes)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Test the hostlist expressions of the node lists of slurm.conf."""
+import sys
+import unittest
+from pathlib import Path
+
+CHARM_DIR = Path(__file__).resolve().parents[2] / "charm-slurmctld"
+sys.path.insert(0, str(CHARM_DIR / "src"))
+
+import hostlist  # noqa: E402
+
+
+def expand_all(expressions) -> list:
+    """Return the hostnames of expressions, in the order Slurm expands them."""
+    return [hostname for expression in expressions for hostname in hostlist.expand(expression)]
+
+
+class TestCompress(unittest.TestCase):
+    """Compress hostnames into expressions that expand back to them."""
+
+    def test_round_trips(self):
+        """Each list of hostnames compresses to expressions expanding to its names."""
+        cases = {
+            "contiguous": (["node1", "node2", "node3"], ["node[1-3]"]),
+            "gaps": (["node1", "node2", "node5", "node7", "node8"], ["node[1-2,5,7-8]"]),
+            "zero padding": (["node001", "node002", "node010"], ["node[001-002,010]"]),
+            "mixed widths": (["node9", "node10", "node11"], ["node[9-11]"]),
+            "padded and not": (["node09", "node10"], ["node09", "node10"]),
+            "unordered": (["node3", "node1", "node2"], ["node[1-3]"]),
+            "prefixes": (["gpu1", "cpu1", "gpu2"], ["gpu[1-2]", "cpu1"]),
+            "digits in the prefix": (["rack1-node1", "rack1-node2", "rack2-node1"],
+                                     ["rack1-node[1-2]", "rack2-node1"]),
+            "without number": (["login", "node1", "node2"], ["login", "node[1-2]"]),
+            "single": (["node1"], ["node1"]),
+            "zero": (["node0", "node1"], ["node[0-1]"]),
+        }
+        for case, (hostnames, expressions) in cases.items():
+            compressed = hostlist.compress(hostnames)
+            self.assertEqual(compressed, expressions, case)
+            self.assertEqual(sorted(expand_all(compressed)), sorted(hostnames), case)
+
+    def test_duplicates(self):
+        """Duplicate hostnames are listed once."""
+        compressed = hostlist.compress(["node1", "node1", "node2", "login", "login"])
+        self.assertEqual(compressed, ["login", "node[1-2]"])
+        self.assertEqual(expand_all(compressed), ["login", "node1", "node2"])
+
+    def test_expand_plain_hostname(self):
+        """A hostname without range is its own expansion."""
+        self.assertEqual(hostlist.expand("login"), ["login"])
+
+
+class TestGroupInventory(unittest.TestCase):
+    """Collapse nodes with the same hardware into one node definition."""
+
+    @staticmethod
+    def node(name: str, addr: str = "", memory: str = "257000") -> dict:
+        """Return the inventory of a node."""
+        node = {"node_name": name, "real_memory": memory, "cpus": "64"}
+        if addr:
+            node["node_addr"] = addr
+        return node
+
+    def test_addresses_follow_the_names(self):
+        """The addresses are listed in the order Slurm expands the names in."""
+        inventory = [self.node("node3", "10.0.0.3"), self.node("login", "10.0.1.1"),
+                     self.node("node1", "10.0.0.1"), self.node("node2", "10.0.0.2")]
+        self.assertEqual(hostlist.group_inventory(inventory), [
+            {"node_name": "login,node[1-3]", "node_addr": "10.0.1.1,10.0.0.1,10.0.0.2,10.0.0.3",
+             "real_memory": "257000", "cpus": "64"},
+        ])
+
+    def test_missing_address(self):
+        """Without the address of every node, no address is listed."""
+        inventory = [self.node("node1", "10.0.0.1"), self.node("node2")]
+        self.assertEqual(hostlist.group_inventory(inventory), [
+            {"node_name": "node[1-2]", "real_memory": "257000", "cpus": "64"},
+        ])
+
+    def test_hardware_buckets(self):
+        """Nodes with different hardware stay apart, single nodes are kept as they are."""
+        small = self.node("node3", "10.0.0.3", memory="128000")
+        inventory = [self.node("node1", "10.0.0.1"), small, self.node("node2", "10.0.0.2")]
+        grouped = hostlist.group_inventory(inventory)
+        self.assertEqual([node["node_name"] for node in grouped], ["node[1-2]", "node3"])
+        self.assertIs(grouped[1], small)
+
+    def test_inventory_not_modified(self):
+        """The inventories are shared by all the partitions of the hook."""
+        inventory = [self.node("node1", "10.0.0.1"), self.node("node2")]
+        hostlist.group_inventory(inventory)
+        self.assertEqual(inventory, [self.node("node1", "10.0.0.1"), self.node("node2")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""Test how slurmctld coalesces bursts of slurmd joins into one reconfiguration."""
+import unittest
+
+from simulation import node_inventory, simulation, slurmctld_cluster
+
+SETTLE_TIME = 60
+
+
+class TestMembershipSettle(unittest.TestCase):
+    """Join slurmd units while slurmd-settle-time is set."""
+
+    def setUp(self):
+        """Start a slurmctld leader with a partition of 10 nodes."""
+        self.sim = simulation().__enter__()
+        self.addCleanup(self.sim.__exit__, None, None, None)
+        self.harness, relations = slurmctld_cluster(
+            self.sim, nodes=10, config={"slurmd-settle-time": SETTLE_TIME})
+        self.relation = relations["slurmd"]
+        self.charm = self.harness.charm
+
+    def join(self, index: int):
+        """Add a slurmd unit, in the hooks Juju runs for it."""
+        unit = f"slurmd/{index}"
+        self.sim.hook(self.harness, self.harness.add_relation_unit, self.relation, unit)
+        self.sim.hook(self.harness, self.harness.update_relation_data, self.relation, unit,
+                      {"inventory": self.sim.encode(node_inventory(0, index))})
+
+    def renders(self) -> int:
+        """Return the number of slurm.conf renders."""
+        return self.sim.counters["slurmctld renders"]
+
+    def test_settle_flush_join(self):
+        """A burst flushed by update-status does not hold back the next one."""
+        renders = self.renders()
+        self.join(10)
+        self.assertEqual(self.charm._slurmd.pending_membership, ["slurmd/10"])
+        settle_handle = self.charm._stored.slurmd_settle_handle
+        self.assertTrue(settle_handle)
+
+        # the burst quiets down, update-status applies it before the
+        # deferred event runs again
+        self.sim.clock.sleep(SETTLE_TIME)
+        self.charm.on.update_status.emit()
+        self.assertEqual(self.renders(), renders + 1)
+        self.assertEqual(self.charm._slurmd.pending_membership, [])
+        self.assertEqual(self.charm._stored.slurmd_settle_handle, "")
+
+        # the next burst keeps an event of its own, and is applied once it
+        # settles
+        self.join(11)
+        self.assertEqual(self.charm._slurmd.pending_membership, ["slurmd/11"])
+        self.assertNotIn(self.charm._stored.slurmd_settle_handle, ("", settle_handle))
+        self.assertEqual(self.renders(), renders + 1)
+
+        self.sim.clock.sleep(SETTLE_TIME)
+        self.sim.hook(self.harness, self.charm.on.update_status.emit)
+        self.assertEqual(self.renders(), renders + 2)
+        self.assertEqual(self.charm._slurmd.pending_membership, [])
+        self.assertEqual(self.charm._stored.slurmd_settle_handle, "")
+
+
+if __name__ == "__main__":
+    unittest.main()
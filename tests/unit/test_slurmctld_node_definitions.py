@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""Test the node definitions slurmctld renders from the slurmd inventories."""
+import sys
+import unittest
+from pathlib import Path
+
+CHARM_DIR = Path(__file__).resolve().parents[2] / "charm-slurmctld"
+sys.path.insert(0, str(CHARM_DIR / "src"))
+
+import node_definitions  # noqa: E402
+
+NODE = {
+    "node_name": "node-0",
+    "node_addr": "10.0.0.1",
+    "state": "UNKNOWN",
+    "real_memory": "257672",
+    "cpus": "64",
+    "threads_per_core": "2",
+    "cores_per_socket": "16",
+    "sockets_per_board": "2",
+    "new_node": True,
+}
+
+TOPOLOGY = {
+    "numa_nodes": "2",
+    "topology": {"numa": [{"node": 0, "cpus": "0-15,32-47", "memory": 128836},
+                          {"node": 1, "cpus": "16-31,48-63", "memory": 128836}],
+                 "l3": ["0-15,32-47", "16-31,48-63"]},
+    "core_spec_count": "2",
+    "cpu_spec_list": "30-31,62-63",
+    "mem_spec_limit": "8052",
+}
+
+
+class TestNodeDefinitions(unittest.TestCase):
+    """Render the reservations node-specialization asks for."""
+
+    def setUp(self):
+        """Create the inventory of a node sending its topology."""
+        self.inventory = [{**NODE, **TOPOLOGY}]
+
+    def test_none(self):
+        """Neither the topology nor the reservations are rendered."""
+        self.assertEqual(node_definitions.node_definitions(self.inventory, "none"), [NODE])
+
+    def test_cores(self):
+        """The cores value renders CoreSpecCount and MemSpecLimit."""
+        self.assertEqual(node_definitions.node_definitions(self.inventory, "cores"),
+                         [{**NODE, "core_spec_count": "2", "mem_spec_limit": "8052"}])
+
+    def test_cpus(self):
+        """The cpus value renders CpuSpecList and MemSpecLimit."""
+        self.assertEqual(node_definitions.node_definitions(self.inventory, "cpus"),
+                         [{**NODE, "cpu_spec_list": "30-31,62-63", "mem_spec_limit": "8052"}])
+
+    def test_unknown(self):
+        """Unknown values reserve nothing."""
+        with self.assertLogs(level="WARNING"):
+            definitions = node_definitions.node_definitions(self.inventory, "sockets")
+        self.assertEqual(definitions, [NODE])
+
+    def test_inventory_not_modified(self):
+        """The inventories are shared by all the partitions of the hook."""
+        node_definitions.node_definitions(self.inventory, "none")
+        self.assertEqual(self.inventory, [{**NODE, **TOPOLOGY}])
+
+    def test_legacy_inventory(self):
+        """Inventories without topology are not copied."""
+        inventory = [dict(NODE)]
+        self.assertIs(node_definitions.node_definitions(inventory, "cores")[0], inventory[0])
+
+
+class TestFeaturePartitions(unittest.TestCase):
+    """Add a partition of the nodes with a feature."""
+
+    PARTITIONS = [
+        {"partition_name": "batch", "inventory": [
+            {"node_name": f"node{index}", "features": "avx2,icelake,x86_64_v4,avx512"}
+            for index in range(1, 5)
+        ] + [{"node_name": "node5", "features": "avx2,zen3,x86_64_v3"}]},
+        {"partition_name": "gpu", "inventory": [
+            {"node_name": "gpu1", "features": "a100,avx2,avx512,icelake,x86_64_v4"},
+            {"node_name": "gpu2"},
+        ]},
+    ]
+
+    def test_partitions(self):
+        """The nodes of all the partitions with the feature are listed."""
+        self.assertEqual(
+            node_definitions.feature_partitions(self.PARTITIONS, ["avx512", "a100", "sve"]),
+            "PartitionName=avx512 Nodes=node[1-4],gpu1 State=UP\n"
+            "PartitionName=a100 Nodes=gpu1 State=UP")
+
+    def test_named_like_a_partition(self):
+        """A feature can not replace a partition of the slurmd applications."""
+        with self.assertLogs(level="WARNING"):
+            self.assertEqual(node_definitions.feature_partitions(self.PARTITIONS, ["gpu"]), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
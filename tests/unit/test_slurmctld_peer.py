@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""Test how the slurmctld leader schedules the controllers among its peers."""
+import json
+import os
+import unittest
+from unittest import mock
+
+from simulation import app_data_writes, charm_module, simulation, slurmctld_cluster
+
+
+class TestScheduleControllers(unittest.TestCase):
+    """Assign the active, backup and standby controllers as peers come and go."""
+
+    def setUp(self):
+        """Start a slurmctld leader without peers."""
+        self.sim = simulation().__enter__()
+        self.addCleanup(self.sim.__exit__, None, None, None)
+        self.harness, relations = slurmctld_cluster(self.sim, nodes=1)
+        self.peer = relations["slurmctld-peer"]
+
+    def app_data(self) -> dict:
+        """Return the roles in the application data."""
+        return self.harness.get_relation_data(self.peer, "slurmctld")
+
+    def join(self, index: int) -> list:
+        """Add a peer, and return the keys of the application data written."""
+        unit = f"slurmctld/{index}"
+        with app_data_writes(self.harness, self.peer) as writes:
+            self.sim.hook(self.harness, self.harness.add_relation_unit, self.peer, unit)
+            self.sim.hook(self.harness, self.harness.update_relation_data, self.peer, unit,
+                          {"ingress-address": f"10.0.0.{index + 1}",
+                           "hostname": f"slurmctld-{index}", "port": "6817"})
+        return writes
+
+    def depart(self, index: int) -> list:
+        """Remove a peer, and return the keys of the application data written."""
+        with app_data_writes(self.harness, self.peer) as writes:
+            self.sim.hook(self.harness, self.harness.remove_relation_unit, self.peer,
+                          f"slurmctld/{index}")
+        return writes
+
+    def check_roles(self, backup: str, standby: list):
+        """Check the roles, and the backup controller info slurm.conf is rendered with."""
+        data = self.app_data()
+        self.assertEqual(data["active_controller"], "slurmctld/0")
+        self.assertEqual(data.get("backup_controller", ""), backup)
+        self.assertEqual(json.loads(data["standby_controllers"]), standby)
+        info = json.loads(data["slurmctld_info"])
+        self.assertEqual(info["backup_controller_hostname"],
+                         backup.replace("/", "-"))
+
+    def test_join(self):
+        """The first peer becomes the backup, the next ones standbys."""
+        self.assertEqual(sorted(self.join(1)),
+                         ["backup_controller", "slurmctld_info", "standby_controllers"])
+        self.check_roles("slurmctld/1", [])
+
+        self.assertEqual(self.join(2), ["standby_controllers"])
+        self.check_roles("slurmctld/1", ["slurmctld/2"])
+
+        # a peer changing its unit data changes no role
+        with app_data_writes(self.harness, self.peer) as writes:
+            self.sim.hook(self.harness, self.harness.update_relation_data, self.peer,
+                          "slurmctld/2", {"other": "value"})
+        self.assertEqual(writes, [])
+
+    def test_depart(self):
+        """A departed standby is forgotten, a departed backup replaced by a standby."""
+        self.join(1)
+        self.join(2)
+        self.join(3)
+        self.check_roles("slurmctld/1", ["slurmctld/2", "slurmctld/3"])
+
+        self.assertEqual(self.depart(2), ["standby_controllers"])
+        self.check_roles("slurmctld/1", ["slurmctld/3"])
+
+        self.assertEqual(sorted(self.depart(1)),
+                         ["backup_controller", "slurmctld_info", "standby_controllers"])
+        self.check_roles("slurmctld/3", [])
+
+        self.assertEqual(sorted(self.depart(3)), ["backup_controller", "slurmctld_info"])
+        self.check_roles("", [])
+
+    def test_once_per_hook(self):
+        """The controllers are scheduled once per hook for the same peers."""
+        self.join(1)
+        peer = self.harness.charm._slurmctld_peer
+        module = charm_module("slurmctld", "interface_slurmctld_peer")
+        with mock.patch.dict(os.environ, {"JUJU_CONTEXT_ID": "slurmctld/0-1"}), \
+                mock.patch.object(module, "_schedule_backup",
+                                  wraps=module._schedule_backup) as schedule:
+            self.assertTrue(peer._schedule_controllers())
+            self.assertTrue(peer._schedule_controllers())
+            self.assertEqual(schedule.call_count, 1)
+
+            # a new peer is scheduled again
+            self.join(2)
+            self.assertEqual(schedule.call_count, 2)
+
+
+class TestLeaderChange(unittest.TestCase):
+    """A standby slurmctld takes over when the leader departs."""
+
+    def test_leader_departs(self):
+        """The new leader becomes the active controller, without backup."""
+        sim = simulation().__enter__()
+        self.addCleanup(sim.__exit__, None, None, None)
+        harness, relations = slurmctld_cluster(sim, nodes=1, leader=False)
+        peer = relations["slurmctld-peer"]
+        with harness.hooks_disabled():
+            harness.add_relation_unit(peer, "slurmctld/1")
+            harness.update_relation_data(peer, "slurmctld/1", {"ingress-address": "10.0.0.2"})
+            harness.update_relation_data(peer, "slurmctld", {
+                "active_controller": "slurmctld/1",
+                "backup_controller": "slurmctld/0",
+                "standby_controllers": "[]",
+            })
+
+        # only the leader schedules the controllers
+        with app_data_writes(harness, peer) as writes:
+            sim.hook(harness, harness.update_relation_data, peer, "slurmctld/1",
+                     {"hostname": "slurmctld-1", "port": "6817"})
+        self.assertEqual(writes, [])
+
+        with app_data_writes(harness, peer) as writes:
+            sim.hook(harness, harness.set_leader, True)
+            sim.hook(harness, harness.remove_relation_unit, peer, "slurmctld/1")
+        data = harness.get_relation_data(peer, "slurmctld")
+        self.assertEqual(data["active_controller"], "slurmctld/0")
+        self.assertNotIn("backup_controller", data)
+        self.assertEqual(data["standby_controllers"], "[]")
+        self.assertNotIn("standby_controllers", writes)
+        self.assertEqual(len(writes), len(set(writes)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""Test the Slurm config files slurmctld renders itself."""
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parents[2]
+CHARM_DIR = REPO_DIR / "charm-slurmctld"
+sys.path.insert(0, str(CHARM_DIR / "src"))
+
+import node_definitions  # noqa: E402
+from slurm_files import SlurmFiles, with_job_container  # noqa: E402
+
+SLURM_CONFIG = {
+    "partitions": [
+        {"partition_name": "gpu", "inventory": [
+            {"node_name": "gpu[1-4]", "gres": "gpu:a100:4",
+             "gres_conf": {"autodetect": "nvml"}},
+            {"node_name": "gpu5", "gres": "gpu:a100:2", "gres_conf": {"devices": [
+                {"name": "gpu", "type": "a100", "file": "/dev/nvidia0", "cores": "0-15"},
+                {"name": "gpu", "type": "a100", "file": "/dev/nvidia1", "cores": ""},
+            ]}},
+        ]},
+        {"partition_name": "cpu", "inventory": [
+            {"node_name": "cpu[1-100]", "tmp_disk": "1907729",
+             "scratch_path": "/local/slurm"},
+            {"node_name": "cpu[101-120]", "tmp_disk": "40960"},
+        ]},
+    ],
+}
+
+# the slurm.conf slurm_ops_manager renders, before the charm completes it
+SLURM_CONF = """\
+ClusterName=osd-cluster
+NodeName=cpu[1-2] NodeAddr=10.0.0.1,10.0.0.2 State=UNKNOWN RealMemory=257000 CPUs=64
+NodeName=cpu3 NodeAddr=10.0.0.3 State=UNKNOWN RealMemory=257000 CPUs=64 MemSpecLimit=1
+NodeName=login State=UNKNOWN
+PartitionName=cpu Nodes=cpu[1-3] Default=YES State=UP
+"""
+SPEC = {"core_spec_count": "2", "cpu_spec_list": "30-31,62-63", "mem_spec_limit": "8031"}
+
+
+class TestNodeDefinitions(unittest.TestCase):
+    """Complete the NodeName lines of slurm.conf."""
+
+    def setUp(self):
+        """Render the files in a temporary directory, next to slurm.conf."""
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.files = SlurmFiles()
+        self.files._conf_dir = Path(self._tmp_dir.name)
+        self.slurm_conf = self.files._conf_dir / "slurm.conf"
+        self.slurm_conf.write_text(SLURM_CONF)
+
+    def tearDown(self):
+        """Remove the rendered files."""
+        self._tmp_dir.cleanup()
+
+    def render(self, inventory: list, specialization: str = node_definitions.NONE) -> list:
+        """Complete slurm.conf with the node definitions, return its lines."""
+        slurm_config = {"partitions": [{
+            "partition_name": "cpu",
+            "inventory": node_definitions.node_definitions(inventory, specialization),
+        }]}
+        self.files.write_node_definitions(slurm_config)
+        return self.slurm_conf.read_text().splitlines()
+
+    def test_specialization(self):
+        """The resources reserved are rendered as node-specialization asks for."""
+        inventory = [{"node_name": "cpu[1-2]", **SPEC}, {"node_name": "cpu3", **SPEC}]
+        rendered = {
+            node_definitions.NONE: "",
+            node_definitions.CORES: " CoreSpecCount=2 MemSpecLimit=8031",
+            node_definitions.CPUS: " CpuSpecList=30-31,62-63 MemSpecLimit=8031",
+        }
+        for specialization, attributes in rendered.items():
+            self.slurm_conf.write_text(SLURM_CONF)
+            self.assertEqual(self.render(inventory, specialization)[1:3], [
+                "NodeName=cpu[1-2] NodeAddr=10.0.0.1,10.0.0.2 State=UNKNOWN RealMemory=257000 "
+                f"CPUs=64{attributes}",
+                "NodeName=cpu3 NodeAddr=10.0.0.3 State=UNKNOWN RealMemory=257000 "
+                f"CPUs=64{attributes}",
+            ], specialization)
+
+    def test_gres(self):
+        """Typed GRES replace what the template rendered, and need their GresTypes."""
+        self.slurm_conf.write_text(SLURM_CONF.replace("CPUs=64\n", "CPUs=64 Gres=gpu:0\n"))
+        lines = self.render([{"node_name": "cpu[1-2]", "gres": "gpu:a100:4,gpu:t4:1"},
+                             {"node_name": "cpu3", "gres": ""}])
+        self.assertEqual(lines[1:3], [
+            "NodeName=cpu[1-2] NodeAddr=10.0.0.1,10.0.0.2 State=UNKNOWN RealMemory=257000 "
+            "CPUs=64 Gres=gpu:a100:4,gpu:t4:1",
+            "NodeName=cpu3 NodeAddr=10.0.0.3 State=UNKNOWN RealMemory=257000 CPUs=64",
+        ])
+        self.assertEqual(lines[-1], "GresTypes=gpu")
+
+    def test_gres_count(self):
+        """The count of GPUs set-node-gres used to take is still rendered."""
+        lines = self.render([{"node_name": "cpu[1-2]", "gres": 2}, {"node_name": "cpu3", "gres": "0"}])
+        self.assertTrue(lines[1].endswith(" CPUs=64 Gres=gpu:2"))
+        self.assertTrue(lines[2].endswith(" CPUs=64"))
+
+    def test_gres_types_set(self):
+        """The GresTypes set in slurm.conf are kept."""
+        self.slurm_conf.write_text(SLURM_CONF + "GresTypes=gpu,mps\n")
+        lines = self.render([{"node_name": "cpu3", "gres": "gpu:a100:1"}])
+        self.assertEqual([line for line in lines if line.startswith("GresTypes")],
+                         ["GresTypes=gpu,mps"])
+
+    def test_tmp_disk(self):
+        """The size of the nodes' scratch filesystem is rendered as TmpDisk, in MB."""
+        lines = self.render([{"node_name": "cpu[1-2]", "tmp_disk": "1907729"},
+                             {"node_name": "cpu3", "tmp_disk": "40960", "gres": "gpu:t4:1"}])
+        self.assertTrue(lines[1].endswith(" CPUs=64 TmpDisk=1907729"))
+        self.assertTrue(lines[2].endswith(" CPUs=64 Gres=gpu:t4:1 TmpDisk=40960"))
+
+    def test_features(self):
+        """The features of the nodes are rendered, jobs are constrained to them with -C."""
+        inventory = [{"node_name": "cpu[1-2]", "features": "avx2,avx512,icelake"},
+                     {"node_name": "cpu3", "features": "avx2,a100", "gres": "gpu:a100:1",
+                      "tmp_disk": "40960", **SPEC}]
+        lines = self.render(inventory, node_definitions.CORES)
+        self.assertTrue(lines[1].endswith(" CPUs=64 Features=avx2,avx512,icelake"))
+        self.assertTrue(lines[2].endswith(" CPUs=64 Gres=gpu:a100:1 TmpDisk=40960 "
+                                          "Features=avx2,a100 CoreSpecCount=2 MemSpecLimit=8031"))
+
+    def test_other_lines(self):
+        """The lines not defining nodes of the inventory are kept as they are."""
+        lines = self.render([{"node_name": "cpu3", **SPEC}], node_definitions.CORES)
+        self.assertEqual(lines[:2] + lines[3:], SLURM_CONF.splitlines()[:2]
+                         + SLURM_CONF.splitlines()[3:])
+
+    def test_unchanged(self):
+        """A complete slurm.conf is not written again."""
+        inventory = [{"node_name": "cpu[1-2]", **SPEC}]
+        slurm_config = {"partitions": [{"partition_name": "cpu", "inventory": inventory}]}
+        self.assertTrue(self.files.write_node_definitions(slurm_config))
+        content = self.slurm_conf.read_text()
+        self.assertFalse(self.files.write_node_definitions(slurm_config))
+        self.assertEqual(self.slurm_conf.read_text(), content)
+
+    def test_missing_slurm_conf(self):
+        """Without slurm.conf, there is nothing to complete."""
+        self.slurm_conf.unlink()
+        self.assertFalse(self.files.write_node_definitions(SLURM_CONFIG))
+        self.assertFalse(self.slurm_conf.exists())
+
+    def test_copies(self):
+        """The slurmrestd charm completes its slurm.conf the same way."""
+        source = (CHARM_DIR / "src" / "node_lines.py").read_text()
+        copy = REPO_DIR / "charm-slurmrestd" / "src" / "node_lines.py"
+        self.assertEqual(copy.read_text(), source)
+
+
+class TestGresConf(unittest.TestCase):
+    """Render gres.conf from the nodes' gres_conf."""
+
+    def setUp(self):
+        """Render the files in a temporary directory."""
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.files = SlurmFiles()
+        self.files._conf_dir = Path(self._tmp_dir.name)
+
+    def tearDown(self):
+        """Remove the rendered files."""
+        self._tmp_dir.cleanup()
+
+    def test_render(self):
+        """Nodes with AutoDetect have one line, the other ones one per device."""
+        self.assertTrue(self.files.write_gres_conf(SLURM_CONFIG))
+        lines = (self.files._conf_dir / "gres.conf").read_text().splitlines()
+        self.assertEqual(lines[1:], [
+            "NodeName=gpu[1-4] AutoDetect=nvml",
+            "NodeName=gpu5 Name=gpu Type=a100 File=/dev/nvidia0 Cores=0-15",
+            "NodeName=gpu5 Name=gpu Type=a100 File=/dev/nvidia1",
+        ])
+
+    def test_unchanged(self):
+        """An unchanged gres.conf is not written again."""
+        self.files.write_gres_conf(SLURM_CONFIG)
+        self.assertFalse(self.files.write_gres_conf(SLURM_CONFIG))
+
+
+class TestJobContainer(unittest.TestCase):
+    """Render job_container.conf and the settings of job_container/tmpfs."""
+
+    def setUp(self):
+        """Render the files in a temporary directory."""
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.files = SlurmFiles()
+        self.files._conf_dir = Path(self._tmp_dir.name)
+
+    def tearDown(self):
+        """Remove the rendered files."""
+        self._tmp_dir.cleanup()
+
+    def test_render(self):
+        """Nodes with a scratch path keep the jobs' /tmp there."""
+        self.assertTrue(self.files.write_job_container_conf(SLURM_CONFIG))
+        lines = (self.files._conf_dir / "job_container.conf").read_text().splitlines()
+        self.assertEqual(lines[1:], [
+            "AutoBasePath=true",
+            "BasePath=/var/spool/slurmd/tmpfs",
+            "NodeName=cpu[1-100] BasePath=/local/slurm",
+        ])
+
+    def test_custom_config(self):
+        """The settings are added to custom-config, unless it sets them already."""
+        self.assertEqual(with_job_container(""),
+                         "JobContainerType=job_container/tmpfs\nPrologFlags=Contain")
+        self.assertEqual(with_job_container("FirstJobId=1234\nprologflags=Contain,X11"),
+                         "FirstJobId=1234\nprologflags=Contain,X11\n"
+                         "JobContainerType=job_container/tmpfs")
+
+    def test_prolog_flags(self):
+        """Only PrologFlags without Contain are warned about."""
+        for flags in ("Contain", "Alloc, contain", "X11"):
+            with self.assertNoLogs(level="WARNING"):
+                with_job_container(f"PrologFlags={flags}")
+        for flags in ("Alloc,NoHold", ""):
+            with self.assertLogs(level="WARNING"):
+                with_job_container(f"PrologFlags={flags}")
+
+
+if __name__ == "__main__":
+    unittest.main()
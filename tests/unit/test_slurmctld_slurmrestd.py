@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Test how slurmctld publishes the slurm config to slurmrestd."""
+import unittest
+from unittest import mock
+
+from simulation import charm_module, simulation, slurmctld_cluster
+
+CONFIG_DELIVERY_KEY = "slurm_config_delivery"
+
+
+class TestPublish(unittest.TestCase):
+    """Publish the etcd endpoint to the slurmrestd units."""
+
+    def setUp(self):
+        """Start a slurmctld leader related to slurmrestd."""
+        self.sim = simulation().__enter__()
+        self.addCleanup(self.sim.__exit__, None, None, None)
+        self.harness, self.relations = slurmctld_cluster(self.sim, nodes=2)
+
+    def test_etcd_endpoint(self):
+        """The leader publishes the address and port of its etcd."""
+        data = self.harness.get_relation_data(self.relations["slurmrestd"], "slurmctld")
+        self.assertEqual(data["etcd_host"], "10.0.0.1")
+        self.assertEqual(data["etcd_port"], "2379")
+        self.assertNotIn("slurm_config", data)
+        self.assertTrue(data["slurm_config_hash"])
+
+    def test_units_switch_to_etcd(self):
+        """The config sent before the units joined moves to etcd once they ask for it."""
+        harness = self.harness
+        relation = harness.add_relation("slurmrestd", "slurmrestd-new")
+        harness.update_relation_data(relation, harness.charm.unit.name,
+                                     {"ingress-address": "10.0.0.1"})
+        data = harness.get_relation_data(relation, "slurmctld")
+        self.assertTrue(data["slurm_config"])
+        self.assertNotIn("etcd_host", data)
+
+        self.sim.hook(harness, harness.add_relation_unit, relation, "slurmrestd-new/0")
+        self.assertTrue(data["slurm_config"])
+
+        self.sim.hook(harness, harness.update_relation_data, relation, "slurmrestd-new/0",
+                      {CONFIG_DELIVERY_KEY: "etcd"})
+        data = harness.get_relation_data(relation, "slurmctld")
+        self.assertNotIn("slurm_config", data)
+        self.assertEqual(data["etcd_host"], "10.0.0.1")
+        self.assertTrue(data["slurm_config_hash"])
+
+        # the config is not published again for every change of the units
+        writes = self.sim.counters["etcd writes"]
+        self.sim.hook(harness, harness.update_relation_data, relation, "slurmrestd-new/0",
+                      {"other": "value"})
+        self.assertEqual(self.sim.counters["etcd writes"], writes)
+
+
+class TestFetch(unittest.TestCase):
+    """slurmrestd fetches the config from the etcd slurmctld published."""
+
+    def test_etcd_endpoint(self):
+        """The published address is used, not the one of a slurmctld unit."""
+        sim = simulation().__enter__()
+        self.addCleanup(sim.__exit__, None, None, None)
+        harness = sim.harness("slurmrestd")
+        with harness.hooks_disabled():
+            relation = harness.add_relation("slurmrestd", "slurmctld")
+            harness.add_relation_unit(relation, "slurmctld/1")
+            harness.update_relation_data(relation, "slurmctld/1", {"ingress-address": "10.0.0.2"})
+            harness.update_relation_data(relation, "slurmctld", {
+                "etcd_host": "10.0.0.1",
+                "etcd_port": "2379",
+                "etcd_slurmrestd_pass": "slurmrestd-pass",
+                "slurm_config_hash": "hash",
+            })
+
+        interface = charm_module("slurmrestd", "interface_slurmrestd")
+        with mock.patch.object(interface, "Etcd3AuthClient") as client:
+            client.return_value.get.return_value = None
+            self.assertEqual(harness.charm._slurmrestd.fetch_slurm_config(), {})
+        client.assert_called_once()
+        self.assertEqual(client.call_args.kwargs["host"], "10.0.0.1")
+        self.assertEqual(client.call_args.kwargs["port"], "2379")
+
+        with harness.hooks_disabled():
+            harness.update_relation_data(relation, "slurmctld", {"etcd_host": ""})
+        with self.assertRaises(ConnectionError):
+            harness.charm._slurmrestd.fetch_slurm_config()
+
+    def test_node_definitions(self):
+        """slurm.conf has the same node definitions as the one of slurmctld."""
+        sim = simulation().__enter__()
+        self.addCleanup(sim.__exit__, None, None, None)
+        harness = sim.harness("slurmrestd")
+        slurm_conf = harness.charm._slurm_conf
+        slurm_conf.parent.mkdir()
+
+        slurm_config = {"cluster_name": "osd-cluster", "partitions": [
+            {"partition_name": "gpu", "inventory": [
+                {"node_name": "gpu[1-2]", "gres": "gpu:a100:4", "features": "avx2,icelake"},
+            ]},
+        ]}
+        fetched = {"slurm_config": slurm_config, "hash": "hash"}
+
+        def render_slurm_configs(config):
+            slurm_conf.write_text("NodeName=gpu[1-2] State=UNKNOWN CPUs=64\n")
+
+        charm = harness.charm
+        with mock.patch.object(charm, "_check_status", return_value=True), \
+                mock.patch.object(charm._slurmrestd, "fetch_slurm_config", return_value=fetched), \
+                mock.patch.object(charm._slurm_manager, "render_slurm_configs",
+                                  render_slurm_configs):
+            charm._on_check_status_and_write_config(mock.MagicMock())
+        self.assertEqual(slurm_conf.read_text(), "NodeName=gpu[1-2] State=UNKNOWN CPUs=64 "
+                         "Gres=gpu:a100:4 Features=avx2,icelake\nGresTypes=gpu\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Test slurmd checking etcd for slurmctld to account for the node."""
+import unittest
+from unittest import mock
+
+from simulation import charm_module, relate_slurmd, simulation, slurmctld_cluster, slurmd_unit
+
+
+class TestCheckEtcd(unittest.TestCase):
+    """Watch the node's key on the first check only."""
+
+    def setUp(self):
+        """Relate a slurmd unit to slurmctld, recording the etcd lookups."""
+        self.sim = simulation().__enter__()
+        self.addCleanup(self.sim.__exit__, None, None, None)
+
+        client = charm_module("slurmd", "omnietcd3").Etcd3AuthClient
+        patcher = mock.patch.object(client, "wait_for_key", autospec=True,
+                                    side_effect=client.wait_for_key)
+        self.wait_for_key = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        slurmctld, relations = slurmctld_cluster(self.sim, nodes=1)
+        # the data slurmctld sets for every slurmd on relation-created
+        with slurmctld.hooks_disabled():
+            slurmctld.update_relation_data(relations["slurmd"], "slurmctld", {
+                "munge_key": "munge-key",
+                "slurmctld_host": slurmctld.charm.hostname,
+                "slurmctld_port": str(slurmctld.charm.port),
+                "etcd_port": "2379",
+                "etcd_slurmd_pass": "slurmd-pass",
+            })
+        self.harness = slurmd_unit(self.sim)
+        relate_slurmd(self.sim, self.harness, slurmctld, relations["slurmd"])
+
+    def timeouts(self) -> list:
+        """Return the timeouts of the lookups, and forget them."""
+        timeouts = [call.args[2] for call in self.wait_for_key.call_args_list]
+        self.wait_for_key.reset_mock()
+        return timeouts
+
+    def test_deferred(self):
+        """The deferred checks do not block their hook."""
+        self.assertEqual(self.timeouts(), [30])
+        for _ in range(3):
+            self.sim.hook(self.harness, self.harness.charm.on.update_status.emit)
+        self.assertEqual(self.timeouts(), [0, 0, 0])
+
+        key = f"nodes/accounted/{self.harness.charm.hostname}"
+        self.sim.etcd.kv[key] = ""
+        self.sim.hook(self.harness, self.harness.charm.on.update_status.emit)
+        self.assertEqual(self.timeouts(), [0])
+        self.assertTrue(self.harness.charm._stored.slurmctld_started)
+        self.sim.hook(self.harness, self.harness.charm.on.update_status.emit)
+        self.assertEqual(self.timeouts(), [])
+
+    def test_slurmctld_available_again(self):
+        """A new slurmctld watches again."""
+        self.timeouts()
+        self.sim.hook(self.harness, self.harness.charm._slurmd.on.slurmctld_available.emit)
+        self.assertEqual(self.timeouts(), [0, 30])
+
+
+if __name__ == "__main__":
+    unittest.main()
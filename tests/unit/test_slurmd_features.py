@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Test the node features derived from fixture /proc/cpuinfo files."""
+import tempfile
+import unittest
+from pathlib import Path
+
+from sysfs_tree import write
+
+import features
+import sysfs
+
+ICELAKE = """processor\t: 0
+vendor_id\t: GenuineIntel
+cpu family\t: 6
+model\t\t: 106
+model name\t: Intel(R) Xeon(R) Platinum 8358 CPU @ 2.60GHz
+stepping\t: 6
+flags\t\t: fpu sse2 pni ssse3 fma cx16 sse4_1 sse4_2 movbe popcnt xsave avx f16c \
+lahf_lm abm bmi1 avx2 bmi2 avx512f avx512dq avx512cd avx512bw avx512vl avx512_vnni
+
+processor\t: 1
+vendor_id\t: GenuineIntel
+"""
+
+GRACE = """processor\t: 0
+BogoMIPS\t: 2000.00
+Features\t: fp asimd evtstrm aes pmull sha1 sha2 crc32 atomics sve sve2 svebf16
+CPU implementer\t: 0x41
+CPU architecture: 8
+CPU part\t: 0xd4f
+"""
+
+
+class TestFeatures(unittest.TestCase):
+    """Derive the features of fixture hosts."""
+
+    def setUp(self):
+        """Create an empty fixture tree."""
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp_dir.name)
+
+    def tearDown(self):
+        """Remove the fixture tree."""
+        self._tmp_dir.cleanup()
+
+    def test_intel(self):
+        """Intel CPUs have their x86-64 levels, instruction sets and microarchitecture."""
+        write(self.root, sysfs.CPUINFO, ICELAKE)
+        self.assertEqual(features.node_features(["a100"], self.root), [
+            "a100", "avx2", "avx512", "avx512_vnni", "icelake",
+            "x86_64_v2", "x86_64_v3", "x86_64_v4",
+        ])
+
+    def test_arm(self):
+        """Arm CPUs name their flags Features."""
+        write(self.root, sysfs.CPUINFO, GRACE)
+        self.assertEqual(features.node_features(root=self.root),
+                         ["neoverse_v2", "sve", "sve2"])
+
+    def test_levels_are_cumulative(self):
+        """A level is only reached with the flags of the previous ones."""
+        self.assertEqual(features.isa_features(["avx512f", "avx512bw", "avx512cd",
+                                                "avx512dq", "avx512vl"]), ["avx512"])
+
+    def test_microarchitecture(self):
+        """Xeons sharing a model are told apart by their stepping, AMD CPUs by model."""
+        cpus = {
+            ("GenuineIntel", "6", "85", "4"): "skylake",
+            ("GenuineIntel", "6", "85", "7"): "cascadelake",
+            ("GenuineIntel", "6", "143", "8"): "sapphirerapids",
+            ("AuthenticAMD", "23", "49", "0"): "zen2",
+            ("AuthenticAMD", "25", "1", "1"): "zen3",
+            ("AuthenticAMD", "25", "17", "1"): "zen4",
+            ("GenuineIntel", "6", "1", "0"): "",
+        }
+        for (vendor, family, model, stepping), name in cpus.items():
+            cpu = {"vendor_id": vendor, "cpu family": family, "model": model,
+                   "stepping": stepping}
+            self.assertEqual(features.microarchitecture(cpu), name, cpu)
+
+    def test_no_cpuinfo(self):
+        """Without /proc/cpuinfo, only the GPUs are features."""
+        self.assertEqual(features.node_features(["a100"], self.root), ["a100"])
+
+
+if __name__ == "__main__":
+    unittest.main()
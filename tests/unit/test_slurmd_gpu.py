@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""Test the GPU discovery of slurmd against fixture /sys and /dev trees."""
+import tempfile
+import unittest
+from pathlib import Path
+
+from sysfs_tree import cpu_tree, pci_device, write
+
+import gpu
+
+PCI_IDS = """# a few lines of the pci.ids database
+1002  Advanced Micro Devices, Inc. [AMD/ATI]
+\t740c  Aldebaran/MI200 [Instinct MI250X / MI250]
+\t\t1002 0b0c  Instinct MI250X
+8086  Intel Corporation
+\t0bd5  Ponte Vecchio XT (1 Tile) [Data Center GPU Max 1100]
+C 03  Display controller
+"""
+
+
+class TestGresType(unittest.TestCase):
+    """Name the GPU models the way Slurm's GRES types are named."""
+
+    def test_models(self):
+        """The product name is kept, without vendor, memory and form factor."""
+        models = {
+            "NVIDIA A100-SXM4-40GB": "a100",
+            "Tesla V100-SXM2-16GB": "v100",
+            "NVIDIA H100 80GB HBM3": "h100",
+            "NVIDIA L40S": "l40s",
+            "NVIDIA GeForce RTX 3090": "geforce_rtx_3090",
+            "Aldebaran/MI200 [Instinct MI250X / MI250]": "mi250x",
+            "Ponte Vecchio XT (1 Tile) [Data Center GPU Max 1100]": "max_1100",
+        }
+        for model, gres_type in models.items():
+            self.assertEqual(gpu.gres_type(model), gres_type, model)
+
+
+class TestDiscover(unittest.TestCase):
+    """Discover the GPUs of fixture hosts with 2 sockets of 4 cores."""
+
+    def setUp(self):
+        """Create the CPUs of the fixture host."""
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp_dir.name)
+        cpu_tree(self.root, sockets=2, cores=4, threads=2)
+        write(self.root, gpu.PCI_IDS[0], PCI_IDS)
+
+    def tearDown(self):
+        """Remove the fixture tree."""
+        self._tmp_dir.cleanup()
+
+    def nvidia(self, address: str, minor: int, numa_node: int, local_cpus: str):
+        """Add an NVIDIA A100, with its driver loaded."""
+        pci_device(self.root, address, "0x10de", "0x030200", device="0x20b0",
+                   numa_node=numa_node, local_cpus=local_cpus)
+        write(self.root, f"proc/driver/nvidia/gpus/{address}/information",
+              f"Model: \t\t NVIDIA A100-SXM4-40GB\nDevice Minor: \t {minor}\n")
+        write(self.root, f"dev/nvidia{minor}", "")
+
+    def test_nvidia(self):
+        """NVIDIA GPUs are named after their model, with the cores of their socket."""
+        self.nvidia("0000:3b:00.0", 0, 0, "0-3,8-11")
+        self.nvidia("0000:d8:00.0", 1, 1, "4-7,12-15")
+        # the audio function of the GPUs, and the BMC's VGA
+        pci_device(self.root, "0000:3b:00.1", "0x10de", "0x040300")
+        pci_device(self.root, "0000:02:00.0", "0x1a03", "0x030000")
+
+        gpus = gpu.discover(self.root)
+        self.assertEqual(gpus, [
+            {"vendor": "nvidia", "type": "a100", "file": "/dev/nvidia0",
+             "numa_node": 0, "cores": "0-3"},
+            {"vendor": "nvidia", "type": "a100", "file": "/dev/nvidia1",
+             "numa_node": 1, "cores": "4-7"},
+        ])
+        self.assertEqual(gpu.gres(gpus), "gpu:a100:2")
+
+    def test_amd_and_intel(self):
+        """Other GPUs are named from pci.ids, and use their DRM render node."""
+        pci_device(self.root, "0000:00:02.0", "0x8086", "0x030000", render_node="renderD128")
+        pci_device(self.root, "0000:29:00.0", "0x1002", "0x038000", device="0x740c",
+                   numa_node=0, local_cpus="0-3,8-11", render_node="renderD129")
+        pci_device(self.root, "0000:9a:00.0", "0x8086", "0x038000", device="0x0bd5",
+                   numa_node=1, local_cpus="4-7,12-15", render_node="renderD130")
+        for render_node in ("renderD128", "renderD129", "renderD130"):
+            write(self.root, f"dev/dri/{render_node}", "")
+
+        gpus = gpu.discover(self.root)
+        self.assertEqual(gpus, [
+            {"vendor": "amd", "type": "mi250x", "file": "/dev/dri/renderD129",
+             "numa_node": 0, "cores": "0-3"},
+            {"vendor": "intel", "type": "max_1100", "file": "/dev/dri/renderD130",
+             "numa_node": 1, "cores": "4-7"},
+        ])
+        self.assertEqual(gpu.gres(gpus), "gpu:max_1100:1,gpu:mi250x:1")
+
+    def test_without_driver(self):
+        """Without their device file, GPUs are not usable."""
+        pci_device(self.root, "0000:3b:00.0", "0x10de", "0x030200", device="0x20b0")
+        self.assertEqual(gpu.discover(self.root), [])
+
+    def test_unknown_model(self):
+        """Models missing from pci.ids are named after their device id."""
+        pci_device(self.root, "0000:3b:00.0", "0x10de", "0x030200", device="0x2330")
+        write(self.root, "dev/nvidia0", "")
+        self.assertEqual(gpu.discover(self.root)[0]["type"], "nvidia_2330")
+
+    def test_no_affinity(self):
+        """No Cores for GPUs close to all the cores."""
+        self.nvidia("0000:3b:00.0", 0, -1, "0-15")
+        self.assertEqual(gpu.discover(self.root)[0]["cores"], "")
+        self.assertIsNone(gpu.discover(self.root)[0]["numa_node"])
+
+    def test_no_pci_bus(self):
+        """Containers may not have /sys/bus/pci, there are no GPUs."""
+        with tempfile.TemporaryDirectory() as empty:
+            self.assertEqual(gpu.discover(Path(empty)), [])
+
+
+class TestGresConf(unittest.TestCase):
+    """Describe the GPUs in gres.conf."""
+
+    GPUS = [
+        {"vendor": "nvidia", "type": "a100", "file": "/dev/nvidia0", "numa_node": 0,
+         "cores": "0-3"},
+        {"vendor": "nvidia", "type": "a100", "file": "/dev/nvidia1", "numa_node": 1,
+         "cores": "4-7"},
+    ]
+
+    def setUp(self):
+        """Create an empty fixture tree."""
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp_dir.name)
+
+    def tearDown(self):
+        """Remove the fixture tree."""
+        self._tmp_dir.cleanup()
+
+    def test_devices(self):
+        """Without AutoDetect, each GPU has its file and cores."""
+        self.assertEqual(gpu.gres_conf(self.GPUS, self.root), {"devices": [
+            {"name": "gpu", "type": "a100", "file": "/dev/nvidia0", "cores": "0-3"},
+            {"name": "gpu", "type": "a100", "file": "/dev/nvidia1", "cores": "4-7"},
+        ]})
+
+    def test_autodetect(self):
+        """Slurm detects the GPUs itself when it was built with the vendor's plugin."""
+        write(self.root, "usr/lib/x86_64-linux-gnu/slurm-wlm/gpu_nvml.so", "")
+        self.assertEqual(gpu.gres_conf(self.GPUS, self.root), {"autodetect": "nvml"})
+
+    def test_autodetect_mixed_vendors(self):
+        """A node with GPUs of several vendors lists its devices."""
+        write(self.root, "usr/lib/x86_64-linux-gnu/slurm-wlm/gpu_nvml.so", "")
+        gpus = self.GPUS + [{"vendor": "amd", "type": "mi250x", "file": "/dev/dri/renderD128",
+                             "numa_node": 0, "cores": "0-3"}]
+        self.assertIn("devices", gpu.gres_conf(gpus, self.root))
+
+    def test_device_files(self):
+        """The device files of all vendors are listed."""
+        write(self.root, "dev/nvidia0", "")
+        write(self.root, "dev/nvidiactl", "")
+        write(self.root, "dev/dri/renderD128", "")
+        write(self.root, "dev/dri/card0", "")
+        self.assertEqual(gpu.device_files(self.root), ["dri/renderD128", "nvidia0"])
+
+
+if __name__ == "__main__":
+    unittest.main()
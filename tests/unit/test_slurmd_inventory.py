@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Test when slurmd scans its hardware again and sends its inventory."""
+import os
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from simulation import charm_module, relate_slurmd, simulation, slurmctld_cluster, slurmd_unit
+
+
+class TestScanHardware(unittest.TestCase):
+    """Scan the hardware when it changes, or when the charm is upgraded."""
+
+    def setUp(self):
+        """Relate a slurmd unit to slurmctld, with the same hardware fingerprint."""
+        self.sim = simulation().__enter__()
+        self.addCleanup(self.sim.__exit__, None, None, None)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(self.sim._tmp_dir)
+        Path("version").write_text("1.0.0\n")
+
+        self.interface = charm_module("slurmd", "interface_slurmd")
+        patcher = mock.patch.object(self.interface, "hardware_fingerprint",
+                                    return_value="fingerprint")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        slurmctld, relations = slurmctld_cluster(self.sim, nodes=1)
+        self.harness = slurmd_unit(self.sim)
+        self.relation = relate_slurmd(self.sim, self.harness, slurmctld, relations["slurmd"])
+
+    def sent_inventory(self) -> dict:
+        """Return the inventory on the relation."""
+        data = self.harness.get_relation_data(self.relation, self.harness.charm.unit.name)
+        return charm_module("slurmd", "relation_codec").decode(data["inventory"])
+
+    def scan(self, **values):
+        """Patch the hardware scan, to return more values."""
+        scanned = self.interface.get_inventory
+
+        def get_inventory(*args, **kwargs):
+            return {**scanned(*args, **kwargs), **values}
+        return mock.patch.object(self.interface, "get_inventory", side_effect=get_inventory)
+
+    def test_same_hardware(self):
+        """The hardware is not scanned again on update-status if it did not change."""
+        with self.scan(features="avx512,sapphirerapids") as get_inventory:
+            self.sim.hook(self.harness, self.harness.charm.on.update_status.emit)
+        get_inventory.assert_not_called()
+        self.assertNotIn("sapphirerapids", self.sent_inventory()["features"])
+
+    def test_upgrade(self):
+        """A new charm revision scans the same hardware again, and sends what it reports."""
+        with self.scan(features="avx512,sapphirerapids") as get_inventory:
+            self.sim.hook(self.harness, self.harness.charm.on.upgrade_charm.emit)
+        get_inventory.assert_called_once()
+        self.assertEqual(self.sent_inventory()["features"], "avx512,sapphirerapids")
+
+        with self.scan() as get_inventory:
+            self.sim.hook(self.harness, self.harness.charm.on.update_status.emit)
+        get_inventory.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
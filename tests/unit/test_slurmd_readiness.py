@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""Test waiting for the Slurm daemons to be ready."""
+import socket
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+CHARM_DIR = Path(__file__).resolve().parents[2] / "charm-slurmd"
+sys.path.insert(0, str(CHARM_DIR / "src"))
+
+import readiness  # noqa: E402
+
+
+class Clock:
+    """Simulated time, advanced by sleep()."""
+
+    def __init__(self):
+        """Start at 0, and remember the sleeps."""
+        self.now = 0.0
+        self.sleeps = list()
+
+    def time(self) -> float:
+        """Return the simulated time."""
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        """Advance the simulated time."""
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TestWait(unittest.TestCase):
+    """Poll with an exponential backoff, up to a deadline."""
+
+    def setUp(self):
+        """Wait in simulated time."""
+        self.clock = Clock()
+        for name in ("time", "sleep"):
+            patcher = mock.patch.object(readiness, name, getattr(self.clock, name))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_ready(self):
+        """A ready daemon is not waited for."""
+        self.assertTrue(readiness.wait(lambda: True))
+        self.assertEqual(self.clock.sleeps, [])
+
+    def test_ready_soon(self):
+        """The wait ends at the first poll the daemon is ready."""
+        polls = iter([False, False, False, True])
+        self.assertTrue(readiness.wait(lambda: next(polls)))
+        self.assertEqual(self.clock.sleeps, [0.5, 1, 2])
+
+    def test_deadline(self):
+        """The delays are bounded, and the last one ends at the deadline."""
+        self.assertFalse(readiness.wait(lambda: False, deadline=20))
+        self.assertEqual(self.clock.sleeps, [0.5, 1, 2, 4, 5, 5, 2.5])
+        self.assertEqual(self.clock.now, 20)
+
+
+class TestPortOpen(unittest.TestCase):
+    """Tell if a daemon listens on its port."""
+
+    def test_listening(self):
+        """A listening port is open, a closed one is not."""
+        with socket.socket() as server:
+            server.bind(("127.0.0.1", 0))
+            server.listen()
+            port = server.getsockname()[1]
+            self.assertTrue(readiness.port_open(port))
+        self.assertFalse(readiness.port_open(port))
+
+
+if __name__ == "__main__":
+    unittest.main()
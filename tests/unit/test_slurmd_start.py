@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Test slurmd starting once slurmctld accounted for the node."""
+import unittest
+from unittest import mock
+
+from ops.model import ActiveStatus, WaitingStatus
+from simulation import charm_module, relate_slurmd, simulation, slurmctld_cluster, slurmd_unit
+
+
+class TestSlurmdStart(unittest.TestCase):
+    """Restart slurmd once, and wait for it on the retries."""
+
+    def setUp(self):
+        """Relate a slurmd unit to slurmctld, slurmd does not listen on its port."""
+        self.sim = simulation().__enter__()
+        self.addCleanup(self.sim.__exit__, None, None, None)
+
+        self.listening = False
+        patcher = mock.patch.object(charm_module("slurmd", "readiness"), "port_open",
+                                    lambda port: self.listening)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        slurmctld, relations = slurmctld_cluster(self.sim, nodes=1)
+        # the data slurmctld sets for every slurmd on relation-created
+        with slurmctld.hooks_disabled():
+            slurmctld.update_relation_data(relations["slurmd"], "slurmctld", {
+                "munge_key": "munge-key",
+                "slurmctld_host": slurmctld.charm.hostname,
+                "slurmctld_port": str(slurmctld.charm.port),
+                "etcd_port": "2379",
+                "etcd_slurmd_pass": "slurmd-pass",
+            })
+        self.harness = slurmd_unit(self.sim)
+        self.sim.etcd.kv[f"nodes/accounted/{self.harness.charm.hostname}"] = ""
+        relate_slurmd(self.sim, self.harness, slurmctld, relations["slurmd"])
+
+    def update_status(self):
+        """Run an update-status hook, the deferred events first."""
+        self.sim.hook(self.harness, self.harness.charm.on.update_status.emit)
+
+    def test_retry(self):
+        """The deferred start waits for slurmd without restarting it."""
+        self.assertEqual(self.sim.counters["slurmd restarts"], 1)
+        self.assertIsInstance(self.harness.charm.unit.status, WaitingStatus)
+
+        self.update_status()
+        self.assertEqual(self.sim.counters["slurmd restarts"], 1)
+
+        self.listening = True
+        self.update_status()
+        self.assertEqual(self.sim.counters["slurmd restarts"], 1)
+        self.assertEqual(self.harness.charm.unit.status, ActiveStatus("slurmd available"))
+
+    def test_retry_inactive(self):
+        """The deferred start restarts slurmd if it is not active anymore."""
+        self.harness.charm._slurm_manager._active = False
+        self.listening = True
+        self.update_status()
+        self.assertEqual(self.sim.counters["slurmd restarts"], 2)
+        self.assertEqual(self.harness.charm.unit.status, ActiveStatus("slurmd available"))
+
+    def test_node_configured_not_ready(self):
+        """The node-configured action fails if slurmd is not ready."""
+        event = mock.MagicMock()
+        self.harness.charm._on_node_configured_action(event)
+        event.fail.assert_called_once_with(
+            message="slurmd is not ready: Waiting for slurmd to start, retrying")
+
+        self.listening = True
+        event = mock.MagicMock()
+        self.harness.charm._on_node_configured_action(event)
+        event.fail.assert_not_called()
+        self.assertEqual(self.harness.charm.unit.status, ActiveStatus("slurmd available"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""Test reading the kernel's view of the hardware from fixture /sys trees."""
+import tempfile
+import unittest
+from pathlib import Path
+
+from sysfs_tree import cpu_tree, write
+
+import sysfs
+
+
+class TestCpuLists(unittest.TestCase):
+    """Parse and format kernel cpu lists."""
+
+    def test_parse_cpu_list(self):
+        """Kernel cpu lists hold ranges and single ids."""
+        self.assertEqual(sysfs.parse_cpu_list("0-3,8,10-11\n"), [0, 1, 2, 3, 8, 10, 11])
+        self.assertEqual(sysfs.parse_cpu_list("0"), [0])
+        self.assertEqual(sysfs.parse_cpu_list(""), [])
+
+    def test_format_cpu_list(self):
+        """Formatting a cpu list collapses consecutive ids into ranges."""
+        self.assertEqual(sysfs.format_cpu_list([11, 0, 1, 2, 3, 8, 10]), "0-3,8,10-11")
+        self.assertEqual(sysfs.format_cpu_list([]), "")
+
+
+class TestCoreIndexes(unittest.TestCase):
+    """Map the CPUs to Slurm's abstract core indexes."""
+
+    def setUp(self):
+        """Create an empty fixture tree."""
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp_dir.name)
+
+    def tearDown(self):
+        """Remove the fixture tree."""
+        self._tmp_dir.cleanup()
+
+    def test_threads_share_their_core(self):
+        """Sibling threads have the index of their core."""
+        cpu_tree(self.root, sockets=2, cores=2, threads=2)
+        self.assertEqual(sysfs.core_indexes(self.root),
+                         {0: 0, 1: 1, 2: 2, 3: 3, 4: 0, 5: 1, 6: 2, 7: 3})
+
+    def test_sparse_core_ids(self):
+        """Core ids with holes are numbered contiguously, socket by socket."""
+        write(self.root, f"{sysfs.CPU_DIR}/online", "0-3\n")
+        for cpu, (socket, core_id) in enumerate([(0, 0), (0, 8), (1, 0), (1, 8)]):
+            topology = f"{sysfs.CPU_DIR}/cpu{cpu}/topology"
+            write(self.root, f"{topology}/physical_package_id", f"{socket}\n")
+            write(self.root, f"{topology}/core_id", f"{core_id}\n")
+        self.assertEqual(sysfs.core_indexes(self.root), {0: 0, 1: 1, 2: 2, 3: 3})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""Test the slurmd node inventory against fixture /sys and /proc trees."""
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+from sysfs_tree import MEMINFO, cpu_tree, numa_tree, pci_device, write
+
+import sysfs
+import utils
+
+MOUNTS = """/dev/sda2 / ext4 rw,relatime 0 0
+tmpfs /run tmpfs rw,nosuid,nodev 0 0
+/dev/sda1 /boot/efi vfat rw,relatime 0 0
+/dev/loop0 /snap/core20/1974 squashfs ro,nodev,relatime 0 0
+/dev/nvme0n1 /local\\040scratch xfs rw,noatime 0 0
+/dev/sdb1 /data ext4 rw,relatime 0 0
+"""
+
+
+def statvfs(sizes: dict):
+    """Return a fake os.statvfs of filesystems sized in MiB, by mount point."""
+    def _statvfs(path):
+        size = sizes.get(f"/{Path(path).name}", sizes["/"])
+        return SimpleNamespace(f_blocks=size * 256, f_frsize=4096)
+    return _statvfs
+
+
+class TestInventory(unittest.TestCase):
+    """Read the inventory of fixture hosts."""
+
+    def setUp(self):
+        """Create an empty fixture tree."""
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp_dir.name)
+        write(self.root, sysfs.MEMINFO, MEMINFO)
+
+    def tearDown(self):
+        """Remove the fixture tree."""
+        self._tmp_dir.cleanup()
+
+    def test_cpu_info(self):
+        """Two sockets of 16 cores with 2 threads each."""
+        cpu_tree(self.root, sockets=2, cores=16, threads=2)
+        self.assertEqual(utils.cpu_info(self.root), {
+            "cpus": "64",
+            "threads_per_core": "2",
+            "cores_per_socket": "16",
+            "sockets_per_board": "2",
+        })
+
+    def test_cpu_info_without_smt(self):
+        """One thread per core."""
+        cpu_tree(self.root, sockets=1, cores=8, threads=1)
+        self.assertEqual(utils.cpu_info(self.root), {
+            "cpus": "8",
+            "threads_per_core": "1",
+            "cores_per_socket": "8",
+            "sockets_per_board": "1",
+        })
+
+    def test_cpu_info_offline_cpus(self):
+        """Offline CPUs are counted, but have no topology."""
+        cpu_tree(self.root, sockets=1, cores=4, threads=2, offline=(6, 7))
+        info = utils.cpu_info(self.root)
+        self.assertEqual(info["cpus"], "8")
+        self.assertEqual(info["cores_per_socket"], "4")
+
+    def test_numa_info(self):
+        """Each socket is a NUMA node, with its CPUs and memory."""
+        cpu_tree(self.root, sockets=2, cores=4, threads=2)
+        numa_tree(self.root, sockets=2, cores=4, threads=2, memory_kb=131928142)
+        self.assertEqual(utils.numa_info(self.root), [
+            {"node": 0, "cpus": "0-3,8-11", "memory": 128836},
+            {"node": 1, "cpus": "4-7,12-15", "memory": 128836},
+        ])
+
+    def test_numa_info_without_numa(self):
+        """Kernels without NUMA support have no NUMA nodes in /sys."""
+        self.assertEqual(utils.numa_info(self.root), [])
+
+    def test_l3_domains(self):
+        """Threads sharing an L3 cache are one domain."""
+        cpu_tree(self.root, sockets=2, cores=4, threads=2)
+        numa_tree(self.root, sockets=2, cores=4, threads=2, memory_kb=131928142)
+        self.assertEqual(utils.l3_domains(self.root), ["0-3,8-11", "4-7,12-15"])
+
+    def test_specialization(self):
+        """The last core of every socket, and 1/32 of the memory."""
+        cpus = {"sockets_per_board": "2", "cores_per_socket": "16", "threads_per_core": "2"}
+        self.assertEqual(utils.specialization(cpus, "257672"), {
+            "core_spec_count": "2",
+            "cpu_spec_list": "30-31,62-63",
+            "mem_spec_limit": "8052",
+        })
+
+    def test_specialization_limits(self):
+        """Small nodes reserve nothing, big ones at most 16GiB."""
+        cpus = {"sockets_per_board": "1", "cores_per_socket": "2", "threads_per_core": "1"}
+        self.assertEqual(utils.specialization(cpus, "4096"), {})
+        self.assertEqual(utils.specialization(cpus, "16384"), {"mem_spec_limit": "1024"})
+        self.assertEqual(utils.specialization(cpus, "2000000"), {"mem_spec_limit": "16384"})
+
+    def test_real_memory(self):
+        """The total memory is in MiB, as `free -m` prints it."""
+        self.assertEqual(utils.get_real_mem(self.root), "257672")
+
+    def test_get_inventory(self):
+        """The inventory holds the node, its CPUs, memory, topology, GPUs and scratch."""
+        cpu_tree(self.root, sockets=2, cores=4, threads=2)
+        numa_tree(self.root, sockets=2, cores=4, threads=2, memory_kb=131928142)
+        pci_device(self.root, "0000:3b:00.0", "0x10de", "0x030200", device="0x20b0",
+                   numa_node=0, local_cpus="0-3,8-11")
+        write(self.root, "proc/driver/nvidia/gpus/0000:3b:00.0/information",
+              "Model: \t\t NVIDIA A100-SXM4-40GB\nDevice Minor: \t 0\n")
+        write(self.root, "dev/nvidia0", "")
+        with mock.patch("utils.os.statvfs", statvfs({"/": 40960})):
+            inventory = utils.get_inventory("node-0", "10.0.0.1", self.root)
+        self.assertEqual(inventory, {
+            "node_name": "node-0",
+            "node_addr": "10.0.0.1",
+            "state": "UNKNOWN",
+            "real_memory": "257672",
+            "cpus": "16",
+            "threads_per_core": "2",
+            "cores_per_socket": "4",
+            "sockets_per_board": "2",
+            "numa_nodes": "2",
+            "topology": {
+                "numa": [
+                    {"node": 0, "cpus": "0-3,8-11", "memory": 128836},
+                    {"node": 1, "cpus": "4-7,12-15", "memory": 128836},
+                ],
+                "l3": ["0-3,8-11", "4-7,12-15"],
+            },
+            "core_spec_count": "2",
+            "cpu_spec_list": "6-7,14-15",
+            "mem_spec_limit": "8052",
+            "gres": "gpu:a100:1",
+            "gres_conf": {"devices": [
+                {"name": "gpu", "type": "a100", "file": "/dev/nvidia0", "cores": "0-3"},
+            ]},
+            "features": "a100",
+            "tmp_disk": "40960",
+        })
+
+    def test_get_inventory_without_gpus(self):
+        """Nodes without GPUs have no gres."""
+        cpu_tree(self.root, sockets=1, cores=2, threads=1)
+        self.assertNotIn("gres", utils.get_inventory("node-0", "10.0.0.1", self.root))
+
+
+class TestScratch(unittest.TestCase):
+    """Find the scratch space of the jobs, and its size."""
+
+    def setUp(self):
+        """Create a fixture host with a system disk, a NVMe drive and a data disk."""
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp_dir.name)
+        write(self.root, sysfs.MOUNTS, MOUNTS)
+        for mount_point in ("tmp", "local scratch", "data"):
+            (self.root / mount_point).mkdir()
+
+    def tearDown(self):
+        """Remove the fixture tree."""
+        self._tmp_dir.cleanup()
+
+    def test_local_mounts(self):
+        """Only filesystems of block devices are local, with unescaped mount points."""
+        self.assertEqual(utils.local_mounts(self.root), [
+            ("/dev/sda2", "/"),
+            ("/dev/nvme0n1", "/local scratch"),
+            ("/dev/sdb1", "/data"),
+        ])
+
+    def test_largest_filesystem(self):
+        """The largest data filesystem is used if it is larger than /tmp."""
+        sizes = {"/": 40960, "/local scratch": 1907729, "/data": 953869}
+        with mock.patch("utils.os.statvfs", statvfs(sizes)):
+            self.assertEqual(utils.scratch(root=self.root), ("/local scratch/slurm", 1907729))
+
+    def test_tmp(self):
+        """Jobs use /tmp if it is the largest."""
+        sizes = {"/": 1907729, "/local scratch": 40960, "/data": 40960}
+        with mock.patch("utils.os.statvfs", statvfs(sizes)):
+            self.assertEqual(utils.scratch(root=self.root), ("", 1907729))
+
+    def test_configured_path(self):
+        """A configured path is used even if it does not exist yet."""
+        sizes = {"/": 40960, "/local scratch": 1907729, "/data": 953869}
+        with mock.patch("utils.os.statvfs", statvfs(sizes)):
+            self.assertEqual(utils.scratch("/data/jobs", self.root), ("/data/jobs", 953869))
+
+
+class TestHardwareFingerprint(unittest.TestCase):
+    """Tell when the hardware changed."""
+
+    def setUp(self):
+        """Create a fixture host."""
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp_dir.name)
+        write(self.root, sysfs.MEMINFO, MEMINFO)
+        cpu_tree(self.root, sockets=1, cores=4, threads=2)
+        pci_device(self.root, "0000:00:02.0", "0x8086", "0x030000")
+
+    def tearDown(self):
+        """Remove the fixture tree."""
+        self._tmp_dir.cleanup()
+
+    def test_stable(self):
+        """The same hardware has the same fingerprint."""
+        self.assertEqual(utils.hardware_fingerprint(self.root),
+                         utils.hardware_fingerprint(self.root))
+
+    def test_free_memory_does_not_count(self):
+        """Only the total memory is part of the fingerprint."""
+        fingerprint = utils.hardware_fingerprint(self.root)
+        write(self.root, sysfs.MEMINFO, MEMINFO.replace("259441236", "1024"))
+        self.assertEqual(utils.hardware_fingerprint(self.root), fingerprint)
+
+    def test_changes(self):
+        """Offline CPUs, new PCI devices and GPU drivers change it."""
+        fingerprints = {utils.hardware_fingerprint(self.root)}
+
+        write(self.root, f"{sysfs.CPU_DIR}/online", "0-6\n")
+        fingerprints.add(utils.hardware_fingerprint(self.root))
+
+        pci_device(self.root, "0000:3b:00.0", "0x10de", "0x030200")
+        fingerprints.add(utils.hardware_fingerprint(self.root))
+
+        write(self.root, "dev/nvidia0", "")
+        fingerprints.add(utils.hardware_fingerprint(self.root))
+
+        self.assertEqual(len(fingerprints), 4)
+
+    def test_empty_root(self):
+        """Hosts without /sys or /proc still have a fingerprint."""
+        with tempfile.TemporaryDirectory() as empty:
+            self.assertTrue(utils.hardware_fingerprint(Path(empty)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""Test how the slurmdbd leader schedules the active and backup slurmdbd among its peers."""
+import json
+import os
+import unittest
+from unittest import mock
+
+from simulation import app_data_writes, charm_module, simulation
+
+
+class TestScheduleSlurmdbd(unittest.TestCase):
+    """Assign the active, backup and standby slurmdbd as peers come and go."""
+
+    def setUp(self):
+        """Start a slurmdbd unit, with the peer relation and without peers."""
+        self.sim = simulation().__enter__()
+        self.addCleanup(self.sim.__exit__, None, None, None)
+        self.start(leader=True)
+
+    def start(self, leader: bool):
+        """Start the slurmdbd unit, as the leader or not."""
+        harness = self.harness = self.sim.harness("slurmdbd", leader=leader)
+        stored = harness.charm._stored
+        stored.slurm_installed = True
+        stored.jwt_available = True
+        stored.munge_available = True
+        with harness.hooks_disabled():
+            self.peer = harness.add_relation("slurmdbd-peer", "slurmdbd")
+            harness.update_relation_data(self.peer, harness.charm.unit.name,
+                                         {"ingress-address": "10.0.2.1"})
+
+    def app_data(self) -> dict:
+        """Return the roles in the application data."""
+        return self.harness.get_relation_data(self.peer, "slurmdbd")
+
+    def join(self, index: int) -> list:
+        """Add a peer, and return the keys of the application data written."""
+        unit = f"slurmdbd/{index}"
+        with app_data_writes(self.harness, self.peer) as writes:
+            self.sim.hook(self.harness, self.harness.add_relation_unit, self.peer, unit)
+            self.sim.hook(self.harness, self.harness.update_relation_data, self.peer, unit,
+                          {"ingress-address": f"10.0.2.{index + 1}",
+                           "hostname": f"slurmdbd-{index}", "port": "6819"})
+        return writes
+
+    def depart(self, index: int) -> list:
+        """Remove a peer, and return the keys of the application data written."""
+        with app_data_writes(self.harness, self.peer) as writes:
+            self.sim.hook(self.harness, self.harness.remove_relation_unit, self.peer,
+                          f"slurmdbd/{index}")
+        return writes
+
+    def check_roles(self, backup: str, standby: list):
+        """Check the roles, and the backup slurmdbd info sent to slurmctld."""
+        data = self.app_data()
+        self.assertEqual(data["active_slurmdbd"], "slurmdbd/0")
+        self.assertEqual(data.get("backup_slurmdbd", ""), backup)
+        self.assertEqual(json.loads(data["standby_slurmdbd"]), standby)
+        info = json.loads(data["slurmdbd_info"])
+        self.assertEqual(info["backup_slurmdbd_hostname"], backup.replace("/", "-"))
+
+    def test_join(self):
+        """The first peer becomes the backup, the next ones standbys."""
+        self.assertEqual(sorted(self.join(1)), ["active_slurmdbd", "backup_slurmdbd",
+                                                "slurmdbd_info", "standby_slurmdbd"])
+        self.check_roles("slurmdbd/1", [])
+
+        self.assertEqual(self.join(2), ["standby_slurmdbd"])
+        self.check_roles("slurmdbd/1", ["slurmdbd/2"])
+
+        # a peer changing its unit data changes no role
+        with app_data_writes(self.harness, self.peer) as writes:
+            self.sim.hook(self.harness, self.harness.update_relation_data, self.peer,
+                          "slurmdbd/2", {"other": "value"})
+        self.assertEqual(writes, [])
+
+    def test_depart(self):
+        """A departed standby is forgotten, a departed backup replaced by a standby."""
+        self.join(1)
+        self.join(2)
+        self.join(3)
+        self.check_roles("slurmdbd/1", ["slurmdbd/2", "slurmdbd/3"])
+
+        self.assertEqual(self.depart(2), ["standby_slurmdbd"])
+        self.check_roles("slurmdbd/1", ["slurmdbd/3"])
+
+        self.assertEqual(sorted(self.depart(1)),
+                         ["backup_slurmdbd", "slurmdbd_info", "standby_slurmdbd"])
+        self.check_roles("slurmdbd/3", [])
+
+        self.assertEqual(sorted(self.depart(3)), ["backup_slurmdbd", "slurmdbd_info"])
+        self.check_roles("", [])
+
+    def test_once_per_hook(self):
+        """Slurmdbd is scheduled once per hook for the same peers."""
+        self.join(1)
+        peer = self.harness.charm._slurmdbd_peer
+        module = charm_module("slurmdbd", "interface_slurmdbd_peer")
+        with mock.patch.dict(os.environ, {"JUJU_CONTEXT_ID": "slurmdbd/0-1"}), \
+                mock.patch.object(module, "_schedule_backup",
+                                  wraps=module._schedule_backup) as schedule:
+            self.assertTrue(peer._schedule_slurmdbd())
+            self.assertTrue(peer._schedule_slurmdbd())
+            self.assertEqual(schedule.call_count, 1)
+
+            # a new peer is scheduled again
+            self.join(2)
+            self.assertEqual(schedule.call_count, 2)
+
+    def test_leader_departs(self):
+        """The new leader becomes the active slurmdbd, without backup."""
+        self.start(leader=False)
+        with self.harness.hooks_disabled():
+            self.harness.add_relation_unit(self.peer, "slurmdbd/1")
+            self.harness.update_relation_data(self.peer, "slurmdbd/1",
+                                              {"ingress-address": "10.0.2.2"})
+            self.harness.update_relation_data(self.peer, "slurmdbd", {
+                "active_slurmdbd": "slurmdbd/1",
+                "backup_slurmdbd": "slurmdbd/0",
+                "standby_slurmdbd": "[]",
+            })
+
+        # only the leader schedules slurmdbd
+        with app_data_writes(self.harness, self.peer) as writes:
+            self.sim.hook(self.harness, self.harness.update_relation_data, self.peer,
+                          "slurmdbd/1", {"hostname": "slurmdbd-1", "port": "6819"})
+        self.assertEqual(writes, [])
+
+        with app_data_writes(self.harness, self.peer) as writes:
+            self.sim.hook(self.harness, self.harness.set_leader, True)
+            self.sim.hook(self.harness, self.harness.remove_relation_unit, self.peer,
+                          "slurmdbd/1")
+        data = self.app_data()
+        self.assertEqual(data["active_slurmdbd"], "slurmdbd/0")
+        self.assertNotIn("backup_slurmdbd", data)
+        self.assertEqual(data["standby_slurmdbd"], "[]")
+        self.assertNotIn("standby_slurmdbd", writes)
+        self.assertEqual(len(writes), len(set(writes)))
+
+
+if __name__ == "__main__":
+    unittest.main()